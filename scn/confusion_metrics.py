@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+"""
+Binary classification metrics from confusion counts (NumPy only, vectorized
+over any number of groups). Shared by the offline validation
+(scn/scientific validation) and the online evaluation of a session.
+
+"""
+
+import numpy as np
+
+# metric names in the order returned by metrics_from_counts
+METRICS = ("Accuracy", "Sensitivity", "Specificity", "Balanced_Accuracy", "Cohens_Kappa")
+
+# Safe division to handle zero denominators (elementwise, NaN where b == 0)
+def safe_div(a, b):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b != 0, a / np.where(b != 0, b, 1), np.nan)
+
+def metrics_from_counts(tp, fp, tn, fn) -> dict:
+    """
+    Accuracy, sensitivity, specificity, balanced accuracy and Cohen's kappa from confusion counts.
+    Counts can be scalars or arrays of any (matching) shape, e.g. one entry per group or per bootstrap sample;
+    every metric has the shape of the counts (NaN where undefined).
+    """
+    tp, fp, tn, fn = (np.asarray(c, dtype=float) for c in (tp, fp, tn, fn))
+    n = tp + tn + fp + fn
+
+    acc = safe_div(tp + tn, n) # accuracy: how often is device overall correct?
+    sens = safe_div(tp, tp + fn) # sensitivity: truly below the threshold and detected
+    spec = safe_div(tn, tn + fp) # specificity: truly above the threshold and reported so
+    with np.errstate(invalid="ignore"):
+        # balanced accuracy: average of sensitivity and specificity (ignoring an undefined one)
+        bal_acc = np.where(np.isnan(sens), spec, np.where(np.isnan(spec), sens, (sens + spec) / 2))
+
+    # Cohen's kappa: How much better is the device than random guessing?
+    p0 = safe_div(tp + tn, n) # observed agreement
+    pe = safe_div((tp + fn) * (tp + fp) + (tn + fp) * (tn + fn), n * n) # expected agreement by chance
+    kappa = safe_div(p0 - pe, 1 - pe)
+
+    return {
+        "Accuracy": acc,
+        "Sensitivity": sens,
+        "Specificity": spec,
+        "Balanced_Accuracy": bal_acc,
+        "Cohens_Kappa": kappa,
+    }
+
+def bootstrap_counts(tp, fp, tn, fn, n_boot=2000, rng=None):
+    """
+    Bootstrap resamples of the confusion counts of each group.
+    Resampling the N trials of a group with replacement only changes how many fall into each confusion cell,
+    so the resampled counts are multinomial (N, observed proportions); they are drawn as a chain of binomials,
+    vectorized over groups and resamples - no per-trial index arrays.
+    Returns four arrays of shape (n_boot,) + shape of the counts.
+    """
+    rng = np.random.default_rng(rng)
+    counts = [np.asarray(c, dtype=np.int64) for c in (tp, fp, tn, fn)]
+    rest = np.broadcast_to(sum(counts), (n_boot,) + counts[0].shape)
+    left = rest.astype(float) # observed trials not yet assigned to a cell
+    draws = []
+    for c in counts[:-1]:
+        p = np.clip(safe_div(c, left[0]), 0, 1)
+        d = rng.binomial(rest, np.nan_to_num(p))
+        draws.append(d)
+        rest = rest - d
+        left = left - c
+    draws.append(rest)
+    return tuple(draws)
+
+def nan_quantiles(values, q, axis=0):
+    """Quantiles along axis ignoring NaN (linear interpolation, NaN where no finite value), faster than np.nanpercentile."""
+    values = np.sort(values, axis=axis) # NaN sort last
+    k = np.sum(~np.isnan(values), axis=axis, keepdims=True)
+    out = []
+    for qi in np.atleast_1d(q):
+        pos = qi * np.maximum(k - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(k - 1, 0))
+        v_lo = np.take_along_axis(values, lo, axis=axis)
+        v_hi = np.take_along_axis(values, hi, axis=axis)
+        v = v_lo + (pos - lo) * (v_hi - v_lo)
+        out.append(np.where(k > 0, v, np.nan).squeeze(axis))
+    return out
+
+def bootstrap_ci(tp, fp, tn, fn, n_boot=2000, alpha=0.05, rng=None) -> dict:
+    """
+    Percentile bootstrap confidence intervals of all metrics, for every group at once.
+    Returns {metric: (low, high)} with arrays of the shape of the counts.
+    """
+    boot = metrics_from_counts(*bootstrap_counts(tp, fp, tn, fn, n_boot=n_boot, rng=rng))
+    return {name: tuple(nan_quantiles(values, (alpha / 2, 1 - alpha / 2))) for name, values in boot.items()}
@@ -15,4 +15,6 @@ from .udr_control import UdrControl
 from .sens_control import SensControl
 from .neigh_list_manager import NeighListManager
 from .led_control import LedControl
-from .events_control import EventsControl
\ No newline at end of file
+from .events_control import EventsControl
+from .udr_auto import UdrAuto
+from .led_animator import LedAnimator
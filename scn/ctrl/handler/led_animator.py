@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+
+"""
+Keyframed LED animations.
+
+An Animation is a list of keyframes (t, {sc_id: color_val}); cells missing
+in a keyframe keep their previous color. On play() the LedAnimator samples
+the animation once at its tick rate and precomputes, for every tick, the
+encoded packets of the cells whose color differs from the previous tick
+(LedControl.led_pkt() caches them per (color, id)). The animator thread
+then only looks up the packets of the current tick and sends them as one
+paced burst; ticks without changes send nothing.
+
+Ticks are scheduled against time.monotonic(); when ticks are skipped the
+difference to the last sent tick is sent instead.
+
+    anim = LedAnimator(led_ctrl)
+    anim.play(pulse(COLOR_VAL_MAP["green"],[1,2,3]))
+
+While an animation plays it owns the LEDs of its cells. After other
+writers changed them, invalidate() resends the full current tick.
+
+The tick rate is capped to what the data link can pace: a tick has to
+send its largest burst within one period (DataLink.burst_duration), e.g.
+a pulse of 16 cells runs at ~6 fps with one packet per datagram.
+
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from scn.icommand_handler import ICommandHandler,descr_entry
+from scn.ctrl.handler.led_control import LedControl, COLOR_VAL_MAP
+from scn.sc.pkt.tools import SC_ID_ALL
+
+
+Keyframe = Tuple[float,Dict[int,int]]
+
+
+class Animation:
+
+    def __init__(self, keyframes : Sequence[Keyframe], loop : bool = False, interpolate : bool = True):
+        """ keyframes: (time in s, {sc_id: color_val}); interpolate fades linearly between keyframes, else colors hold. """
+        if len(keyframes) == 0:
+            raise ValueError("Animation needs at least one keyframe.")
+        self.keyframes = sorted(keyframes,key=lambda k: k[0])
+        self.loop = loop
+        self.interpolate = interpolate
+
+    def duration(self) -> float:
+        return self.keyframes[-1][0]
+
+    def ids(self) -> List[int]:
+        ids = {}
+        for _,colors in self.keyframes:
+            ids.update(dict.fromkeys(colors))
+        return list(ids)
+
+
+    def sample(self, fps : float) -> Tuple[List[int],np.ndarray]:
+        """ Cell IDs and the color values of every tick, shape (n_ticks,n_ids). """
+        ids = self.ids()
+        col = { sc_id : ind for ind,sc_id in enumerate(ids) }
+
+        # color of every cell at every keyframe, missing cells hold
+        n_key = len(self.keyframes)
+        t_key = np.array([k[0] for k in self.keyframes],dtype=float)
+        key = np.zeros((n_key,len(ids)),dtype=np.int64)
+        for k,(_,colors) in enumerate(self.keyframes):
+            if k:
+                key[k] = key[k-1]
+            for sc_id,color_val in colors.items():
+                key[k,col[sc_id]] = color_val
+
+        n_ticks = max(1,int(round(self.duration()*fps)))
+        if not self.loop:
+            n_ticks += 1
+        t = np.arange(n_ticks)/fps
+        ind = np.clip(np.searchsorted(t_key,t,side="right") - 1,0,n_key-1)
+        if not self.interpolate or n_key == 1:
+            return ids,key[ind]
+
+        nxt = np.minimum(ind + 1,n_key - 1)
+        span = t_key[nxt] - t_key[ind]
+        w = np.where(span > 0,(t - t_key[ind])/np.where(span > 0,span,1),0.0)[:,None]
+        out = np.zeros((n_ticks,len(ids)),dtype=np.int64)
+        for shift in (16,8,0):
+            a = (key[ind] >> shift) & 0xFF
+            b = (key[nxt] >> shift) & 0xFF
+            out |= np.rint(a + w*(b - a)).astype(np.int64) << shift
+        return ids,out
+
+
+
+def pulse(color_val : int, sc_ids : Sequence[int] = (SC_ID_ALL,), period : float = 1.0) -> Animation:
+    """ Fade in and out, endless. """
+    on = dict.fromkeys(sc_ids,color_val)
+    off = dict.fromkeys(sc_ids,0)
+    return Animation([(0.0,off),(period/2,on),(period,off)],loop=True)
+
+def flash(color_val : int, sc_ids : Sequence[int] = (SC_ID_ALL,), n : int = 3, period : float = 0.25) -> Animation:
+    """ n hard on/off flashes, e.g. when a target is reached. """
+    on = dict.fromkeys(sc_ids,color_val)
+    off = dict.fromkeys(sc_ids,0)
+    keyframes = []
+    for i in range(n):
+        keyframes += [(i*period,on),((i+0.5)*period,off)]
+    return Animation(keyframes + [(n*period,off)],interpolate=False)
+
+def sweep(color_val : int, sc_ids : Sequence[int], duration : float = 1.0, background : int = 0) -> Animation:
+    """ Light the cells one after the other in the given order (progress), cells stay lit. """
+    keyframes = [(0.0,dict.fromkeys(sc_ids,background))]
+    step = duration/max(1,len(sc_ids))
+    for i,sc_id in enumerate(sc_ids):
+        keyframes.append(((i+1)*step,{ sc_id : color_val }))
+    return Animation(keyframes,interpolate=False)
+
+
+
+class LedAnimator(ICommandHandler):
+    DoneCallback = Callable[[],None]
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, led_ctrl : LedControl, fps : float = 25):
+        self.__led_ctrl = led_ctrl
+        self.__fps = fps
+        self.__mutex = threading.Lock()
+        self.__thread : Optional[threading.Thread] = None
+        self.__stop_event = threading.Event()
+        self.__invalid = False
+
+
+    def play(self, anim : Animation, on_done : Optional[DoneCallback] = None):
+        """ Precompute and start the animation, replaces a running one. """
+        fps,ids,colors = self.__tick_rate(anim)
+        led_pkt = self.__led_ctrl.led_pkt
+        n_ticks = len(colors)
+
+        frames = [[led_pkt(int(c),sc_id) for sc_id,c in zip(ids,row)] for row in colors]
+        prev = np.roll(colors,1,axis=0)
+        changed = colors != prev
+        if not anim.loop:
+            changed[0] = True
+        deltas = [[frames[k][i] for i in np.flatnonzero(changed[k])] for k in range(n_ticks)]
+
+        self.stop()
+        with self.__mutex:
+            self.__stop_event = threading.Event()
+            self.__thread = threading.Thread(target=self.__run,
+                args=(colors,frames,deltas,fps,anim.loop,on_done,self.__stop_event),daemon=True)
+            self.__thread.start()
+
+    def stop(self, blank : bool = False):
+        with self.__mutex:
+            thread = self.__thread
+            self.__thread = None
+            self.__stop_event.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        if blank:
+            self.__led_ctrl.set_led_color_val(0)
+
+    def isPlaying(self) -> bool:
+        with self.__mutex:
+            return self.__thread is not None and self.__thread.is_alive()
+
+    def invalidate(self):
+        """ Resend the full current tick, e.g. after other writers changed the LEDs. """
+        self.__invalid = True
+
+
+    def handleCommand(self,cmd : str) -> bool:
+        cmd_parts = cmd.split()
+        cmd_len = len(cmd_parts)
+
+        if(cmd_len < 2 or cmd_parts[0] != "anim"):
+            return False
+
+        if(cmd == "anim stop"):
+            self.stop(blank=True)
+            return True
+
+        if(cmd_len < 3):
+            return False
+
+        color_val = COLOR_VAL_MAP.get(cmd_parts[2])
+        if color_val is None:
+            print(f"Unknown color: {cmd_parts[2]}")
+            return True
+        sc_ids = [int(p) for p in cmd_parts[3:] if p.isdigit() and 1 <= int(p) <= SC_ID_ALL]
+
+        if(cmd_parts[1] == "pulse"):
+            self.play(pulse(color_val,sc_ids or (SC_ID_ALL,)))
+            return True
+        if(cmd_parts[1] == "flash"):
+            self.play(flash(color_val,sc_ids or (SC_ID_ALL,)))
+            return True
+        if(cmd_parts[1] == "sweep"):
+            if not sc_ids:
+                print("Sweep needs the cell IDs in order.")
+                return True
+            self.play(sweep(color_val,sc_ids))
+            return True
+
+        return False
+
+
+    def commandDescription(self,col_width : int = 30) -> str:
+        descr = str() \
+            + descr_entry("anim pulse <color> [<IDs>]",  "Pulse the leds until stopped.",col_width) \
+            + descr_entry("anim flash <color> [<IDs>]",  "Flash the leds three times.",col_width) \
+            + descr_entry("anim sweep <color> <IDs>",    "Light the cells one after the other.",col_width) \
+            + descr_entry("anim stop",                   "Stop the animation, leds off.",col_width)
+        return descr
+
+
+    def __tick_rate(self, anim : Animation):
+        # highest rate <= fps at which the largest change of a tick fits into one period
+        burst_duration = getattr(self.__led_ctrl.hwi().data(),"burst_duration",None)
+        fps = self.__fps
+        ids,colors = anim.sample(fps)
+        for _ in range(3):
+            if burst_duration is None or len(colors) < 2:
+                break
+            n = int(np.max(np.sum(colors != np.roll(colors,1,axis=0),axis=1)))
+            t_burst = burst_duration(n)
+            if t_burst*fps <= 1.0:
+                break
+            fps = 1.0/t_burst
+            ids,colors = anim.sample(fps)
+        if fps < self.__fps:
+            self.logger.info(f"Animation runs at {fps:.1f} fps, the link needs {1e3/fps:.0f} ms per tick.")
+        return fps,ids,colors
+
+    def __run(self, colors, frames, deltas, fps, loop, on_done, stop_event):
+        write_burst = self.__led_ctrl.hwi().data().write_burst
+        n_ticks = len(frames)
+        period = 1.0/fps
+        t0 = time.monotonic()
+        last = -1
+        tick = 0
+        while not stop_event.is_set():
+            tick = int((time.monotonic() - t0)/period)
+            if not loop and tick >= n_ticks:
+                break
+            k = tick % n_ticks
+            if last < 0 or self.__invalid:
+                self.__invalid = False
+                pkts = frames[k]
+            elif tick == last + 1:
+                pkts = deltas[k]
+            else:
+                # ticks skipped: send the difference to the last sent tick
+                pkts = [frames[k][i] for i in np.flatnonzero(colors[k] != colors[last % n_ticks])]
+            if pkts:
+                write_burst(pkts)
+            last = tick
+            stop_event.wait(t0 + (tick + 1)*period - time.monotonic())
+
+        if not stop_event.is_set() and on_done is not None:
+            on_done()
@@ -33,6 +33,7 @@ class LedControl(ICommandHandler):
 
     ScColor = Tuple[int,int]
     ScColorList = List[ScColor]
+    ScColorMap = Dict[int,int]
 
     @property
     def logger(self):
@@ -41,20 +42,54 @@ class LedControl(ICommandHandler):
 
     def __init__(self,hwi : Hwi):
         self.__hwi = hwi
+        self.__pkt_cache : Dict[Tuple[int,int],bytes] = {}
 
     # def __del__(self):
     #     pass
 
 
+    def hwi(self) -> Hwi:
+        return self.__hwi
+
+    def led_pkt(self, color_val : int, id : int = SC_ID_ALL) -> bytes:
+        """ Encoded LED packet, cached per (color, id). """
+        key = (color_val,id)
+        pkt = self.__pkt_cache.get(key)
+        if pkt is None:
+            if len(self.__pkt_cache) >= 65536:
+                self.__pkt_cache.clear()
+            pkt = scn.sc.pkt.led.led_rgb_val(color_val,id)
+            self.__pkt_cache[key] = pkt
+        return pkt
+
     def set_led_color_val(self,color_val : int, id : int = SC_ID_ALL):
         hwi = self.__hwi
-        hwi.data().write(scn.sc.pkt.led.led_rgb_val(color_val,id))
+        hwi.data().write(self.led_pkt(color_val,id))
 
     def set_led_color_rgb(self, r : int, g : int, b : int, id : int = SC_ID_ALL):
         hwi = self.__hwi
         hwi.data().write(scn.sc.pkt.led.led_rgb(r,g,b,id))
 
 
+    def set_led_frame(self, sc_colors : ScColorMap, broadcast : bool = True):
+        """
+        Set the colors (color values) of several cells with one paced burst.
+        With broadcast, a frame of only one color is sent as a single
+        SC_ID_ALL packet, which also sets the cells not in the frame.
+        Until the interface firmware is verified to parse several packets
+        per datagram (data link burst_max_pkts > 1), every cell still costs
+        one write_gap_ms: a 16 cell frame takes ~160 ms (~6 Hz).
+        """
+        if len(sc_colors) == 0:
+            return
+        colors = set(sc_colors.values())
+        if broadcast and len(colors) == 1:
+            self.set_led_color_val(colors.pop())
+            return
+        pkts = [self.led_pkt(color_val,id) for id,color_val in sc_colors.items()]
+        self.__hwi.data().write_burst(pkts)
+
+
     def handleCommand(self,cmd : str) -> bool:
         cmd_parts = cmd.split()
         cmd_len = len(cmd_parts)
@@ -96,8 +131,7 @@ class LedControl(ICommandHandler):
             # self.set_led_color_val(color_val,id)   
 
         if len(sc_color_list) > 0:
-            for sc_color in sc_color_list:
-                self.set_led_color_val(sc_color[1],sc_color[0])
+            self.set_led_frame(dict(sc_color_list),broadcast=False)
             return True  
 
         return False
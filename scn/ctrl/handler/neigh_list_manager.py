@@ -9,6 +9,8 @@ from scn.icommand_handler import ICommandHandler,descr_entry
 from scn.hwi.hwi import HardwareInterface as Hwi
 from scn.core import mask, print_hex_block
 import scn.ctrl.pkt
+from scn.ctrl.topology import Topology
+from scn.sc.stream import StreamSource
 
 
 class Neighbors(TypedDict):
@@ -17,7 +19,7 @@ class Neighbors(TypedDict):
 
 
 
-class NeighListManager(ICommandHandler):
+class NeighListManager(ICommandHandler,StreamSource):
     ScIds = List[int]
     ScNeighbors = Tuple[int,Tuple[int,int,int,int]]
     ScNeighborsList = List[ScNeighbors]
@@ -43,6 +45,7 @@ class NeighListManager(ICommandHandler):
 
         self.__sc_neighs : NeighListManager.ScNeighborsList = []
         self.__sc_ids : NeighListManager.ScIds = []
+        self.__topology : Topology = Topology([])
 
         hwi.ctrl().reader().add_callback(self.__ctrl_packets_handler)
 
@@ -74,6 +77,24 @@ class NeighListManager(ICommandHandler):
         with self.__mutex:
             self.__cb_list.append(cb)
 
+    def sc_ids(self) -> ScIds:
+        with self.__mutex:
+            return self.__sc_ids
+
+    def sc_neighbors(self) -> ScNeighborsList:
+        with self.__mutex:
+            return self.__sc_neighs
+
+    def topology(self) -> Topology:
+        """ Indexed topology of the last complete neighbor list, see scn.ctrl.topology. """
+        with self.__mutex:
+            return self.__topology
+
+    def remove_callback(self, cb : Callback):
+        with self.__mutex:
+            if cb in self.__cb_list:
+                self.__cb_list.remove(cb)
+
 
     def __ctrl_packets_handler(self,data : bytes):
         # print(f"NeighListHandler: len = {len(data)}")
@@ -117,21 +138,20 @@ class NeighListManager(ICommandHandler):
         self.__page += 1
 
         if page+1 == n_page:
-            sc_ids = []
-            sc_neighs = []
-            for n in self.__list:
-                sc_ids.append(n[0])
-            sc_ids.sort()
-            for sc_id in sc_ids:
-                for n in self.__list:
-                    if n[0] == sc_id:
-                        sc_neighs.append(n)
+            try:
+                # unchanged skin: same topology, changed skin: cached results of untouched components are kept
+                topology = self.__topology.update(self.__list)
+            except ValueError as e:
+                self.logger.error(f"Invalid neighbor list: {e}")
+                return
             # print(f"Got neighbors:")
             # print(sc_neighs)
 
             with self.__mutex:
+                self.__topology = topology
+                sc_neighs = topology.neighbors_list()
                 self.__sc_neighs = sc_neighs
-                self.__sc_ids = sc_ids
+                self.__sc_ids = topology.ids().tolist()
 
                 for cb in self.__cb_list:
                     cb(sc_neighs)
\ No newline at end of file
@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+
+"""
+Adaptive sensor update rate.
+
+UdrAuto periodically samples load probes and steps the update rate of a
+UdrControl through config["rates"]:
+
+    - down one step when any probe exceeded its budget for down_after
+      periods in a row, so the host sheds rate instead of packets,
+    - up one step when every probe, scaled to the next rate, stays below
+      margin*budget for up_after periods in a row.
+
+A probe returns the load of the last period; its budget is the load that
+must not be exceeded. The built-in probes are
+
+    watch_data_publisher()  share of time the Reader thread spends decoding
+                            and publishing (DataPublisher.load_stats())
+    watch_frames()          share of cells missing in the assembled frames
+                            (FrameAssembler.stats())
+    watch_stream()          fill level of a consumer Stream, 1 when it dropped
+
+A rate set manually (e.g. 'udr 63') while the controller runs stops it.
+
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from scn.icommand_handler import ICommandHandler,descr_entry
+from scn.ctrl.handler.udr_control import UdrControl
+
+
+
+class UdrAuto(ICommandHandler):
+    Probe = Callable[[],float]
+    ProbeEntry = Tuple[str,Probe,float]
+
+    @staticmethod
+    def DefaultConfig() -> dict:
+        return {
+            "period"        : 1.0,
+            "rates"         : (63,125),
+            "cpu_budget"    : 0.5,
+            "loss_budget"   : 0.05,
+            "queue_budget"  : 0.5,
+            "margin"        : 0.8,
+            "up_after"      : 5,
+            "down_after"    : 2,
+        }
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, udr_ctrl : UdrControl, config : Optional[dict] = None):
+        self.__udr = udr_ctrl
+        self.__config = UdrAuto.DefaultConfig()
+        self.__config.update(config or {})
+        self.__rates = sorted(self.__config["rates"])
+        self.__max_rate = self.__rates[-1]
+
+        self.__mutex = threading.Lock()
+        self.__probes : List[UdrAuto.ProbeEntry] = []
+        self.__loads : Dict[str,float] = {}
+        self.__n_over = 0
+        self.__n_under = 0
+
+        self.__stop_event = threading.Event()
+        self.__thread : Optional[threading.Thread] = None
+
+        udr_ctrl.add_callback(self.__rate_handler)
+
+
+    def add_probe(self, name : str, probe : Probe, budget : float):
+        with self.__mutex:
+            self.__probes.append((name,probe,budget))
+
+    def watch_data_publisher(self, data_pub, budget : Optional[float] = None):
+        last = [data_pub.load_stats(),time.monotonic()]
+        def probe():
+            stats,t = data_pub.load_stats(),time.monotonic()
+            busy = (stats["busy"] - last[0]["busy"])/max(t - last[1],1e-6)
+            last[0],last[1] = stats,t
+            return busy
+        self.add_probe("cpu",probe,budget or self.__config["cpu_budget"])
+
+    def watch_frames(self, frames, budget : Optional[float] = None):
+        last = [frames.stats()]
+        def probe():
+            stats = frames.stats()
+            n_frames = stats["frames"] - last[0]["frames"]
+            n_missing = stats["missing"] - last[0]["missing"]
+            last[0] = stats
+            n_cells = len(frames.sc_ids())
+            return n_missing/(n_frames*n_cells) if n_frames and n_cells else 0.0
+        self.add_probe("loss",probe,budget or self.__config["loss_budget"])
+
+    def watch_stream(self, stream, name : str = "queue", budget : Optional[float] = None):
+        last = [stream.dropped()]
+        def probe():
+            dropped = stream.dropped()
+            fill = 1.0 if dropped != last[0] else stream.qsize()/stream.maxsize()
+            last[0] = dropped
+            return fill
+        self.add_probe(name,probe,budget or self.__config["queue_budget"])
+
+
+    def start(self):
+        if self.isStarted():
+            return
+        self.__stop_event.clear()
+        self.__n_over = 0
+        self.__n_under = 0
+        self.__thread = threading.Thread(target=self.__run,daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if not self.isStarted():
+            return
+        self.__stop_event.set()
+        if threading.current_thread() is not self.__thread:
+            self.__thread.join()
+        self.__thread = None
+
+    def isStarted(self) -> bool:
+        return self.__thread is not None
+
+
+    def set_max_rate(self, rate : int):
+        """ Highest rate the controller may select, e.g. 125 for high intensity exercises. """
+        with self.__mutex:
+            self.__max_rate = rate
+
+    def loads(self) -> Dict[str,float]:
+        """ Load of every probe in the last period relative to its budget. """
+        with self.__mutex:
+            return dict(self.__loads)
+
+
+    def step(self):
+        """ One control period: sample the probes and adjust the rate. """
+        with self.__mutex:
+            rate = self.__udr.rate()
+            loads = { name : probe()/budget for name,probe,budget in self.__probes }
+            self.__loads = loads
+            rates = [r for r in self.__rates if r <= self.__max_rate] or self.__rates[:1]
+            if rate not in self.__rates:
+                # stopped (udr 0) or unknown: nothing to adapt
+                return
+
+            worst = max(loads.values(),default=0.0)
+            lower = [r for r in rates if r < rate]
+            higher = [r for r in rates if r > rate]
+            new_rate = None
+
+            if rate > rates[-1]:
+                new_rate = rates[-1]
+            elif worst > 1.0:
+                self.__n_under = 0
+                self.__n_over += 1
+                if self.__n_over >= self.__config["down_after"] and lower:
+                    new_rate = lower[-1]
+            else:
+                self.__n_over = 0
+                # loads scale with the rate
+                if higher and worst*higher[0]/rate < self.__config["margin"]:
+                    self.__n_under += 1
+                    if self.__n_under >= self.__config["up_after"]:
+                        new_rate = higher[0]
+                else:
+                    self.__n_under = 0
+
+            if new_rate is None:
+                return
+            self.__n_over = 0
+            self.__n_under = 0
+
+        self.logger.info(f"Update rate {rate} Hz -> {new_rate} Hz, loads: {loads}")
+        self.__udr.set_rate(new_rate)
+
+
+    def handleCommand(self,cmd : str) -> bool:
+        cmd_parts = cmd.split()
+        cmd_len = len(cmd_parts)
+
+        if(cmd_len >= 2 and cmd_parts[:2] == ["udr","auto"]):
+            if(cmd_len == 2):
+                state = "on" if self.isStarted() else "off"
+                loads = ", ".join(f"{name}: {load:.2f}" for name,load in self.loads().items())
+                print(f"udr auto {state}, rate: {self.__udr.rate()} Hz, max: {self.__max_rate} Hz, loads: {loads}")
+                return True
+
+            if(cmd_parts[2] == "on"):
+                if(cmd_len == 4 and cmd_parts[3].isdigit()):
+                    self.set_max_rate(int(cmd_parts[3]))
+                if self.__udr.rate() not in self.__rates:
+                    self.__udr.set_rate(self.__rates[0])
+                self.start()
+                return True
+
+            if(cmd_parts[2] == "off"):
+                self.stop()
+                return True
+
+        return False
+
+
+    def commandDescription(self,col_width : int = 30) -> str:
+        descr = str() \
+            + descr_entry("udr auto",                   "Show adaptive update rate state and probe loads.",col_width) \
+            + descr_entry("udr auto on [max_freq]",     "Adapt update rate to host load (up to <max_freq>).",col_width) \
+            + descr_entry("udr auto off",               "Stop adapting the update rate.",col_width)
+        return descr
+
+
+    def __rate_handler(self, rate : int):
+        # manual rate changes take over
+        if self.isStarted() and threading.current_thread() is not self.__thread:
+            self.logger.info(f"Update rate set to {rate} Hz manually, adaptive control off.")
+            self.stop()
+
+
+    def __run(self):
+        while not self.__stop_event.wait(self.__config["period"]):
+            try:
+                self.step()
+            except Exception as e:
+                self.logger.error(f"Update rate control failed: {e}")
@@ -2,6 +2,8 @@
 
 
 import logging
+import threading
+from typing import Callable, List, Optional
 
 from scn.icommand_handler import ICommandHandler,descr_entry
 from scn.hwi.hwi import HardwareInterface as Hwi
@@ -10,6 +12,8 @@ import scn.ctrl.pkt
 
 
 class UdrControl(ICommandHandler):
+    Callback = Callable[[int],None]
+    CallbackList = List[Callback]
 
     @property
     def logger(self):
@@ -18,37 +22,61 @@ class UdrControl(ICommandHandler):
 
     def __init__(self,hwi : Hwi):
         self.__hwi = hwi
+        self.__mutex = threading.Lock()
+        self.__cb_list : UdrControl.CallbackList = []
+        self.__rate : Optional[int] = None
 
     # def __del__(self):
     #     pass
 
 
+    def add_callback(self, cb : Callback):
+        with self.__mutex:
+            self.__cb_list.append(cb)
+
+    def remove_callback(self, cb : Callback):
+        with self.__mutex:
+            if cb in self.__cb_list:
+                self.__cb_list.remove(cb)
+
+
+    def set_rate(self, rate : int):
+        """ Set the sensor update rate in Hz, one of scn.ctrl.pkt.UDR_RATES. """
+        pkt = scn.ctrl.pkt.udr_cmd_pkt(rate)
+        with self.__mutex:
+            self.__hwi.ctrl().write(pkt)
+            self.__rate = rate
+            cb_list = list(self.__cb_list)
+
+        for cb in cb_list:
+            cb(rate)
+
+    def rate(self) -> Optional[int]:
+        """ Last rate set through this handler, None if unknown. """
+        with self.__mutex:
+            return self.__rate
+
+
     def handleCommand(self,cmd : str) -> bool:
         cmd_parts = cmd.split()
         cmd_len = len(cmd_parts)
 
-        hwi = self.__hwi
-
-        if(cmd == "udr 0"):
-            pkt = scn.ctrl.pkt.UDR_0HZ_CMD_PKT
-            hwi.ctrl().write(pkt)
-            return True
-        
-        if(cmd == "udr 63"):
-            pkt = scn.ctrl.pkt.UDR_63HZ_CMD_PKT
-            hwi.ctrl().write(pkt)
+        if(cmd_len == 2 and cmd_parts[0] == "udr" and cmd_parts[1].isdigit()):
+            try:
+                self.set_rate(int(cmd_parts[1]))
+            except ValueError as e:
+                print(e)
             return True
-        
 
         if(cmd == "ls udr"):
             resp = str()
-            resp += "udr 0\n"
-            resp += "udr 63\n"
+            for rate in scn.ctrl.pkt.UDR_RATES:
+                resp += f"udr {rate}\n"
             print(resp)
             return True
-        
+
         return False
-    
+
 
     def commandDescription(self,col_width : int = 30) -> str:
         descr = str() \
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+
+"""
+2D hex grid layout of the skin cells inferred from the neighbor list.
+
+Skin cells are hexagons; port k of a cell faces the hex direction
+port_dirs[k] when the cell is not rotated. For two connected cells A
+(port pa) and B (port pb) the global directions of both ports must be
+opposite, which gives the position and the rotation of B from A. The
+solver places every connected component by breadth first search from its
+lowest ID (at the origin, rotation 0) and puts the components side by
+side along x. Contradicting neighbor entries are counted as conflicts.
+
+Axial hex coordinates (q,r), pointy top; cartesian positions are in units
+of the cell pitch (distance between neighbor centers).
+
+Layouts are cached on disk keyed by the topology hash and port_dirs:
+
+    layout = load_or_infer_layout(nl.topology())
+
+"""
+
+import hashlib
+import logging
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from scn.ctrl.topology import Topology, N_PORTS
+
+
+# axial neighbor offsets, counter-clockwise starting east
+HEX_DIRS = np.array([(1,0),(1,-1),(0,-1),(-1,0),(-1,1),(0,1)],dtype=np.int64)
+
+# hex direction of ports 0..3 of an unrotated cell
+DEFAULT_PORT_DIRS = (0,1,3,4)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"),".cache","scn","layout")
+
+
+def axial_to_xy(axial : np.ndarray) -> np.ndarray:
+    q = axial[:,0].astype(float)
+    r = axial[:,1].astype(float)
+    return np.stack((q + 0.5*r,-np.sqrt(3)/2*r),axis=1)
+
+
+
+class Layout:
+
+    def __init__(self, ids : np.ndarray, axial : np.ndarray, rot : np.ndarray, key : str, n_conflicts : int = 0):
+        self.__ids = ids
+        self.__axial = axial
+        self.__rot = rot
+        self.__xy = axial_to_xy(axial)
+        self.__key = key
+        self.__n_conflicts = n_conflicts
+        self.__lut = { int(sc_id) : ind for ind,sc_id in enumerate(ids) }
+
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def key(self) -> str:
+        return self.__key
+
+    def ids(self) -> np.ndarray:
+        return self.__ids
+
+    def axial(self) -> np.ndarray:
+        """ Axial hex coordinates (q,r), shape (n,2), rows ordered like ids(). """
+        return self.__axial
+
+    def xy(self) -> np.ndarray:
+        """ Cartesian cell centers in cell pitch units, shape (n,2). """
+        return self.__xy
+
+    def rot(self) -> np.ndarray:
+        """ Rotation of every cell in steps of 60 degrees. """
+        return self.__rot
+
+    def n_conflicts(self) -> int:
+        return self.__n_conflicts
+
+
+    def xy_of(self, sc_ids : Sequence[int]) -> np.ndarray:
+        """ Cartesian positions of the given IDs, NaN for unknown IDs. """
+        out = np.full((len(sc_ids),2),np.nan)
+        for k,sc_id in enumerate(sc_ids):
+            ind = self.__lut.get(int(sc_id))
+            if ind is not None:
+                out[k] = self.__xy[ind]
+        return out
+
+
+    def zones(self, n_zones : int, axis : int = 0) -> List[np.ndarray]:
+        """ Split the cells into n_zones bands of (nearly) equal size along x (axis 0) or y (axis 1). Returns ID arrays. """
+        order = np.lexsort((self.__ids,self.__xy[:,axis]))
+        return [self.__ids[part] for part in np.array_split(order,n_zones)]
+
+
+    def save(self, path : str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp,ids=self.__ids,axial=self.__axial,rot=self.__rot,
+                 key=np.array(self.__key),n_conflicts=np.array(self.__n_conflicts))
+        os.replace(tmp,path)
+
+    @staticmethod
+    def load(path : str) -> "Layout":
+        with np.load(path) as d:
+            return Layout(d["ids"],d["axial"],d["rot"],str(d["key"]),int(d["n_conflicts"]))
+
+
+
+def layout_key(topology : Topology, port_dirs : Sequence[int] = DEFAULT_PORT_DIRS) -> str:
+    h = hashlib.sha1(topology.hash().encode())
+    h.update(bytes(port_dirs))
+    return h.hexdigest()
+
+
+def infer_layout(topology : Topology, port_dirs : Sequence[int] = DEFAULT_PORT_DIRS) -> Layout:
+    if len(port_dirs) != N_PORTS:
+        raise ValueError(f"Need {N_PORTS} port directions, got {len(port_dirs)}.")
+    port_dirs = np.asarray(port_dirs,dtype=np.int64)
+    n = len(topology)
+    ports = topology.ports()
+    axial = np.zeros((n,2),dtype=np.int64)
+    rot = np.zeros(n,dtype=np.int64)
+    placed = np.zeros(n,dtype=bool)
+    n_conflicts = 0
+    x_off = 0
+
+    for root in range(n):
+        if placed[root]:
+            continue
+        comp = [root]
+        placed[root] = True
+        head = 0
+        while head < len(comp):
+            i = comp[head]
+            head += 1
+            for pa in range(N_PORTS):
+                j = ports[i,pa]
+                if j < 0:
+                    continue
+                d = (port_dirs[pa] + rot[i]) % 6
+                pos = axial[i] + HEX_DIRS[d]
+                back = np.flatnonzero(ports[j] == i)
+                r = (d + 3 - port_dirs[back[0]]) % 6 if len(back) else rot[i]
+                if placed[j]:
+                    if np.any(axial[j] != pos) or rot[j] != r:
+                        n_conflicts += 1
+                    continue
+                axial[j] = pos
+                rot[j] = r
+                placed[j] = True
+                comp.append(j)
+
+        # move the component right of the previous ones
+        c = np.array(comp)
+        xy = axial_to_xy(axial[c])
+        axial[c,0] += int(np.ceil(x_off - xy[:,0].min()))
+        x_off = axial_to_xy(axial[c])[:,0].max() + 2.0
+
+    return Layout(topology.ids().copy(),axial,rot,layout_key(topology,port_dirs),n_conflicts)
+
+
+def load_or_infer_layout(topology : Topology,
+        cache_dir : Optional[str] = DEFAULT_CACHE_DIR,
+        port_dirs : Sequence[int] = DEFAULT_PORT_DIRS) -> Layout:
+    """ Cached infer_layout(), cache_dir = None disables the cache. """
+    logger = logging.getLogger(__name__)
+    key = layout_key(topology,port_dirs)
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir,f"{key}.npz")
+        if os.path.exists(path):
+            try:
+                return Layout.load(path)
+            except Exception as e:
+                logger.warning(f"Ignoring broken layout cache {path}: {e}")
+
+    layout = infer_layout(topology,port_dirs)
+    if layout.n_conflicts():
+        logger.warning(f"Layout has {layout.n_conflicts()} conflicting neighbor entries.")
+
+    if path is not None:
+        try:
+            os.makedirs(cache_dir,exist_ok=True)
+            layout.save(path)
+        except OSError as e:
+            logger.warning(f"Could not write layout cache {path}: {e}")
+    return layout
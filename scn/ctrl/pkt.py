@@ -156,3 +156,11 @@ E_OFF_CMD_PKT = \
     ])
 
 
+
+# supported sensor update rates in Hz
+UDR_RATES = (0,63,125)
+
+def udr_cmd_pkt(rate : int) -> bytes:
+    if rate not in UDR_RATES:
+        raise ValueError(f"Unsupported update rate: {rate} Hz, supported: {UDR_RATES}")
+    return UDR_0HZ_CMD_PKT[:-1] + bytes([rate])
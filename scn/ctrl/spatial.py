@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+"""
+Spatial operators on the skin cell topology.
+
+SpatialKernels precomputes the sparse (CSR) adjacency of a Topology once;
+every operator then runs over all cells at once as a sparse matrix-vector
+product (np.bincount over the edge list), so the cost per frame is linear
+in the number of cells and connections:
+
+    smooth()        neighborhood mean, optionally repeated
+    label_blobs()   connected contact blobs above a threshold
+    blobs()         blob area (cells), force weighted centroid, peak force
+
+Values are given in topology order (Topology.ids()); align() maps the
+rows of a Frame (or any ID/value pair) to that order.
+
+    k = SpatialKernels(topology,layout)
+    force = k.align(frame["sc_ids"],frame["values"][:,FORCE_INDS].max(axis=1))
+    b = k.blobs(k.smooth(force),threshold=0.2)
+
+"""
+
+from typing import Optional, Sequence, TypedDict
+
+import numpy as np
+
+from scn.ctrl.topology import Topology
+from scn.ctrl.layout import Layout
+from scn.sc.pkt.data import SENS_IND_FORCE1, SENS_IND_FORCE3
+
+
+# force1..force3 in the Data1200 value layout
+FORCE_INDS = slice(SENS_IND_FORCE1,SENS_IND_FORCE3+1)
+
+
+class Blobs(TypedDict):
+    labels:         np.ndarray      # blob label of every cell, -1 below threshold, shape (n_cells,)
+    area:           np.ndarray      # number of cells of every blob, shape (n_blobs,)
+    peak:           np.ndarray      # peak value of every blob
+    peak_id:        np.ndarray      # skin cell ID of the peak
+    centroid:       np.ndarray      # value weighted centroid, shape (n_blobs,2), NaN without layout
+
+
+
+class SpatialKernels:
+
+    def __init__(self, topology : Topology, layout : Optional[Layout] = None, self_weight : float = 1.0):
+        self.__topology = topology
+        self.__n = len(topology)
+        self.__rows = topology.rows()
+        self.__cols = topology.indices()
+        # smoothing: (self_weight*x + A@x)/(self_weight + degree)
+        self.__self_weight = self_weight
+        self.__norm = 1.0/(self_weight + topology.degree())
+
+        self.__xy : Optional[np.ndarray] = None
+        if layout is not None:
+            self.__xy = layout.xy_of(topology.ids())
+
+
+    def __len__(self) -> int:
+        return self.__n
+
+    def topology(self) -> Topology:
+        return self.__topology
+
+
+    def align(self, sc_ids : Sequence[int], values : np.ndarray, fill : float = 0.0) -> np.ndarray:
+        """ Values of the given cells in topology order, fill for cells without a value. Unknown IDs are dropped. """
+        values = np.asarray(values,dtype=float)
+        ind = self.__topology.indices_of(sc_ids)
+        ok = ind >= 0
+        out = np.full((self.__n,) + values.shape[1:],fill)
+        out[ind[ok]] = values[ok]
+        return out
+
+
+    def matvec(self, x : np.ndarray) -> np.ndarray:
+        """ A @ x with the (unweighted) adjacency matrix A; x of shape (n,) or (n,k). """
+        x = np.asarray(x,dtype=float)
+        if x.ndim == 1:
+            return np.bincount(self.__rows,weights=x[self.__cols],minlength=self.__n)
+        xc = x[self.__cols]
+        return np.stack([np.bincount(self.__rows,weights=xc[:,k],minlength=self.__n)
+                         for k in range(x.shape[1])],axis=1)
+
+
+    def smooth(self, x : np.ndarray, iterations : int = 1) -> np.ndarray:
+        """ Mean over every cell and its neighbors, repeated iterations times. """
+        x = np.asarray(x,dtype=float)
+        norm = self.__norm if x.ndim == 1 else self.__norm[:,None]
+        for _ in range(iterations):
+            x = (self.__self_weight*x + self.matvec(x))*norm
+        return x
+
+
+    def label_blobs(self, x : np.ndarray, threshold : float) -> np.ndarray:
+        """ Label the connected groups of cells with x > threshold as 0,1,... (ordered by lowest index), -1 elsewhere. """
+        x = np.asarray(x)
+        active = x > threshold
+        labels = np.full(self.__n,-1,dtype=np.int64)
+        if not active.any():
+            return labels
+
+        # edges between active cells, rows stay sorted
+        m = active[self.__rows] & active[self.__cols]
+        r = self.__rows[m]
+        c = self.__cols[m]
+        lab = np.arange(self.__n)
+        if len(r):
+            starts = np.flatnonzero(np.r_[True,r[1:] != r[:-1]])
+            ur = r[starts]
+            # min label propagation with pointer jumping, labels stay
+            # cell indices of the same blob and never increase
+            while True:
+                new = lab.copy()
+                new[ur] = np.minimum(new[ur],np.minimum.reduceat(lab[c],starts))
+                new = new[new]
+                if np.array_equal(new,lab):
+                    break
+                lab = new
+
+        _,labels[active] = np.unique(lab[active],return_inverse=True)
+        return labels
+
+
+    def blobs(self, x : np.ndarray, threshold : float) -> Blobs:
+        """ Contact blobs of x above threshold with area, peak and centroid. """
+        x = np.asarray(x,dtype=float)
+        labels = self.label_blobs(x,threshold)
+        act = np.flatnonzero(labels >= 0)
+        lab = labels[act]
+        xa = x[act]
+        n_blobs = int(lab.max()) + 1 if len(lab) else 0
+
+        area = np.bincount(lab,minlength=n_blobs)
+
+        # peak: last entry of every blob when sorted by (label,value)
+        order = np.lexsort((xa,lab))
+        last = np.cumsum(area) - 1
+        peak_ind = act[order[last]]
+        peak = x[peak_ind]
+        peak_id = self.__topology.ids()[peak_ind]
+
+        centroid = np.full((n_blobs,2),np.nan)
+        if self.__xy is not None and n_blobs:
+            w = np.clip(xa - threshold,0,None)
+            wsum = np.bincount(lab,weights=w,minlength=n_blobs)
+            xy = self.__xy[act]
+            for k in range(2):
+                centroid[:,k] = np.bincount(lab,weights=w*xy[:,k],minlength=n_blobs)
+            centroid /= np.where(wsum > 0,wsum,1)[:,None]
+
+        return Blobs(labels=labels,area=area,peak=peak,peak_id=peak_id,centroid=centroid)
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+
+"""
+Indexed skin cell topology built from the neighbor list.
+
+The neighbor list of the interface holds, for every skin cell, the IDs of
+the cells connected to its ports 0..3. Topology turns it into index based
+arrays:
+
+    ids         skin cell IDs, ascending; the index of a cell is its position here
+    ports       (n,4) index of the neighbor at each port, -1 if unconnected
+    indptr      CSR row pointers of the undirected adjacency
+    indices     CSR column indices (neighbor indices), ascending per row
+
+Construction is linear in the number of cells (ID lookup through a table
+over the 14 bit ID space). Connected components and hop distances are
+computed on first use and cached. update() builds the topology of a new
+neighbor list and carries over the cached results of the components the
+changed cells cannot affect.
+
+"""
+
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scn.sc.pkt.tools import SC_ID_ALL
+
+
+N_PORTS = 4
+
+ScNeighbors = Tuple[int,Tuple[int,int,int,int]]
+ScNeighborsList = List[ScNeighbors]
+
+
+
+class Topology:
+
+    def __init__(self, neighs : ScNeighborsList):
+        n = len(neighs)
+        ids = np.fromiter((e[0] for e in neighs),dtype=np.int64,count=n)
+        nids = np.array([e[1] for e in neighs],dtype=np.int64).reshape(n,N_PORTS)
+
+        order = np.argsort(ids,kind="stable")
+        ids = ids[order]
+        nids = nids[order]
+        if n > 1 and np.any(ids[1:] == ids[:-1]):
+            raise ValueError("Duplicate skin cell IDs in neighbor list.")
+        if n and (ids[0] < 0 or ids[-1] > SC_ID_ALL):
+            raise ValueError(f"Skin cell ID out of range [0,{SC_ID_ALL}] in neighbor list.")
+
+        # ID -> index lookup table over the whole ID space
+        lut = np.full(SC_ID_ALL + 1,-1,dtype=np.int64)
+        lut[ids] = np.arange(n)
+        in_range = (nids >= 0) & (nids <= SC_ID_ALL)
+        ports = np.where(in_range,lut[np.clip(nids,0,SC_ID_ALL)],-1)
+        # no self loops
+        ports[ports == np.arange(n)[:,None]] = -1
+
+        # undirected edge set, both directions
+        src = np.repeat(np.arange(n),N_PORTS)
+        dst = ports.ravel()
+        m = dst >= 0
+        src,dst = src[m],dst[m]
+        key = np.unique(np.concatenate((src*n + dst,dst*n + src)))
+        rows = key // n if n else key
+        cols = key % n if n else key
+
+        self.__neighs = [(int(i),tuple(int(v) for v in nv)) for i,nv in zip(ids,nids)]
+        self.__ids = ids
+        self.__lut = lut
+        self.__ports = ports
+        self.__indptr = np.concatenate(([0],np.cumsum(np.bincount(rows,minlength=n)))).astype(np.int64)
+        self.__indices = cols.astype(np.int64)
+        self.__rows = rows.astype(np.int64)
+
+        self.__hash : Optional[str] = None
+        self.__labels : Optional[np.ndarray] = None
+        self.__hops : Dict[int,np.ndarray] = {}
+
+
+    def update(self, neighs : ScNeighborsList) -> "Topology":
+        """
+        Topology of a new neighbor list. Returns self if nothing changed. With the same
+        cells, the components and hop distances of the old components that contain
+        no changed cell (the cell whose ports changed and its old and new neighbors)
+        are carried over; only the affected components are labeled again. Raises
+        ValueError like the constructor.
+        """
+        new = Topology(neighs)
+        if new == self:
+            return self
+        if not np.array_equal(new.__ids,self.__ids) or (self.__labels is None and not self.__hops):
+            return new
+
+        changed = np.flatnonzero(np.any(new.__ports != self.__ports,axis=1))
+        touched = np.concatenate((changed,self.__ports[changed].ravel(),new.__ports[changed].ravel()))
+        touched = touched[touched >= 0]
+        old_labels = self.components()
+        affected = np.isin(old_labels,old_labels[touched])
+
+        # edges of unaffected cells are unchanged and stay among unaffected cells
+        labels = old_labels.copy()
+        labels[affected] = -1
+        new.__label_from(labels,np.flatnonzero(affected),int(old_labels.max()) + 1)
+        # relabel in order of the first cell
+        _,first,inv = np.unique(labels,return_index=True,return_inverse=True)
+        new.__labels = np.argsort(np.argsort(first))[inv]
+        new.__hops = {src : dist for src,dist in self.__hops.items() if not affected[src]}
+        return new
+
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other,Topology) and self.__neighs == other.__neighs
+
+    def __hash__(self):
+        return hash(self.hash())
+
+
+    def neighbors_list(self) -> ScNeighborsList:
+        """ Neighbor list sorted by ID, as published by the NeighListManager. """
+        return list(self.__neighs)
+
+    def hash(self) -> str:
+        """ Stable hash of the topology, e.g. as cache key. """
+        if self.__hash is None:
+            h = hashlib.sha1()
+            h.update(self.__ids.astype("<i8").tobytes())
+            h.update(self.__ports.astype("<i8").tobytes())
+            self.__hash = h.hexdigest()
+        return self.__hash
+
+
+    def ids(self) -> np.ndarray:
+        return self.__ids
+
+    def ports(self) -> np.ndarray:
+        return self.__ports
+
+    def indptr(self) -> np.ndarray:
+        return self.__indptr
+
+    def indices(self) -> np.ndarray:
+        return self.__indices
+
+    def rows(self) -> np.ndarray:
+        """ Row index of every CSR entry (COO form). """
+        return self.__rows
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.__indptr)
+
+
+    def index(self, sc_id : int) -> int:
+        """ Index of a skin cell ID, -1 if unknown. """
+        if sc_id < 0 or sc_id > SC_ID_ALL:
+            return -1
+        return int(self.__lut[sc_id])
+
+    def indices_of(self, sc_ids) -> np.ndarray:
+        """ Vectorized index(), -1 for unknown IDs. """
+        sc_ids = np.asarray(sc_ids,dtype=np.int64)
+        ok = (sc_ids >= 0) & (sc_ids <= SC_ID_ALL)
+        return np.where(ok,self.__lut[np.clip(sc_ids,0,SC_ID_ALL)],-1)
+
+
+    def neighbor(self, sc_id : int, port : int) -> Optional[int]:
+        """ ID of the cell connected to the given port, None if unconnected. """
+        ind = self.index(sc_id)
+        if ind < 0:
+            return None
+        n_ind = self.__ports[ind,port]
+        return None if n_ind < 0 else int(self.__ids[n_ind])
+
+    def neighbors(self, sc_id : int) -> List[int]:
+        ind = self.index(sc_id)
+        if ind < 0:
+            return []
+        return self.__ids[self.__indices[self.__indptr[ind]:self.__indptr[ind+1]]].tolist()
+
+
+    def components(self) -> np.ndarray:
+        """ Connected component label of every cell, labels 0,1,... in order of the first cell. """
+        if self.__labels is None:
+            labels = np.full(len(self.__ids),-1,dtype=np.int64)
+            self.__label_from(labels,range(len(self.__ids)),0)
+            self.__labels = labels
+        return self.__labels
+
+    def __label_from(self, labels : np.ndarray, starts, label : int):
+        # depth first labeling of the unlabeled (-1) cells reachable from starts
+        indptr = self.__indptr
+        indices = self.__indices
+        for start in starts:
+            if labels[start] >= 0:
+                continue
+            labels[start] = label
+            stack = [start]
+            while stack:
+                i = stack.pop()
+                for j in indices[indptr[i]:indptr[i+1]]:
+                    if labels[j] < 0:
+                        labels[j] = label
+                        stack.append(j)
+            label += 1
+
+    def n_components(self) -> int:
+        labels = self.components()
+        return int(labels.max()) + 1 if len(labels) else 0
+
+
+    def hops(self, sc_id : int) -> np.ndarray:
+        """ Hop distance of every cell from the given cell, -1 if unreachable. """
+        src = self.index(sc_id)
+        if src < 0:
+            raise KeyError(f"Unknown skin cell ID: {sc_id}")
+        dist = self.__hops.get(src)
+        if dist is None:
+            n = len(self.__ids)
+            dist = np.full(n,-1,dtype=np.int64)
+            dist[src] = 0
+            frontier = np.array([src],dtype=np.int64)
+            d = 0
+            indptr = self.__indptr
+            indices = self.__indices
+            while len(frontier):
+                d += 1
+                nxt = np.concatenate([indices[indptr[i]:indptr[i+1]] for i in frontier])
+                nxt = np.unique(nxt[dist[nxt] < 0])
+                dist[nxt] = d
+                frontier = nxt
+            self.__hops[src] = dist
+        return dist
@@ -4,8 +4,9 @@
 import json
 import logging
 import socket
+import threading
 import time
-from typing import Tuple
+from typing import List, Tuple
 
 from scn.sc.pkt.tools import dummy_pkt
 from scn.hwi.reader import Reader
@@ -20,6 +21,8 @@ class DataLink(ILink):
             "pc_ip_ep"         : "0.0.0.0:17011",
             "wi_ip_ep"         : "192.168.4.1:17010",
             "read_timeout_ms"  : 200,
+            "write_gap_ms"     : 10,    # min. time between two datagrams to the sc
+            "burst_max_pkts"   : 1,     # max. packets per datagram in write_burst(), >1 needs firmware support
         }
 
 
@@ -34,6 +37,8 @@ class DataLink(ILink):
         self.__sock = None
         self.__reader = Reader(self)
         self.__read_buf : bytes = None
+        self.__write_mutex = threading.Lock()
+        self.__t_next_write = 0.0
 
 
     def __del__(self):
@@ -126,14 +131,48 @@ class DataLink(ILink):
             self.logger.error("Device not opened.")
             return False
         
-        self.__sock.sendto(data, self.__wi_ip_ep)
-        time.sleep(10e-3)    # do not send data to the sc too fast
+        with self.__write_mutex:
+            self.__send_paced(data)
         return True
 
+    def write_burst(self, pkts : List[bytes]) -> bool:
+        """
+        Send several 20 byte packets with as few datagrams as possible:
+        burst_max_pkts packets are concatenated per datagram, the datagrams
+        are paced like single writes. The burst is not interleaved with
+        other writes. The default of 1 packet per datagram is the wire
+        format of single writes; raise it only for interface firmware that
+        parses several packets per datagram. With the defaults a burst of n
+        packets takes n*write_gap_ms (16 cells: ~160 ms), see burst_duration().
+        """
+        if not self.isOpened():
+            self.logger.error("Device not opened.")
+            return False
+
+        n_max = max(1,self.__config.get("burst_max_pkts",1))
+        with self.__write_mutex:
+            for ind in range(0,len(pkts),n_max):
+                self.__send_paced(b"".join(pkts[ind:ind+n_max]))
+        return True
+
+    def burst_duration(self, n_pkts : int) -> float:
+        """ Seconds the pacing of write_burst() needs for n_pkts packets. """
+        n_max = max(1,self.__config.get("burst_max_pkts",1))
+        return -(-n_pkts // n_max) * self.__config.get("write_gap_ms",10)/1e3
+
     def reader(self) -> Reader:
         return self.__reader
     
 
+    def __send_paced(self, data : bytes):
+        # do not send data to the sc too fast
+        t_wait = self.__t_next_write - time.monotonic()
+        if t_wait > 0:
+            time.sleep(t_wait)
+        self.__sock.sendto(data, self.__wi_ip_ep)
+        self.__t_next_write = time.monotonic() + self.__config.get("write_gap_ms",10)/1e3
+    
+
     def __read(self) -> bytes:
         try:
             len_max = 1024
@@ -3,7 +3,8 @@
 
 import logging
 import threading
-from typing import Callable, Dict, List, Tuple, TypedDict
+import time
+from typing import Callable, Dict, List, Optional, Tuple, TypedDict
 
 from scn.icommand_handler import ICommandHandler,descr_entry
 from scn.hwi.hwi import HardwareInterface as Hwi
@@ -11,6 +12,9 @@ from scn.core import mask, print_hex_block
 import scn.ctrl.pkt
 
 import scn.sc.pkt.data
+from scn.sc.rolling import DerivedChannels, RollingOp
+from scn.sc.stream import StreamSource
+from scn.sc.shm import ShmWriter
 
 # Value layout for Data1200
 #   0: prox
@@ -24,7 +28,7 @@ import scn.sc.pkt.data
 
 
 
-class DataPublisher:
+class DataPublisher(StreamSource):
     ScIdList = List[int]
     ScData = Tuple[int,List[float]]
     ScDataList = List[ScData] 
@@ -47,6 +51,10 @@ class DataPublisher:
         self.__sc_id_map : DataPublisher.ScIdMap = {}
         self.__sc_ids : DataPublisher.ScIdList = []
         self.__sc_data : DataPublisher.ScDataList = []
+        self.__derived = DerivedChannels(len(scn.sc.pkt.data.GET_RAW_VALUE_FUNCS))
+        self.__shm : ShmWriter = None
+        self.__n_pkts = 0
+        self.__busy = 0.0
 
         hwi.data().reader().add_callback(self.__data_packets_handler)
 
@@ -59,11 +67,19 @@ class DataPublisher:
             self.__sc_ids.clear()
             self.__sc_id_map.clear()
             self.__sc_data.clear()
+            self.__derived.reset()
+            if self.__shm is not None:
+                self.__shm.clear()
 
     def add_callback(self, cb : Callback):
         with self.__mutex:
             self.__cb_list.append(cb)
 
+    def remove_callback(self, cb : Callback):
+        with self.__mutex:
+            if cb in self.__cb_list:
+                self.__cb_list.remove(cb)
+
 
     def sc_id_map(self):
         with self.__mutex:
@@ -78,6 +94,51 @@ class DataPublisher:
             return self.__sc_data
 
 
+    # Derived channels: streaming operators (see scn.sc.rolling) fed with
+    # every sample. Rows are ordered like sc_ids().
+    def add_derived(self, name : str, op : RollingOp):
+        with self.__mutex:
+            self.__derived.add(name,op)
+
+    def remove_derived(self, name : str):
+        with self.__mutex:
+            self.__derived.remove(name)
+
+    def derived(self, name : str):
+        with self.__mutex:
+            return self.__derived.value(name)
+
+
+    # Shared memory mirror of the cell state for other processes,
+    # attach with scn.sc.shm.ShmReader(<name>). The block holds at least
+    # capacity cells and twice the cells known so far; cells beyond it are
+    # counted in its overflow (logged once).
+    def enable_shm(self, name : Optional[str] = None, capacity : int = 256) -> str:
+        with self.__mutex:
+            if self.__shm is None:
+                n_vals = len(scn.sc.pkt.data.GET_RAW_VALUE_FUNCS)
+                self.__shm = ShmWriter(name,max(capacity,2*len(self.__sc_data)),n_vals)
+                for ind,sc_data in enumerate(self.__sc_data):
+                    self.__shm.write_cell(ind,sc_data[0],sc_data[1],time.monotonic())
+            return self.__shm.name()
+
+    def disable_shm(self):
+        with self.__mutex:
+            if self.__shm is not None:
+                self.__shm.close()
+                self.__shm = None
+
+    def shm_name(self) -> Optional[str]:
+        with self.__mutex:
+            return None if self.__shm is None else self.__shm.name()
+
+
+    def load_stats(self) -> dict:
+        """ Packets handled and seconds spent decoding and publishing them (incl. callbacks), cumulative. """
+        with self.__mutex:
+            return { "packets" : self.__n_pkts, "busy" : self.__busy }
+
+
     def __update_data_list(self, sc_data : ScData):
         sc_id = sc_data[0]
         # vals = sc_data[1]
@@ -90,11 +151,13 @@ class DataPublisher:
         else:
             ind = self.__sc_id_map[sc_id]
             self.__sc_data[ind] = sc_data
+        return ind
 
 
     def __data_packets_handler(self,data : bytes):
         if data[0] != 0xFF:
             return
+        t0 = time.perf_counter()
         
         sc_id = scn.sc.pkt.data.get_id(data)
         values = scn.sc.pkt.data.get_data_values(data)
@@ -102,11 +165,18 @@ class DataPublisher:
         sc_data : DataPublisher.ScData = (sc_id,values) 
 
         with self.__mutex:
-            self.__update_data_list(sc_data)
+            ind = self.__update_data_list(sc_data)
+            t = time.monotonic()
+            self.__derived.push(ind,values,t)
+            if self.__shm is not None:
+                self.__shm.write_cell(ind,sc_id,values,t)
 
             for cb in self.__cb_list:
                 cb(sc_data)
 
+            self.__n_pkts += 1
+            self.__busy += time.perf_counter() - t0
+
         # print(f"sc data:")
         # print_hex_block(data)
 
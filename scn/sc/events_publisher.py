@@ -11,9 +11,10 @@ from scn.core import mask, print_hex_block
 import scn.ctrl.pkt
 
 import scn.sc.pkt.events
+from scn.sc.stream import StreamSource
 
 
-class EventsPublisher:
+class EventsPublisher(StreamSource):
     ScEvent = scn.sc.pkt.events.Event
     ScEvents = List[ScEvent]
 
@@ -49,6 +50,11 @@ class EventsPublisher:
         with self.__mutex:
             self.__cb_list.append(cb)
 
+    def remove_callback(self, cb : Callback):
+        with self.__mutex:
+            if cb in self.__cb_list:
+                self.__cb_list.remove(cb)
+
 
     def __event_packets_handler(self,pkt : bytes):
         if pkt[0] != 0xE2:
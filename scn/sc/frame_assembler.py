@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+
+"""
+Cycle-aligned frames from the per-cell Data1200 packets.
+
+The skin cells send one packet each per sampling (UDR) cycle. The
+FrameAssembler collects the packets of one cycle into a single frame with
+one row per cell and publishes it once. A frame is closed when
+
+    - every expected cell delivered its sample (complete frame),
+    - a cell delivers its second sample (the next cycle started), or
+    - timeout_cycles sampling periods passed since its first sample.
+
+Cells that did not deliver a sample keep the values of the previous frame
+and are flagged in Frame.valid.
+
+The expected cells are either set explicitly (e.g. from the neighbor
+list) or learned from the cells seen in the stream.
+
+Callbacks run on the data Reader thread or, for timed out frames, on the
+assembler thread. They get the frame and must not call back into the
+DataPublisher.
+
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, TypedDict
+
+import numpy as np
+
+from scn.sc.data_publisher import DataPublisher
+from scn.sc.stream import StreamSource
+import scn.sc.pkt.data
+
+
+class Frame(TypedDict):
+    seq:            int             # frame counter
+    t:              float           # time.monotonic() when the frame was closed
+    sc_ids:         np.ndarray      # skin cell IDs, ascending, shape (n_cells,)
+    values:         np.ndarray      # sensor values, shape (n_cells,n_vals), Data1200 value layout
+    valid:          np.ndarray      # True if the cell delivered a sample in this cycle, shape (n_cells,)
+
+
+def frame_missing(frame : Frame) -> List[int]:
+    """ IDs of the cells without a sample in this frame. """
+    return frame["sc_ids"][~frame["valid"]].tolist()
+
+
+
+class FrameAssembler(StreamSource):
+    STREAM_MAXSIZE = 64     # frames
+
+    Callback = Callable[[Frame],None]
+    CallbackList = List[Callback]
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, data_pub : DataPublisher, rate_hz : float = 63, timeout_cycles : float = 1.5):
+        self.__data_pub = data_pub
+        self.__n_vals = len(scn.sc.pkt.data.GET_RAW_VALUE_FUNCS)
+        self.__timeout_cycles = timeout_cycles
+        self.__period = 1.0/rate_hz if rate_hz > 0 else None
+
+        self.__cb_list : FrameAssembler.CallbackList = []
+        self.__mutex = threading.Lock()
+        self.__cond = threading.Condition(self.__mutex)
+
+        self.__learn = True
+        self.__sc_ids = np.zeros(0,dtype=np.int64)
+        self.__ind_map : Dict[int,int] = {}
+        self.__values = np.zeros((0,self.__n_vals))
+        self.__valid = np.zeros(0,dtype=bool)
+        self.__n_valid = 0
+        self.__t_first : Optional[float] = None
+        self.__grown = False
+        self.__seq = 0
+        self.__latest : Optional[Frame] = None
+
+        self.__n_frames = 0
+        self.__n_incomplete = 0
+        self.__n_missing = 0
+
+        self.__stop_event = threading.Event()
+        self.__thread = threading.Thread(target=self.__run,daemon=True)
+        self.__thread.start()
+
+        data_pub.add_callback(self.__data_handler)
+
+
+    def close(self):
+        self.__data_pub.remove_callback(self.__data_handler)
+        with self.__cond:
+            self.__stop_event.set()
+            self.__cond.notify()
+        self.__thread.join()
+
+
+    def add_callback(self, cb : Callback):
+        with self.__mutex:
+            self.__cb_list.append(cb)
+
+    def remove_callback(self, cb : Callback):
+        with self.__mutex:
+            if cb in self.__cb_list:
+                self.__cb_list.remove(cb)
+
+
+    def set_rate(self, rate_hz : float):
+        """ Sampling rate of the cells, defines the frame timeout. 0 disables the timeout. """
+        with self.__cond:
+            self.__period = 1.0/rate_hz if rate_hz > 0 else None
+            self.__cond.notify()
+
+    def set_expected_ids(self, sc_ids : Optional[Iterable[int]]):
+        """ Cells a complete frame consists of. None learns them from the stream. """
+        with self.__mutex:
+            self.__learn = sc_ids is None
+            ids = self.__sc_ids if sc_ids is None else np.unique(np.fromiter(sc_ids,dtype=np.int64))
+            self.__set_ids(ids)
+
+    def reset(self):
+        with self.__mutex:
+            self.__ind_map = {}
+            self.__set_ids(np.zeros(0,dtype=np.int64))
+            self.__latest = None
+
+
+    def latest(self) -> Optional[Frame]:
+        with self.__mutex:
+            return self.__latest
+
+    def sc_ids(self) -> List[int]:
+        with self.__mutex:
+            return self.__sc_ids.tolist()
+
+    def stats(self) -> dict:
+        with self.__mutex:
+            return {
+                "frames"        : self.__n_frames,
+                "incomplete"    : self.__n_incomplete,
+                "missing"       : self.__n_missing,
+            }
+
+
+    # internals, mutex must be held
+
+    def __set_ids(self, ids : np.ndarray):
+        # keep values and flags of the cells that stay
+        values = np.zeros((len(ids),self.__n_vals))
+        valid = np.zeros(len(ids),dtype=bool)
+        for ind,sc_id in enumerate(ids.tolist()):
+            old = self.__ind_map.get(sc_id)
+            if old is not None:
+                values[ind] = self.__values[old]
+                valid[ind] = self.__valid[old]
+        self.__sc_ids = ids
+        self.__ind_map = { sc_id : ind for ind,sc_id in enumerate(ids.tolist()) }
+        self.__values = values
+        self.__valid = valid
+        self.__n_valid = int(valid.sum())
+        if self.__n_valid == 0:
+            self.__t_first = None
+
+
+    def __close_frame(self):
+        if self.__n_valid == 0:
+            return
+        n = len(self.__sc_ids)
+        n_missing = n - self.__n_valid
+        self.__seq += 1
+        frame = Frame(
+            seq     = self.__seq,
+            t       = time.monotonic(),
+            sc_ids  = self.__sc_ids,
+            values  = self.__values.copy(),
+            valid   = self.__valid)
+
+        self.__n_frames += 1
+        if n_missing:
+            self.__n_incomplete += 1
+            self.__n_missing += n_missing
+
+        self.__valid = np.zeros(n,dtype=bool)
+        self.__n_valid = 0
+        self.__t_first = None
+        self.__grown = False
+        self.__latest = frame
+
+        for cb in self.__cb_list:
+            cb(frame)
+
+
+    def __data_handler(self, sc_data : DataPublisher.ScData):
+        sc_id = sc_data[0]
+        with self.__cond:
+            ind = self.__ind_map.get(sc_id)
+            if ind is None:
+                if not self.__learn:
+                    return
+                # new cell: extend the frame layout, completeness of
+                # this frame is unknown now
+                self.__set_ids(np.union1d(self.__sc_ids,[sc_id]))
+                self.__grown = True
+                ind = self.__ind_map[sc_id]
+
+            if self.__valid[ind]:
+                self.__close_frame()
+
+            self.__values[ind] = sc_data[1]
+            self.__valid[ind] = True
+            self.__n_valid += 1
+            if self.__t_first is None:
+                self.__t_first = time.monotonic()
+                self.__cond.notify()
+
+            if self.__n_valid == len(self.__sc_ids) and not self.__grown:
+                self.__close_frame()
+
+
+    def __run(self):
+        with self.__cond:
+            while not self.__stop_event.is_set():
+                if self.__t_first is None or self.__period is None:
+                    self.__cond.wait()
+                    continue
+                deadline = self.__t_first + self.__timeout_cycles*self.__period
+                now = time.monotonic()
+                if now < deadline:
+                    self.__cond.wait(deadline - now)
+                    continue
+                self.__close_frame()
@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+
+"""
+Session recording of assembled frames.
+
+The Recorder subscribes to a FrameAssembler and copies every frame into
+preallocated chunk arrays (no per-sample Python objects). save() writes
+one .npz file:
+
+    t           (n_frames,)                 frame times, time.monotonic()
+    seq         (n_frames,)                 frame counters
+    sc_ids      (n_cells,)                  skin cell IDs of the columns
+    values      (n_frames,n_cells,n_vals)   Data1200 value layout, NaN where a cell was unknown
+    valid       (n_frames,n_cells)          cell delivered a sample in the frame
+
+Cells that appear during the recording get new columns. load_recording()
+returns the arrays as a dict.
+
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scn.sc.frame_assembler import Frame, FrameAssembler
+
+
+
+class Recorder:
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, frames : FrameAssembler, chunk : int = 4096):
+        self.__frames = frames
+        self.__chunk = chunk
+        self.__mutex = threading.Lock()
+        self.__started = False
+        self.__clear()
+
+
+    def start(self):
+        with self.__mutex:
+            if self.__started:
+                return
+            self.__started = True
+        self.__frames.add_callback(self.__frame_handler)
+
+    def stop(self):
+        with self.__mutex:
+            if not self.__started:
+                return
+            self.__started = False
+        self.__frames.remove_callback(self.__frame_handler)
+
+    def isStarted(self) -> bool:
+        return self.__started
+
+    def clear(self):
+        with self.__mutex:
+            self.__clear()
+
+    def n_frames(self) -> int:
+        with self.__mutex:
+            return self.__n_done + self.__n
+
+
+    def arrays(self) -> Dict[str,np.ndarray]:
+        """ Recorded frames so far, layout as in the file. """
+        with self.__mutex:
+            chunks = self.__chunks + [self.__cur_view()]
+            ids = np.array(self.__ids,dtype=np.int64)
+        n_cells = len(ids)
+        n_vals = chunks[0]["values"].shape[2] if chunks else 0
+        out = {
+            "t"         : np.concatenate([c["t"] for c in chunks]),
+            "seq"       : np.concatenate([c["seq"] for c in chunks]),
+            "sc_ids"    : ids,
+        }
+        values = []
+        valid = []
+        for c in chunks:
+            # chunks recorded before new cells appeared have fewer columns
+            pad = n_cells - c["values"].shape[1]
+            values.append(np.pad(c["values"],((0,0),(0,pad),(0,0)),constant_values=np.nan))
+            valid.append(np.pad(c["valid"],((0,0),(0,pad)),constant_values=False))
+        out["values"] = np.concatenate(values) if values else np.zeros((0,n_cells,n_vals))
+        out["valid"] = np.concatenate(valid) if valid else np.zeros((0,n_cells),dtype=bool)
+        return out
+
+    def save(self, path : str) -> str:
+        """ Write the recording to path (.npz), returns the path. """
+        arrays = self.arrays()
+        tmp = path + ".tmp.npz"
+        np.savez(tmp,**arrays)
+        os.replace(tmp,path)
+        self.logger.info(f"Saved {len(arrays['t'])} frames to {path}")
+        return path
+
+
+    # internals, mutex must be held
+
+    def __clear(self):
+        self.__ids : List[int] = []
+        self.__col : Dict[int,int] = {}
+        self.__chunks : List[Dict[str,np.ndarray]] = []
+        self.__cur : Optional[Dict[str,np.ndarray]] = None
+        self.__n = 0
+        self.__n_done = 0
+        self.__last_ids = None
+        self.__last_cols = None
+
+    def __cur_view(self) -> Dict[str,np.ndarray]:
+        if self.__cur is None:
+            n_cells = len(self.__ids)
+            return { "t" : np.zeros(0), "seq" : np.zeros(0,dtype=np.int64),
+                     "values" : np.zeros((0,n_cells,0)), "valid" : np.zeros((0,n_cells),dtype=bool) }
+        return { k : v[:self.__n].copy() for k,v in self.__cur.items() }
+
+    def __new_chunk(self, n_vals : int):
+        if self.__cur is not None and self.__n:
+            self.__chunks.append({ k : v[:self.__n] for k,v in self.__cur.items() })
+            self.__n_done += self.__n
+        n_cells = len(self.__ids)
+        self.__cur = {
+            "t"         : np.zeros(self.__chunk),
+            "seq"       : np.zeros(self.__chunk,dtype=np.int64),
+            "values"    : np.full((self.__chunk,n_cells,n_vals),np.nan),
+            "valid"     : np.zeros((self.__chunk,n_cells),dtype=bool),
+        }
+        self.__n = 0
+
+
+    def __frame_handler(self, frame : Frame):
+        sc_ids = frame["sc_ids"]
+        values = frame["values"]
+        with self.__mutex:
+            if sc_ids is not self.__last_ids:
+                grown = False
+                for sc_id in sc_ids.tolist():
+                    if sc_id not in self.__col:
+                        self.__col[sc_id] = len(self.__ids)
+                        self.__ids.append(sc_id)
+                        grown = True
+                self.__last_ids = sc_ids
+                self.__last_cols = np.array([self.__col[i] for i in sc_ids.tolist()],dtype=np.int64)
+                if grown:
+                    self.__new_chunk(values.shape[1])
+
+            if self.__cur is None or self.__n == self.__chunk:
+                self.__new_chunk(values.shape[1])
+
+            n = self.__n
+            cur = self.__cur
+            cur["t"][n] = frame["t"]
+            cur["seq"][n] = frame["seq"]
+            cur["values"][n,self.__last_cols] = values
+            cur["valid"][n,self.__last_cols] = frame["valid"]
+            self.__n = n + 1
+
+
+
+def load_recording(path : str) -> Dict[str,np.ndarray]:
+    with np.load(path) as d:
+        return { k : d[k] for k in d.files }
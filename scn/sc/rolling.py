@@ -0,0 +1,412 @@
+#!/usr/bin/python3
+
+"""
+Incremental rolling statistics over the skin cell sample stream.
+
+Every operator keeps its state in NumPy arrays with one row per skin cell
+and one column per sensor value (see the Data1200 value layout). A call to
+update() touches only the given cell row(s) and costs O(1) (amortized),
+independent of the window length. The rows grow on demand when new cells
+show up in the stream.
+
+Operators:
+    Ema             exponential moving average
+    RollingMeanVar  rolling mean / variance over the last <window> samples
+    RollingMax      sliding window maximum
+    RollingMin      sliding window minimum
+    PeakHold        peak hold with multiplicative decay
+    RateOfChange    first derivative w.r.t. the sample time stamps
+
+DerivedChannels bundles named operators for a publisher. It only queues
+the samples in the receive path and feeds them to the operators in
+vectorized batches when a derived channel is read.
+
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+
+# row index: single cell row or array of (unique) cell rows
+RowIndex = Union[int,np.ndarray]
+# time stamp(s): single time stamp or one per row
+TimeStamp = Union[None,float,np.ndarray]
+
+
+def _resize(a : np.ndarray, n : int, axis : int = 0, fill : float = 0.0) -> np.ndarray:
+    """ Grow array a along axis to length n, new entries are set to fill. """
+    shape = list(a.shape)
+    shape[axis] = n - a.shape[axis]
+    return np.concatenate((a,np.full(shape,fill,dtype=a.dtype)),axis=axis)
+
+
+
+class RollingOp(ABC):
+    """ Base class of all streaming operators. """
+
+    def __init__(self, n_vals : int = 8):
+        self._n_vals = n_vals
+        self._n_cells = 0
+        self._cap = 0
+
+    def n_cells(self) -> int:
+        return self._n_cells
+
+    def n_vals(self) -> int:
+        return self._n_vals
+
+
+    def reserve(self, n_cells : int):
+        """ Make room for at least n_cells cell rows. """
+        if n_cells <= self._n_cells:
+            return
+        if n_cells > self._cap:
+            cap = max(n_cells,2*self._cap,16)
+            self._grow(cap)
+            self._cap = cap
+        self._n_cells = n_cells
+
+
+    def reset(self):
+        self._n_cells = 0
+        self._cap = 0
+        self._grow(0)
+
+
+    def update(self, ind : RowIndex, x : np.ndarray, t : TimeStamp = None):
+        """ Feed the newest sample(s) x of the cell row(s) ind. """
+        n = (int(np.max(ind)) if np.ndim(ind) else int(ind)) + 1
+        if n > self._n_cells:
+            self.reserve(n)
+        self._update(ind,np.asarray(x,dtype=float),t)
+
+
+    def value(self) -> np.ndarray:
+        """ Current operator output, shape (n_cells,n_vals). """
+        return self._value()[:self._n_cells]
+
+
+    @abstractmethod
+    def _grow(self, cap : int):
+        pass
+
+    @abstractmethod
+    def _update(self, ind : RowIndex, x : np.ndarray, t : TimeStamp):
+        pass
+
+    @abstractmethod
+    def _value(self) -> np.ndarray:
+        pass
+
+
+
+class Ema(RollingOp):
+    """ Exponential moving average, s <- s + alpha*(x - s). """
+
+    def __init__(self, alpha : float, n_vals : int = 8):
+        super().__init__(n_vals)
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError(f"alpha out of range (0,1]: {alpha}")
+        self.__alpha = alpha
+        self._grow(0)
+
+    def _grow(self, cap : int):
+        if cap == 0:
+            self.__s = np.zeros((0,self._n_vals))
+            self.__init = np.zeros(0,dtype=bool)
+            return
+        self.__s = _resize(self.__s,cap)
+        self.__init = _resize(self.__init,cap,fill=False)
+
+    def _update(self, ind, x, t):
+        # the first sample of a cell initializes the average
+        a = np.where(self.__init[ind],self.__alpha,1.0)[...,None]
+        self.__s[ind] += a*(x - self.__s[ind])
+        self.__init[ind] = True
+
+    def _value(self):
+        return self.__s
+
+
+
+class RollingMeanVar(RollingOp):
+    """
+    Rolling mean and variance over the last <window> samples of each cell.
+
+    Keeps running sums of x and x^2 over a ring buffer. The sums of a cell
+    are recomputed from its buffer once per window to stop rounding errors
+    from accumulating.
+    """
+
+    def __init__(self, window : int, n_vals : int = 8):
+        super().__init__(n_vals)
+        if window < 1:
+            raise ValueError(f"window must be >= 1: {window}")
+        self.__w = window
+        self._grow(0)
+
+    def _grow(self, cap : int):
+        if cap == 0:
+            self.__buf = np.zeros((self.__w,0,self._n_vals))
+            self.__s1 = np.zeros((0,self._n_vals))
+            self.__s2 = np.zeros((0,self._n_vals))
+            self.__cnt = np.zeros(0,dtype=np.int64)
+            self.__pos = np.zeros(0,dtype=np.int64)
+            return
+        self.__buf = _resize(self.__buf,cap,axis=1)
+        self.__s1 = _resize(self.__s1,cap)
+        self.__s2 = _resize(self.__s2,cap)
+        self.__cnt = _resize(self.__cnt,cap)
+        self.__pos = _resize(self.__pos,cap)
+
+    def _update(self, ind, x, t):
+        w = self.__w
+        pos = self.__pos[ind]
+        # empty ring buffer slots are zero, no need to mask them
+        old = self.__buf[pos,ind].copy()
+        self.__buf[pos,ind] = x
+        self.__s1[ind] += x - old
+        self.__s2[ind] += x*x - old*old
+        self.__cnt[ind] = np.minimum(self.__cnt[ind] + 1,w)
+        pos = (pos + 1) % w
+        self.__pos[ind] = pos
+
+        wrapped = np.atleast_1d(ind)[np.atleast_1d(pos) == 0]
+        if len(wrapped):
+            b = self.__buf[:,wrapped]
+            self.__s1[wrapped] = b.sum(axis=0)
+            self.__s2[wrapped] = (b*b).sum(axis=0)
+
+    def _value(self):
+        n = np.maximum(self.__cnt,1)[:,None]
+        return self.__s1/n
+
+    def mean(self) -> np.ndarray:
+        return self.value()
+
+    def var(self) -> np.ndarray:
+        n = np.maximum(self.__cnt,1)[:,None]
+        m = self.__s1/n
+        v = np.maximum(self.__s2/n - m*m,0.0)
+        return v[:self._n_cells]
+
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.var())
+
+
+
+class RollingMax(RollingOp):
+    """
+    Sliding window maximum over the last <window> samples of each cell.
+
+    Block-wise variant of the monotonic deque (van Herk / Gil-Werman):
+    the ring buffer is split into the block being filled and the previous
+    block. The window max is the max of the running prefix max of the
+    current block and the suffix max of the previous block at the same
+    position. Suffix maxima are rebuilt once per <window> samples, so the
+    cost is amortized O(1) and, unlike a deque, vectorizes across cells.
+    """
+
+    _SIGN = 1.0
+
+    def __init__(self, window : int, n_vals : int = 8):
+        super().__init__(n_vals)
+        if window < 1:
+            raise ValueError(f"window must be >= 1: {window}")
+        self.__w = window
+        self._grow(0)
+
+    def _grow(self, cap : int):
+        w = self.__w
+        if cap == 0:
+            self.__buf = np.zeros((w,0,self._n_vals))
+            self.__suf = np.zeros((w+1,0,self._n_vals))
+            self.__pre = np.zeros((0,self._n_vals))
+            self.__val = np.zeros((0,self._n_vals))
+            self.__pos = np.zeros(0,dtype=np.int64)
+            return
+        self.__buf = _resize(self.__buf,cap,axis=1,fill=-np.inf)
+        self.__suf = _resize(self.__suf,cap,axis=1,fill=-np.inf)
+        self.__pre = _resize(self.__pre,cap,fill=-np.inf)
+        self.__val = _resize(self.__val,cap)
+        self.__pos = _resize(self.__pos,cap)
+
+    def _update(self, ind, x, t):
+        w = self.__w
+        x = self._SIGN*x
+        pos = self.__pos[ind]
+        self.__buf[pos,ind] = x
+
+        first = (pos == 0)[...,None]
+        pre = np.where(first,x,np.maximum(self.__pre[ind],x))
+        self.__pre[ind] = pre
+        self.__val[ind] = self._SIGN*np.maximum(pre,self.__suf[pos+1,ind])
+
+        # block complete: it becomes the previous block
+        done = np.atleast_1d(ind)[np.atleast_1d(pos) == w-1]
+        if len(done):
+            b = self.__buf[::-1,done]
+            self.__suf[:w,done] = np.maximum.accumulate(b,axis=0)[::-1]
+
+        self.__pos[ind] = (pos + 1) % w
+
+    def _value(self):
+        return self.__val
+
+
+
+class RollingMin(RollingMax):
+    """ Sliding window minimum, see RollingMax. """
+
+    _SIGN = -1.0
+
+
+
+class PeakHold(RollingOp):
+    """ Peak hold, h <- max(x, decay*h). decay = 1.0 holds forever. """
+
+    def __init__(self, decay : float = 1.0, n_vals : int = 8):
+        super().__init__(n_vals)
+        if not 0.0 <= decay <= 1.0:
+            raise ValueError(f"decay out of range [0,1]: {decay}")
+        self.__decay = decay
+        self._grow(0)
+
+    def _grow(self, cap : int):
+        if cap == 0:
+            self.__h = np.zeros((0,self._n_vals))
+            return
+        self.__h = _resize(self.__h,cap,fill=-np.inf)
+
+    def _update(self, ind, x, t):
+        h = self.__h[ind]
+        self.__h[ind] = np.maximum(x,np.where(np.isfinite(h),self.__decay*h,h))
+
+    def _value(self):
+        return self.__h
+
+
+
+class RateOfChange(RollingOp):
+    """
+    Rate of change (x - x_prev)/(t - t_prev) of each cell.
+
+    Without time stamps the difference per sample is returned.
+    """
+
+    def __init__(self, n_vals : int = 8):
+        super().__init__(n_vals)
+        self._grow(0)
+
+    def _grow(self, cap : int):
+        if cap == 0:
+            self.__prev = np.zeros((0,self._n_vals))
+            self.__t = np.zeros(0)
+            self.__d = np.zeros((0,self._n_vals))
+            self.__init = np.zeros(0,dtype=bool)
+            return
+        self.__prev = _resize(self.__prev,cap)
+        self.__t = _resize(self.__t,cap)
+        self.__d = _resize(self.__d,cap)
+        self.__init = _resize(self.__init,cap,fill=False)
+
+    def _update(self, ind, x, t):
+        d = x - self.__prev[ind]
+        if t is not None:
+            dt = np.asarray(t) - self.__t[ind]
+            dt = np.where(dt > 0.0,dt,np.inf)[...,None]
+            d = d/dt
+            self.__t[ind] = t
+        self.__d[ind] = np.where(self.__init[ind][...,None],d,0.0)
+        self.__prev[ind] = x
+        self.__init[ind] = True
+
+    def _value(self):
+        return self.__d
+
+
+
+class DerivedChannels:
+    """
+    Named streaming operators fed by a publisher.
+
+    push() is called for every sample in the receive path and only queues
+    the sample. The queue is fed to the operators when a channel is read
+    or when it reaches <max_pending> samples. Queued samples are split into
+    rounds with unique cell rows so every round is a single vectorized
+    update per operator.
+    """
+
+    OpMap = Dict[str,RollingOp]
+
+    def __init__(self, n_vals : int = 8, max_pending : int = 256):
+        self.__n_vals = n_vals
+        self.__max_pending = max_pending
+        self.__ops : DerivedChannels.OpMap = {}
+        self.__pending : List[Tuple[int,List[float],float]] = []
+
+
+    def __len__(self) -> int:
+        return len(self.__ops)
+
+    def names(self) -> List[str]:
+        return list(self.__ops.keys())
+
+
+    def add(self, name : str, op : RollingOp):
+        if op.n_vals() != self.__n_vals:
+            raise ValueError(f"Operator '{name}' has {op.n_vals()} values, expected {self.__n_vals}.")
+        self.flush()
+        self.__ops[name] = op
+
+    def remove(self, name : str):
+        self.flush()
+        self.__ops.pop(name,None)
+
+    def op(self, name : str) -> RollingOp:
+        self.flush()
+        return self.__ops[name]
+
+
+    def reset(self):
+        self.__pending.clear()
+        for op in self.__ops.values():
+            op.reset()
+
+
+    def push(self, ind : int, values : List[float], t : float):
+        if not self.__ops:
+            return
+        pending = self.__pending
+        pending.append((ind,values,t))
+        if len(pending) >= self.__max_pending:
+            self.flush()
+
+
+    def flush(self):
+        pending = self.__pending
+        if not pending:
+            return
+        inds = np.fromiter((p[0] for p in pending),dtype=np.int64,count=len(pending))
+        x = np.array([p[1] for p in pending],dtype=float)
+        t = np.fromiter((p[2] for p in pending),dtype=float,count=len(pending))
+        pending.clear()
+
+        # occurrence rank of each sample within its cell row
+        order = np.argsort(inds,kind="stable")
+        s = inds[order]
+        start = np.r_[0,np.flatnonzero(s[1:] != s[:-1]) + 1]
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(s)) - np.repeat(start,np.diff(np.r_[start,len(s)]))
+
+        for r in range(int(rank.max()) + 1):
+            m = rank == r
+            for op in self.__ops.values():
+                op.update(inds[m],x[m],t[m])
+
+
+    def value(self, name : str) -> np.ndarray:
+        """ Flush the queue and return a copy of channel <name>. """
+        return self.op(name).value().copy()
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+
+"""
+Cell state in shared memory for multi-process consumers.
+
+ShmWriter mirrors the per-cell sensor values of a DataPublisher into a
+multiprocessing.shared_memory block, ShmReader attaches to it from any
+other process by name. Nothing is pickled, readers copy the arrays
+directly out of the shared block.
+
+Block layout (little-endian):
+
+    header  (64 bytes)
+        u32 magic, u32 version, u32 capacity, u32 n_vals,
+        u64 seq, u32 n_cells, u32 n_overflow, f64 t_update
+    ids     u32[capacity]
+    t       f64[capacity]           time.monotonic() of the last sample
+    values  f64[capacity,n_vals]    Data1200 value layout
+
+Consistency uses a seqlock: the writer makes seq odd before and even after
+every update. A reader copies the arrays and retries if seq was odd or
+changed meanwhile. There is a single writer (the Reader thread of the data
+link), readers never block it.
+
+The block cannot grow while readers are attached. Cells beyond its
+capacity are not mirrored: the writer logs a warning once and counts them
+in n_overflow (ShmWriter.overflow(), ShmReader.overflow()).
+
+"""
+
+import logging
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+SHM_MAGIC = 0x53434E31    # "SCN1"
+SHM_VERSION = 2
+
+_HDR_SIZE = 64
+
+_HDR_DTYPE = np.dtype([
+    ("magic",       "<u4"),
+    ("version",     "<u4"),
+    ("capacity",    "<u4"),
+    ("n_vals",      "<u4"),
+    ("seq",         "<u8"),
+    ("n_cells",     "<u4"),
+    ("n_overflow",  "<u4"),
+    ("t_update",    "<f8"),
+])
+
+
+# snapshot: seq, sc ids, time stamps, values
+ShmSnapshot = Tuple[int,np.ndarray,np.ndarray,np.ndarray]
+
+
+def shm_size(capacity : int, n_vals : int) -> int:
+    return _HDR_SIZE + capacity*4 + capacity*8 + capacity*n_vals*8
+
+
+def _map(buf, capacity : int, n_vals : int):
+    hdr = np.ndarray((),dtype=_HDR_DTYPE,buffer=buf,offset=0)
+    off = _HDR_SIZE
+    ids = np.ndarray((capacity,),dtype="<u4",buffer=buf,offset=off)
+    off += capacity*4
+    t = np.ndarray((capacity,),dtype="<f8",buffer=buf,offset=off)
+    off += capacity*8
+    values = np.ndarray((capacity,n_vals),dtype="<f8",buffer=buf,offset=off)
+    return hdr,ids,t,values
+
+
+def _field(buf, name : str) -> np.ndarray:
+    """ Plain 1 element view of a header field, cheaper than structured access. """
+    dt,off = _HDR_DTYPE.fields[name][:2]
+    return np.ndarray((1,),dtype=dt,buffer=buf,offset=off)
+
+
+
+class ShmWriter:
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, name : Optional[str] = None, capacity : int = 256, n_vals : int = 8):
+        self.__shm = shared_memory.SharedMemory(name=name,create=True,size=shm_size(capacity,n_vals))
+        self.__capacity = capacity
+        hdr,self.__ids,self.__t,self.__values = _map(self.__shm.buf,capacity,n_vals)
+
+        hdr["magic"] = SHM_MAGIC
+        hdr["version"] = SHM_VERSION
+        hdr["capacity"] = capacity
+        hdr["n_vals"] = n_vals
+        hdr["seq"] = 0
+        hdr["n_cells"] = 0
+        hdr["n_overflow"] = 0
+        self.__seq = _field(self.__shm.buf,"seq")
+        self.__n_cells = _field(self.__shm.buf,"n_cells")
+        self.__n_overflow = _field(self.__shm.buf,"n_overflow")
+        self.__t_update = _field(self.__shm.buf,"t_update")
+        self.logger.debug(f"Created shared memory '{self.__shm.name}'.")
+
+
+    def name(self) -> str:
+        return self.__shm.name
+
+    def capacity(self) -> int:
+        return self.__capacity
+
+    def overflow(self) -> int:
+        """ Number of cells that did not fit into the block. """
+        return int(self.__n_overflow[0])
+
+
+    def write_cell(self, ind : int, sc_id : int, values, t : float):
+        """ Update cell row ind. Rows must be filled in order 0,1,2,... """
+        if ind >= self.__capacity:
+            if ind - self.__capacity >= self.__n_overflow[0]:
+                if self.__n_overflow[0] == 0:
+                    self.logger.warning(f"Shared memory '{self.__shm.name}' full ({self.__capacity} cells), "
+                        "further cells are not mirrored.")
+                self.__n_overflow[0] = ind - self.__capacity + 1
+            return
+        seq = self.__seq
+        seq[0] += 1
+        self.__ids[ind] = sc_id
+        self.__values[ind] = values
+        self.__t[ind] = t
+        if ind >= self.__n_cells[0]:
+            self.__n_cells[0] = ind + 1
+        self.__t_update[0] = t
+        seq[0] += 1
+
+
+    def clear(self):
+        seq = self.__seq
+        seq[0] += 1
+        self.__n_cells[0] = 0
+        self.__n_overflow[0] = 0
+        seq[0] += 1
+
+
+    def close(self, unlink : bool = True):
+        if self.__shm is None:
+            return
+        # drop the views before the buffer is released
+        self.__seq = self.__n_cells = self.__n_overflow = self.__t_update = None
+        self.__ids = self.__t = self.__values = None
+        self.__shm.close()
+        if unlink:
+            # readers on python < 3.13 sharing this process' resource tracker (e.g. spawned
+            # children) removed the block from it, see ShmReader; register it again so
+            # unlink() can unregister it
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self.__shm._name,"shared_memory")
+            self.__shm.unlink()
+        self.__shm = None
+
+
+
+class ShmReader:
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, name : str):
+        self.__shm = ShmReader.__attach(name)
+        hdr = np.ndarray((),dtype=_HDR_DTYPE,buffer=self.__shm.buf,offset=0)
+        if int(hdr["magic"]) != SHM_MAGIC or int(hdr["version"]) != SHM_VERSION:
+            self.__shm.close()
+            raise ValueError(f"Shared memory '{name}' is not a skin cell state block.")
+        capacity = int(hdr["capacity"])
+        n_vals = int(hdr["n_vals"])
+        self.__hdr,self.__ids,self.__t,self.__values = _map(self.__shm.buf,capacity,n_vals)
+
+
+    @staticmethod
+    def __attach(name : str) -> shared_memory.SharedMemory:
+        try:
+            return shared_memory.SharedMemory(name=name,track=False)
+        except TypeError:
+            # python < 3.13: the block is registered at the resource
+            # tracker, which would unlink it when this process exits.
+            # The writer owns the block, so unregister it again.
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name,"shared_memory")
+            return shm
+
+
+    def seq(self) -> int:
+        return int(self.__hdr["seq"])
+
+    def overflow(self) -> int:
+        """ Number of cells the writer could not mirror (block too small). """
+        return int(self.__hdr["n_overflow"])
+
+
+    def read(self, retries : int = 100) -> Optional[ShmSnapshot]:
+        """ Consistent copy of the cell state, None if the writer kept it busy. """
+        hdr = self.__hdr
+        for _ in range(retries):
+            s1 = int(hdr["seq"])
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            n = int(hdr["n_cells"])
+            ids = self.__ids[:n].copy()
+            t = self.__t[:n].copy()
+            values = self.__values[:n].copy()
+            if int(hdr["seq"]) == s1:
+                return (s1,ids,t,values)
+        return None
+
+
+    def wait(self, last_seq : int, timeout : Optional[float] = None, poll : float = 1e-3) -> Optional[ShmSnapshot]:
+        """ Poll until the state differs from last_seq, then read it. """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while int(self.__hdr["seq"]) == last_seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+        return self.read()
+
+
+    def close(self):
+        if self.__shm is None:
+            return
+        self.__hdr = self.__ids = self.__t = self.__values = None
+        self.__shm.close()
+        self.__shm = None
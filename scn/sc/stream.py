@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+
+"""
+Pull-style consumption of publisher callbacks.
+
+A Stream is registered as callback at a publisher (DataPublisher,
+EventsPublisher, NeighListManager, ...) and buffers the published items
+in a bounded queue. The consumer takes them out on its own thread:
+
+    with data_pub.stream(maxsize=256) as s:
+        for sc_data in s:
+            ...
+
+    async with data_pub.stream(batch=16,batch_timeout=0.05) as s:
+        async for batch in s:
+            ...
+
+The producer side (push) never blocks the Reader thread. When the queue is
+full the item is dropped according to the overflow policy:
+    OVERFLOW_DROP_OLDEST    discard the oldest queued item (default)
+    OVERFLOW_DROP_NEWEST    discard the incoming item
+Dropped items are counted, see dropped().
+
+With batch > 0 the stream yields lists of up to <batch> items. A batch is
+delivered as soon as it is full or, if batch_timeout is set, when its
+oldest item is batch_timeout seconds old.
+
+Publishers get stream() from the StreamSource mixin. Closing a stream
+unregisters it from the publisher on a helper thread, so close() may also
+be called from inside a callback of the same publisher (whose callback
+mutex is held while it dispatches); a closed stream ignores further items.
+
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST,OVERFLOW_DROP_NEWEST)
+
+_EMPTY = object()
+
+
+
+class Stream:
+    Unsubscribe = Callable[["Stream"],None]
+    Waiter = Tuple[asyncio.AbstractEventLoop,asyncio.Future]
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self,
+            maxsize : int = 1024,
+            overflow : str = OVERFLOW_DROP_OLDEST,
+            batch : int = 0,
+            batch_timeout : Optional[float] = None,
+            unsubscribe : Optional[Unsubscribe] = None):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be >= 1: {maxsize}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if batch < 0 or batch > maxsize:
+            raise ValueError(f"batch out of range [0,{maxsize}]: {batch}")
+
+        self.__maxsize = maxsize
+        self.__overflow = overflow
+        self.__batch = batch
+        self.__batch_timeout = batch_timeout
+        self.__unsubscribe = unsubscribe
+
+        self.__queue : Deque[Tuple[float,Any]] = collections.deque()
+        self.__mutex = threading.Lock()
+        self.__cond = threading.Condition(self.__mutex)
+        self.__waiters : List[Stream.Waiter] = []
+        self.__closed = False
+        self.__dropped = 0
+
+
+    # producer side, called from the publisher thread
+
+    def push(self, item : Any):
+        with self.__mutex:
+            if self.__closed:
+                return
+            q = self.__queue
+            if len(q) >= self.__maxsize:
+                self.__dropped += 1
+                if self.__overflow == OVERFLOW_DROP_NEWEST:
+                    return
+                q.popleft()
+            q.append((time.monotonic(),item))
+
+            if self.__batch and len(q) < self.__batch and len(q) > 1:
+                # nothing new to deliver, the batch timeout is handled by the consumer
+                return
+            self.__cond.notify()
+            self.__wake_waiters()
+
+
+    def __call__(self, item : Any):
+        self.push(item)
+
+
+    def close(self):
+        with self.__mutex:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__cond.notify_all()
+            self.__wake_waiters()
+        if self.__unsubscribe is not None:
+            self.__unsubscribe(self)
+
+
+    def isClosed(self) -> bool:
+        return self.__closed
+
+    def qsize(self) -> int:
+        with self.__mutex:
+            return len(self.__queue)
+
+    def maxsize(self) -> int:
+        return self.__maxsize
+
+    def dropped(self) -> int:
+        with self.__mutex:
+            return self.__dropped
+
+
+    # blocking consumer side
+
+    def get(self, timeout : Optional[float] = None) -> Any:
+        """
+        Take the next item (or batch). Blocks for at most timeout seconds.
+        Raises TimeoutError on timeout and EOFError if the stream is closed
+        and drained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__cond:
+            while True:
+                now = time.monotonic()
+                item = self.__pop(now)
+                if item is not _EMPTY:
+                    return item
+                if self.__closed:
+                    raise EOFError("Stream closed.")
+
+                wait = self.__batch_wait(now)
+                if deadline is not None:
+                    if now >= deadline:
+                        raise TimeoutError()
+                    wait = deadline - now if wait is None else min(wait,deadline - now)
+                self.__cond.wait(wait)
+
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            return self.get()
+        except EOFError:
+            raise StopIteration
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    # asyncio consumer side
+
+    async def aget(self) -> Any:
+        """ Awaitable get(), raises EOFError if the stream is closed and drained. """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.__mutex:
+                now = time.monotonic()
+                item = self.__pop(now)
+                if item is not _EMPTY:
+                    return item
+                if self.__closed:
+                    raise EOFError("Stream closed.")
+                wait = self.__batch_wait(now)
+                fut = loop.create_future()
+                self.__waiters.append((loop,fut))
+            try:
+                await asyncio.wait_for(fut,wait)
+            except asyncio.TimeoutError:
+                pass
+
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self.aget()
+        except EOFError:
+            raise StopAsyncIteration
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+    # internals, mutex must be held
+
+    def __pop(self, now : float) -> Any:
+        q = self.__queue
+        if not q:
+            return _EMPTY
+        n = self.__batch
+        if not n:
+            return q.popleft()[1]
+        if len(q) >= n:
+            return [q.popleft()[1] for _ in range(n)]
+        # partial batch: on timeout or when no more items will come
+        timeout = self.__batch_timeout
+        if self.__closed or (timeout is not None and now - q[0][0] >= timeout):
+            items = [e[1] for e in q]
+            q.clear()
+            return items
+        return _EMPTY
+
+
+    def __batch_wait(self, now : float) -> Optional[float]:
+        q = self.__queue
+        if not q or self.__batch_timeout is None:
+            return None
+        return max(self.__batch_timeout - (now - q[0][0]),0.0)
+
+
+    def __wake_waiters(self):
+        waiters = self.__waiters
+        self.__waiters = []
+        for loop,fut in waiters:
+            try:
+                loop.call_soon_threadsafe(Stream.__set_done,fut)
+            except RuntimeError:
+                # event loop already closed
+                pass
+
+
+    @staticmethod
+    def __set_done(fut : asyncio.Future):
+        if not fut.done():
+            fut.set_result(None)
+
+
+
+class StreamSource:
+    """ Mixin for publishers with add_callback()/remove_callback(): stream() of the published items. """
+
+    STREAM_MAXSIZE = 1024
+
+    def stream(self,
+            maxsize : Optional[int] = None,
+            overflow : str = OVERFLOW_DROP_OLDEST,
+            batch : int = 0,
+            batch_timeout : Optional[float] = None) -> Stream:
+        """ Bounded queue of the published items for blocking or async iteration, see scn.sc.stream. """
+        maxsize = self.STREAM_MAXSIZE if maxsize is None else maxsize
+        s = Stream(maxsize,overflow,batch,batch_timeout,unsubscribe=self.__unsubscribe)
+        self.add_callback(s)
+        return s
+
+
+    def __unsubscribe(self, s : Stream):
+        # deferred: close() may run on the publisher thread while it holds its callback mutex
+        threading.Thread(target=self.remove_callback,args=(s,),daemon=True).start()
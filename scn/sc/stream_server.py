@@ -0,0 +1,442 @@
+#!/usr/bin/python3
+
+"""
+Local streaming server for decoded skin cell data and events.
+
+Serves the samples of a DataPublisher and the events of an EventsPublisher
+to other processes on the host over a Unix domain socket or localhost TCP.
+
+Wire format, all little-endian, every message is length prefixed:
+
+    u32 len | payload[len]
+
+Server -> client payloads:
+    MSG_DATA    u8 0x01 | u16 sc_id | f64 t | f32 values[8]
+    MSG_EVENTS  u8 0x02 | u16 sc_id | u16 n | n x (u16 event_id | f32 value)
+
+Client -> server payloads:
+    MSG_SUBSCRIBE  u8 0x10 | u8 kinds | u16 n | u16 sc_ids[n]
+        kinds: KIND_DATA | KIND_EVENTS, n = 0 subscribes to all cells
+
+A new client receives nothing until it subscribed. A client sending a
+malformed or oversized message is disconnected, the others keep streaming. Messages are encoded
+once in the publisher thread and queued; the server thread fans them out
+with non-blocking sends. A client whose send buffer exceeds max_buffer
+bytes is disconnected, so a slow subscriber never stalls the others or
+the Reader thread.
+
+"""
+
+import collections
+import json
+import logging
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from scn.sc.data_publisher import DataPublisher
+from scn.sc.events_publisher import EventsPublisher
+
+
+MSG_DATA        = 0x01
+MSG_EVENTS      = 0x02
+MSG_SUBSCRIBE   = 0x10
+
+KIND_DATA       = 0x01
+KIND_EVENTS     = 0x02
+
+_LEN = struct.Struct("<I")
+_DATA = struct.Struct("<BHd8f")
+_EVENTS_HDR = struct.Struct("<BHH")
+_EVENT = struct.Struct("<Hf")
+_SUB_HDR = struct.Struct("<BBH")
+
+# longest valid client message: a subscribe with the maximum number of IDs
+MAX_CLIENT_MSG = _SUB_HDR.size + 2 * 0xFFFF
+
+
+def encode_data(sc_id : int, t : float, values : List[float]) -> bytes:
+    payload = _DATA.pack(MSG_DATA,sc_id,t,*values)
+    return _LEN.pack(len(payload)) + payload
+
+
+def encode_events(sc_id : int, events : List[Tuple[int,float]]) -> bytes:
+    payload = _EVENTS_HDR.pack(MSG_EVENTS,sc_id,len(events)) \
+        + b"".join(_EVENT.pack(e_id,val) for e_id,val in events)
+    return _LEN.pack(len(payload)) + payload
+
+
+def encode_subscribe(kinds : int = KIND_DATA | KIND_EVENTS, sc_ids : Optional[List[int]] = None) -> bytes:
+    sc_ids = sc_ids or []
+    payload = _SUB_HDR.pack(MSG_SUBSCRIBE,kinds,len(sc_ids)) + struct.pack(f"<{len(sc_ids)}H",*sc_ids)
+    return _LEN.pack(len(payload)) + payload
+
+
+def decode(payload : bytes):
+    """ Decode a server message payload to (MSG_DATA,sc_id,t,values) or (MSG_EVENTS,sc_id,[(event_id,value),...]). """
+    msg = payload[0]
+    if msg == MSG_DATA:
+        v = _DATA.unpack(payload)
+        return (MSG_DATA,v[1],v[2],list(v[3:]))
+    if msg == MSG_EVENTS:
+        _,sc_id,n = _EVENTS_HDR.unpack_from(payload)
+        events = [_EVENT.unpack_from(payload,_EVENTS_HDR.size + i*_EVENT.size) for i in range(n)]
+        return (MSG_EVENTS,sc_id,events)
+    raise ValueError(f"Unknown message type: {msg}")
+
+
+def parse_address(address : str) -> Tuple[int,object]:
+    """ 'unix:<path>' or 'tcp:<ip>:<port>' -> (socket family, socket address) """
+    if address.startswith("unix:"):
+        return (socket.AF_UNIX,address[5:])
+    if address.startswith("tcp:"):
+        host,port = address[4:].rsplit(":",1)
+        return (socket.AF_INET,(host,int(port)))
+    raise ValueError(f"Invalid stream server address: {address}")
+
+
+
+class _Client:
+    def __init__(self, sock : socket.socket, name : str):
+        self.sock = sock
+        self.name = name
+        self.kinds = 0
+        self.sc_ids : Optional[Set[int]] = None
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+
+    def wants(self, kind : int, sc_id : int) -> bool:
+        return (self.kinds & kind) != 0 and (self.sc_ids is None or sc_id in self.sc_ids)
+
+
+
+class StreamServer:
+    Msg = Tuple[int,int,bytes]      # kind, sc_id, encoded message
+
+    @staticmethod
+    def DefaultConfig() -> dict:
+        return {
+            "address"       : "tcp:127.0.0.1:17100",
+            "max_clients"   : 64,
+            "max_buffer"    : 1 << 20,
+            "max_queue"     : 65536,
+        }
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+
+    def __init__(self, config : dict,
+            data_pub : Optional[DataPublisher] = None,
+            events_pub : Optional[EventsPublisher] = None):
+        self.__config = config
+        self.__data_pub = data_pub
+        self.__events_pub = events_pub
+
+        self.__queue : Deque[StreamServer.Msg] = collections.deque(maxlen=config.get("max_queue",65536))
+        self.__wake_pending = False
+        self.__mutex = threading.Lock()
+        self.__clients : Dict[int,_Client] = {}
+
+        self.__sel = None
+        self.__lsock = None
+        self.__wake_r = None
+        self.__wake_w = None
+        self.__thread = None
+        self.__started = False
+        self.__stop_event = threading.Event()
+
+
+    def __del__(self):
+        if self.__started:
+            self.stop()
+
+
+    def config(self) -> dict:
+        return self.__config
+
+
+    def start(self) -> bool:
+        if self.__started:
+            self.logger.error("Already started.")
+            return False
+        config = self.__config
+        self.logger.info("Using stream server config:\n%s",json.dumps(config,indent=4))
+
+        family,addr = parse_address(config["address"])
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.unlink(addr)
+        lsock = socket.socket(family,socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            lsock.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+        lsock.bind(addr)
+        lsock.listen()
+        lsock.setblocking(False)
+        self.__lsock = lsock
+
+        self.__wake_r,self.__wake_w = socket.socketpair()
+        self.__wake_r.setblocking(False)
+        self.__wake_w.setblocking(False)
+
+        self.__sel = selectors.DefaultSelector()
+        self.__sel.register(lsock,selectors.EVENT_READ,None)
+        self.__sel.register(self.__wake_r,selectors.EVENT_READ,None)
+
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run,daemon=True)
+        self.__thread.start()
+
+        if self.__data_pub is not None:
+            self.__data_pub.add_callback(self.__data_handler)
+        if self.__events_pub is not None:
+            self.__events_pub.add_callback(self.__events_handler)
+
+        self.__started = True
+        self.logger.info(f"Stream server listening on {config['address']}")
+        return True
+
+
+    def stop(self):
+        if not self.__started:
+            self.logger.error("Already stopped.")
+            return
+        if self.__data_pub is not None:
+            self.__data_pub.remove_callback(self.__data_handler)
+        if self.__events_pub is not None:
+            self.__events_pub.remove_callback(self.__events_handler)
+
+        self.__stop_event.set()
+        self.__wake()
+        self.__thread.join()
+
+        for c in list(self.__clients.values()):
+            self.__drop(c,"server stopped")
+        self.__sel.close()
+        self.__lsock.close()
+        self.__wake_r.close()
+        self.__wake_w.close()
+
+        family,addr = parse_address(self.__config["address"])
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.unlink(addr)
+        self.__started = False
+
+
+    def isStarted(self) -> bool:
+        return self.__started
+
+    def n_clients(self) -> int:
+        return len(self.__clients)
+
+
+    # publisher callbacks, Reader thread: encode once, queue, wake
+
+    def __data_handler(self, sc_data : DataPublisher.ScData):
+        if not self.__clients:
+            return
+        sc_id = sc_data[0]
+        self.__post((KIND_DATA,sc_id,encode_data(sc_id,time.monotonic(),sc_data[1])))
+
+
+    def __events_handler(self, sc_events : EventsPublisher.ScEvents):
+        if not self.__clients or not sc_events:
+            return
+        sc_id = sc_events[0]["sc_id"]
+        events = [(e["id"],e["value"]) for e in sc_events]
+        self.__post((KIND_EVENTS,sc_id,encode_events(sc_id,events)))
+
+
+    def __post(self, msg : Msg):
+        self.__queue.append(msg)
+        with self.__mutex:
+            if self.__wake_pending:
+                return
+            self.__wake_pending = True
+        self.__wake()
+
+
+    def __wake(self):
+        try:
+            self.__wake_w.send(b"\x00")
+        except (BlockingIOError,OSError):
+            pass
+
+
+    # server thread
+
+    def __run(self):
+        self.logger.debug("Started Thread.")
+        sel = self.__sel
+        while not self.__stop_event.is_set():
+            for key,mask in sel.select(timeout=0.5):
+                sock = key.fileobj
+                if sock is self.__lsock:
+                    self.__accept()
+                elif sock is self.__wake_r:
+                    self.__drain_wake()
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.__recv(client)
+                    if mask & selectors.EVENT_WRITE and client.sock.fileno() in self.__clients:
+                        self.__send(client)
+            self.__fan_out()
+        self.logger.debug("Exit Thread.")
+
+
+    def __accept(self):
+        try:
+            sock,addr = self.__lsock.accept()
+        except (BlockingIOError,OSError):
+            return
+        if len(self.__clients) >= self.__config.get("max_clients",64):
+            self.logger.warning("Too many clients, rejecting connection.")
+            sock.close()
+            return
+        sock.setblocking(False)
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        client = _Client(sock,str(addr) if addr else f"unix#{sock.fileno()}")
+        self.__clients[sock.fileno()] = client
+        self.__sel.register(sock,selectors.EVENT_READ,client)
+        self.logger.info(f"Client connected: {client.name}")
+
+
+    def __drain_wake(self):
+        with self.__mutex:
+            self.__wake_pending = False
+        try:
+            while self.__wake_r.recv(4096):
+                pass
+        except (BlockingIOError,OSError):
+            pass
+
+
+    def __recv(self, client : _Client):
+        try:
+            data = client.sock.recv(4096)
+        except (BlockingIOError,InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.__drop(client,"disconnected")
+            return
+        buf = client.inbuf
+        buf += data
+        while len(buf) >= _LEN.size:
+            n = _LEN.unpack_from(buf)[0]
+            if n > MAX_CLIENT_MSG:
+                self.__drop(client,f"protocol error (message of {n} bytes)")
+                return
+            if len(buf) < _LEN.size + n:
+                break
+            payload = bytes(buf[_LEN.size:_LEN.size + n])
+            del buf[:_LEN.size + n]
+            try:
+                if n < _SUB_HDR.size or payload[0] != MSG_SUBSCRIBE:
+                    raise ValueError("unknown message")
+                _,kinds,n_ids = _SUB_HDR.unpack_from(payload)
+                if n != _SUB_HDR.size + 2*n_ids:
+                    raise ValueError(f"subscribe of {n_ids} IDs in {n} bytes")
+                ids = struct.unpack_from(f"<{n_ids}H",payload,_SUB_HDR.size)
+            except (ValueError,struct.error) as e:
+                self.__drop(client,f"protocol error ({e})")
+                return
+            client.kinds = kinds
+            client.sc_ids = set(ids) if n_ids else None
+
+
+    def __fan_out(self):
+        q = self.__queue
+        if not q:
+            return
+        clients = list(self.__clients.values())
+        max_buffer = self.__config.get("max_buffer",1 << 20)
+        while q:
+            kind,sc_id,msg = q.popleft()
+            for c in clients:
+                if c.wants(kind,sc_id):
+                    c.outbuf += msg
+        for c in clients:
+            if not c.outbuf:
+                continue
+            if len(c.outbuf) > max_buffer:
+                self.__drop(c,"too slow")
+                continue
+            self.__send(c)
+
+
+    def __send(self, client : _Client):
+        buf = client.outbuf
+        try:
+            n = client.sock.send(buf)
+            del buf[:n]
+        except (BlockingIOError,InterruptedError):
+            pass
+        except OSError:
+            self.__drop(client,"send failed")
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if buf else 0)
+        self.__sel.modify(client.sock,events,client)
+
+
+    def __drop(self, client : _Client, reason : str):
+        fd = client.sock.fileno()
+        if self.__clients.pop(fd,None) is None:
+            return
+        try:
+            self.__sel.unregister(client.sock)
+        except (KeyError,ValueError):
+            pass
+        client.sock.close()
+        self.logger.info(f"Client {client.name} dropped: {reason}")
+
+
+
+class StreamClient:
+    """ Minimal blocking client for the stream server. """
+
+    def __init__(self, address : str, kinds : int = KIND_DATA | KIND_EVENTS, sc_ids : Optional[List[int]] = None):
+        family,addr = parse_address(address)
+        self.__sock = socket.socket(family,socket.SOCK_STREAM)
+        self.__sock.connect(addr)
+        self.__buf = bytearray()
+        self.subscribe(kinds,sc_ids)
+
+
+    def subscribe(self, kinds : int = KIND_DATA | KIND_EVENTS, sc_ids : Optional[List[int]] = None):
+        self.__sock.sendall(encode_subscribe(kinds,sc_ids))
+
+
+    def recv(self):
+        """ Next decoded message, None if the server closed the connection. """
+        buf = self.__buf
+        while True:
+            if len(buf) >= _LEN.size:
+                n = _LEN.unpack_from(buf)[0]
+                if len(buf) >= _LEN.size + n:
+                    payload = bytes(buf[_LEN.size:_LEN.size + n])
+                    del buf[:_LEN.size + n]
+                    return decode(payload)
+            data = self.__sock.recv(65536)
+            if not data:
+                return None
+            buf += data
+
+
+    def __iter__(self) -> Iterator:
+        while True:
+            msg = self.recv()
+            if msg is None:
+                return
+            yield msg
+
+
+    def close(self):
+        self.__sock.close()
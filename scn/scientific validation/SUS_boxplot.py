@@ -1,47 +1,15 @@
 '''Create boxplot for SUS scores.'''
 
-import matplotlib.pyplot as plt
+from pathlib import Path
 
-# Data
-data = [67.5, 82.5, 75, 87.5, 72.5, 80]
-
-# Wide, short figure for one-column layout
-plt.figure(figsize=(6, 4))  # width > height
-
-plt.boxplot(
-    data,
-    vert=True,
-    widths=0.4,
-    patch_artist=True,
-    showfliers=True,
-    boxprops=dict(facecolor="lightgray", edgecolor="black", linewidth=1),
-    medianprops=dict(color="black", linewidth=1.5),
-    whiskerprops=dict(color="black", linewidth=1),
-    capprops=dict(color="black", linewidth=1),
-    flierprops=dict(marker="o", markersize=4,
-                    markerfacecolor="white", markeredgecolor="black")
-)
-
-# Overlay raw data points
-x = [1] * len(data)
-plt.scatter(x, data, zorder=3, s=20)
+# the figure itself is figures.sus_boxplot_figure, rendered headless by the report pipeline
+from report import print_results, run_report, sus_jobs
 
-# Axis formatting
-ax = plt.gca()
-ax.set_xticks([])
-ax.set_xlabel("")
-ax.spines["bottom"].set_visible(False)
-ax.spines["top"].set_visible(False)
-ax.spines["right"].set_visible(False)
-
-plt.ylabel("SUS Score", fontsize=9)
-plt.yticks(fontsize=8)
-
-plt.grid(axis="y", linestyle="--", alpha=0.4)
-
-plt.tight_layout(pad=0.3)
+# Data
+SUS_SCORES = [67.5, 82.5, 75, 87.5, 72.5, 80]
 
-# Save for LaTeX
-plt.savefig("sus_boxplot.pdf", bbox_inches="tight")
+# Save for LaTeX (figures/sus_boxplot.pdf)
+OUTPUT_DIR = Path(__file__).resolve().parent / "figures"
 
-plt.show()
+if __name__ == "__main__":
+    print_results(run_report(sus_jobs(SUS_SCORES), OUTPUT_DIR))
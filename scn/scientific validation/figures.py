@@ -0,0 +1,316 @@
+'''Figure builders of the validation report. Each builder takes plain, picklable data and returns a matplotlib Figure.'''
+
+# imports
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+
+CLINICAL_THRESHOLD_KG = 9
+
+# Beeswarm-style x positions to avoid overlapping identical values
+def beeswarm_x_positions(y_values, x_center, spread=0.06, decimals=3, order=None):
+    """
+    For a set of y-values at a given x-center, return x positions that spread out
+    identical/near-identical y-values horizontally (offsets 0, +1, -1, +2, -2, ... times spread).
+    order: sort keys deciding which point of a group gets which offset (default: input order).
+    """
+    y_values = np.asarray(y_values, dtype=float)
+    rounded = np.round(y_values, decimals=decimals)
+    x_positions = np.full_like(y_values, fill_value=x_center, dtype=float)
+    keys = np.arange(len(y_values)) if order is None else np.asarray(order)
+
+    for r in np.unique(rounded):
+        idx = np.where(rounded == r)[0]
+        k = len(idx)
+        # symmetric offsets: 0, +1, -1, +2, -2, ...
+        j = (np.arange(k) + 1) // 2
+        offsets = np.where(np.arange(k) % 2 == 1, j, -j) * spread
+        # deterministic order so it doesn't jump between runs
+        idx_sorted = idx[np.argsort(keys[idx], kind="stable")]
+        x_positions[idx_sorted] = x_center + offsets
+    return x_positions
+
+# -------------------------------------------------------------------------------------
+# 1.Confusion matrix plot
+def confusion_matrix_figure(tp, fp, tn, fn) -> Figure:
+    cm = np.array([[tp, fn], [fp, tn]], dtype=int)
+    fig = Figure(figsize=(5, 4))
+    ax = fig.subplots()
+    # Custom colors
+    green = np.array([0.80, 0.93, 0.80, 1.0])  # light green for correct
+    red = np.array([0.98, 0.80, 0.80, 1.0])  # light red for incorrect
+    colors = np.array([[green, red],
+                       [red,   green]], dtype=float)
+    ax.imshow(colors)
+    # Labels
+    ax.set_xticks([0, 1], labels=["Pred Below", "Pred Above"])
+    ax.set_yticks([0, 1], labels=["True Below", "True Above"])
+    ax.set_title("Confusion Matrix")
+    # counts + cell type labels
+    cell_labels = np.array([["TP", "FN"],
+                            ["FP", "TN"]])
+    for (i, j), v in np.ndenumerate(cm):
+        ax.text(j, i, f"{cell_labels[i, j]}\n{v}", ha="center", va="center", fontsize=12)
+    # grid lines for clarity
+    ax.set_xticks(np.arange(-.5, 2, 1), minor=True)
+    ax.set_yticks(np.arange(-.5, 2, 1), minor=True)
+    ax.grid(which="minor", linewidth=1)
+    ax.tick_params(which="minor", bottom=False, left=False)
+    fig.tight_layout()
+    return fig
+
+# -------------------------------------------------------------------------------------
+# 2. Histogram of dynamometer peak forces (1kg bins) and their correctness rates
+def force_distribution_figure(force_kg, correct, threshold_kg=CLINICAL_THRESHOLD_KG) -> Figure:
+    force_kg = np.asarray(force_kg, dtype=float)
+    correct = np.asarray(correct, dtype=float)
+
+    # Define 1 kg bin edges (inclusive lower, exclusive upper); make sure bins include the clinical threshold
+    # and extend at least one bin beyond it
+    min_f = min(np.floor(force_kg.min()), threshold_kg)
+    max_f = max(np.ceil(force_kg.max()), threshold_kg + 1)
+    bin_edges = np.arange(min_f, max_f + 1, 1)  # 1kg bins
+
+    # Aggregate per bin: count + correctness rate (one bincount each)
+    bins = np.clip(np.searchsorted(bin_edges, force_kg, side="right") - 1, 0, len(bin_edges) - 2)
+    n_trials = np.bincount(bins, minlength=len(bin_edges) - 1)
+    n_correct = np.bincount(bins, weights=correct, minlength=len(bin_edges) - 1)
+    # Drop empty bins to save space
+    keep = n_trials > 0
+    pct_correct = n_correct[keep] / n_trials[keep]
+    n_trials = n_trials[keep]
+    bin_left = bin_edges[:-1][keep].astype(int)
+
+    # Create x positions and bar labels (bin ranges)
+    x_labels = [f"{l}–{l + 1}" for l in bin_left]
+    x = np.arange(len(n_trials))
+
+    # Color bars by correctness: red (0%) -> green (100%)
+    cmap = matplotlib.colormaps["RdYlGn"] # (matplotlib colormap 'RdYlGn' goes red->yellow->green)
+    colors = cmap(pct_correct)
+
+    fig = Figure(figsize=(12, 5))
+    ax = fig.subplots()
+    bars = ax.bar(x, n_trials, color=colors, edgecolor="black", linewidth=0.8)
+
+    # Add percentage text on top of each bar
+    for bar, pct in zip(bars, pct_correct):
+        ax.text(
+            bar.get_x() + bar.get_width() / 2,
+            bar.get_height() + 0.1,
+            f"{pct*100:.0f}%",
+            ha="center",
+            va="bottom",
+            fontsize=10
+        )
+    ax.set_xticks(x)
+    ax.set_xticklabels(x_labels, rotation=45, ha="right")
+    ax.set_xlabel("Dynamometer peak force bin (kg), 1 kg width")
+    ax.set_ylabel("Number of trials")
+    ax.set_title("Force distribution (ground truth) with % correct per 1 kg bin")
+
+    # Add a colorbar legend for % correct
+    sm = matplotlib.cm.ScalarMappable(cmap=cmap, norm=matplotlib.colors.Normalize(vmin=0, vmax=1))
+    sm.set_array([])
+    cbar = fig.colorbar(sm, ax=ax)
+    cbar.set_label("Proportion correct")
+
+    # Add vertical dashed line at clinical threshold
+    # Because x-axis is bin indices, convert threshold value to index: threshold boundary is at the start of its bin.
+    threshold_idx = int(threshold_kg - min_f)  # position of bin with left edge at the threshold
+    ax.axvline(
+        x=threshold_idx - 0.5, # boundary between the bins below and above the threshold
+        ymin=0, ymax=1,
+        color="black",
+        linestyle="--",
+        linewidth=2,
+        zorder=10
+    )
+    # Label the clinical threshold line
+    ax.text(
+        threshold_idx - 0.5 + 0.1, # slightly to the right of the line
+        ax.get_ylim()[1] * 0.95, # near top of the plot
+        f"Clinical threshold ({threshold_kg} kg)",
+        rotation=90,
+        va="top",
+        ha="left",
+        fontsize=10,
+        bbox=dict(
+            facecolor="white",
+            edgecolor="none",
+            alpha=0.8,
+            pad=2
+        ),
+        zorder=11
+    )
+    fig.tight_layout()
+    return fig
+
+# -------------------------------------------------------------------------------------
+# 3. Box plots of device accuracy; individual dots denote individual participants
+def accuracy_by_participant_figure(accuracies, pids) -> Figure:
+    vals = np.asarray(accuracies, dtype=float)
+    pids = [str(p) for p in pids]
+
+    fig = Figure(figsize=(6.5, 5))
+    ax = fig.subplots()
+    # Box plot
+    ax.boxplot(
+        vals,
+        widths=0.35,
+        patch_artist=True,
+        boxprops=dict(facecolor="#dddddd", edgecolor="black"),
+        medianprops=dict(color="black", linewidth=2),
+        whiskerprops=dict(color="black"),
+        capprops=dict(color="black"),
+    )
+
+    # Beeswarm-style horizontal spreading for identical/near-identical values (grouped by rounded accuracy),
+    # participants in ID order within a group
+    x_positions = beeswarm_x_positions(vals, x_center=1.0, spread=0.06, decimals=3, order=pids)
+
+    # Scatter points
+    ax.scatter(
+        x_positions, vals,
+        s=70,
+        color="#1f77b4",
+        edgecolor="black",
+        zorder=3
+    )
+
+    # Label each dot with its accuracy
+    for x, y in zip(x_positions, vals):
+        ax.text(
+            x + 0.015, y,
+            f"{y:.3f}",
+            fontsize=7,
+            va="center",
+            ha="left",
+            alpha=0.85
+        )
+
+    # Mean accuracy line + label
+    mean_acc = float(np.mean(vals))
+    ax.axhline(mean_acc, color="black", linestyle="--", linewidth=1)
+    ax.text(
+        1.22, mean_acc,
+        f"Mean = {mean_acc:.3f}",
+        va="center",
+        ha="left",
+        fontsize=10,
+        bbox=dict(facecolor="white", edgecolor="none", alpha=0.7, pad=1.5)
+    )
+
+    # Axes
+    ax.set_xticks([1])
+    ax.set_xticklabels(["Participants"])
+    ax.set_ylabel("Accuracy")
+    ax.set_ylim(0.6, 1.0)
+    ax.set_xlim(0.75, 1.35)
+    ax.set_title("Distribution of device accuracy across participants")
+    ax.grid(axis="y", linestyle="--", alpha=0.35)
+    fig.tight_layout()
+    return fig
+
+# -------------------------------------------------------------------------------------
+# 4. Box plots of accuracy by hand (D vs ND), with paired lines per participant
+def accuracy_by_hand_figure(accuracies, pids, hand_order) -> Figure:
+    """accuracies: participants x hands (columns in hand_order)."""
+    wide = np.asarray(accuracies, dtype=float)
+    xpos = np.arange(1, len(hand_order) + 1)
+
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+
+    # Box plots
+    ax.boxplot(
+        [wide[:, j] for j in range(len(hand_order))],
+        positions=xpos,
+        widths=0.5,
+        patch_artist=True,
+        boxprops=dict(facecolor="#dddddd", edgecolor="black"),
+        medianprops=dict(color="black", linewidth=2),
+        whiskerprops=dict(color="black"),
+        capprops=dict(color="black"),
+    )
+
+    # Compute x positions for each participant per hand (so dots can spread)
+    x_pos = np.stack([beeswarm_x_positions(wide[:, j], x_center=xpos[j], spread=0.07, decimals=3)
+                      for j in range(len(hand_order))], axis=1)
+
+    # Participant lines: different color per participant + legend
+    cmap = matplotlib.colormaps["tab10"].resampled(len(pids))  # distinct colors
+    for i, pid in enumerate(pids):
+        ax.plot(
+            x_pos[i], wide[i],
+            marker="o",
+            linewidth=2,
+            markersize=7,
+            color=cmap(i),
+            alpha=0.9,
+            label=f"P{int(pid)}"
+        )
+
+    # Mean markers + mean labels for each hand
+    means = wide.mean(axis=0)
+    ax.scatter(xpos, means, marker="D", s=90, color="black", zorder=5, label="Mean")
+
+    for x, m, hand in zip(xpos, means, hand_order):
+        ax.text(
+            x + 0.12, m,
+            f"{hand} mean = {m:.3f}",
+            va="center",
+            ha="left",
+            fontsize=10,
+            bbox=dict(facecolor="white", edgecolor="none", alpha=0.7, pad=1.5)
+        )
+
+    # Axes / styling
+    ax.set_xticks(xpos)
+    ax.set_xticklabels(hand_order)
+    ax.set_xlabel("Hand")
+    ax.set_ylabel("Accuracy")
+    ax.set_ylim(0.6, 1.0)
+    ax.set_title("Device accuracy by hand (paired within participants)")
+    ax.grid(axis="y", linestyle="--", alpha=0.35)
+
+    # Legend: participant colors + mean marker
+    ax.legend(loc="center left", bbox_to_anchor=(1.02, 0.5), frameon=True, title="Participants")
+    fig.tight_layout()
+    return fig
+
+# -------------------------------------------------------------------------------------
+# 5. SUS score boxplot (wide, short figure for one-column layout)
+def sus_boxplot_figure(scores) -> Figure:
+    fig = Figure(figsize=(6, 4))  # width > height
+    ax = fig.subplots()
+
+    ax.boxplot(
+        scores,
+        vert=True,
+        widths=0.4,
+        patch_artist=True,
+        showfliers=True,
+        boxprops=dict(facecolor="lightgray", edgecolor="black", linewidth=1),
+        medianprops=dict(color="black", linewidth=1.5),
+        whiskerprops=dict(color="black", linewidth=1),
+        capprops=dict(color="black", linewidth=1),
+        flierprops=dict(marker="o", markersize=4,
+                        markerfacecolor="white", markeredgecolor="black")
+    )
+
+    # Overlay raw data points
+    ax.scatter([1] * len(scores), scores, zorder=3, s=20)
+
+    # Axis formatting
+    ax.set_xticks([])
+    ax.set_xlabel("")
+    ax.spines["bottom"].set_visible(False)
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+
+    ax.set_ylabel("SUS Score", fontsize=9)
+    ax.tick_params(axis="y", labelsize=8)
+    ax.grid(axis="y", linestyle="--", alpha=0.4)
+    fig.tight_layout(pad=0.3)
+    return fig
@@ -0,0 +1,138 @@
+'''Loading, cleaning and (grouped) performance metrics of the grip strength validation data.'''
+
+# imports
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# the metrics are shared with the online evaluation, they live in the scn package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from scn.confusion_metrics import METRICS, bootstrap_ci, metrics_from_counts
+
+# columns of the validation sheets
+COL_FORCE = "Dynamometer Peak Force (kg)"
+COL_GT = "Ground Truth (Above/Below)"
+COL_DEV = "Device Output (Above/Below)"
+COL_CORRECT = "Correct? (Y/N)"
+COL_HAND = "Hand (D/ND)"
+COL_PID = "Participant ID"
+COL_SESSION = "Session"
+
+####CLEANING (vectorized, whole columns at once)####
+# German excel uses decimal commas instead of points
+def to_float_decimal_comma(x):
+    """Convert numbers like '5,70' to float 5.70. Returns NaN if not parseable. Accepts scalars or Series."""
+    if isinstance(x, pd.Series):
+        if pd.api.types.is_numeric_dtype(x):
+            return x.astype(float)
+        s = x.astype("string").str.replace(" ", "", regex=False).str.replace(",", ".", regex=False)
+        return pd.to_numeric(s, errors="coerce").astype(float)
+    return float(to_float_decimal_comma(pd.Series([x], dtype=object)).iloc[0])
+
+def norm_correct(x):
+    """Normalize Correct column to True/False/NaN. Accepts scalars or Series."""
+    if isinstance(x, pd.Series):
+        return x.astype("string").str.strip().str.upper().map({"Y": True, "N": False}).astype(object).infer_objects()
+    return norm_correct(pd.Series([x], dtype=object)).iloc[0]
+
+def norm_label_above_below(x, treat_max_as_above=True):
+    """Normalize label column to 'Above'/'Below', map 'Max' -> 'Above'). Accepts scalars or Series."""
+    if isinstance(x, pd.Series):
+        mapping = {"above": "Above", "below": "Below"}
+        if treat_max_as_above:
+            mapping["max"] = "Above"
+        return x.astype("string").str.strip().str.lower().map(mapping).astype(object).infer_objects()
+    return norm_label_above_below(pd.Series([x], dtype=object), treat_max_as_above).iloc[0]
+
+def clean_trials(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop empty rows and add the parsed columns Dynamometer_kg, Correct_trusted, GT and DEV."""
+    df = df.dropna(how="all").copy() # drop completely empty rows
+    df["Dynamometer_kg"] = to_float_decimal_comma(df[COL_FORCE])
+    df["Correct_trusted"] = norm_correct(df[COL_CORRECT])
+    df["GT"] = norm_label_above_below(df[COL_GT], treat_max_as_above=True) # max is above
+    df["DEV"] = norm_label_above_below(df[COL_DEV], treat_max_as_above=True)
+    return df
+
+def load_trials(path) -> pd.DataFrame:
+    """Read one validation sheet and clean it."""
+    return clean_trials(pd.read_excel(path))
+
+def group_columns(df: pd.DataFrame, candidates=(COL_PID, COL_HAND, COL_SESSION)) -> list:
+    """The grouping columns (participant x hand x session) present in the data."""
+    return [c for c in candidates if c in df.columns]
+
+####METRICS####
+# Confusion matrix counts
+def confusion_counts(y_true, y_pred, positive="Below", groups=None):
+    """
+    Define 'positive' as the clinically critical class (often 'Below threshold').
+    Returns TP, FP, TN, FN with respect to chosen positive label; with groups (Series, list of Series or
+    column values aligned with y_true) a DataFrame with one row of counts per group, computed in one pass.
+    """
+    yt = np.asarray(y_true, dtype=object) == positive
+    yp = np.asarray(y_pred, dtype=object) == positive
+    cells = pd.DataFrame({
+        "TP": yt & yp,   # True Positives = true below, predicted below
+        "FP": ~yt & yp,  # False Positives = true above, predicted below
+        "TN": ~yt & ~yp, # True Negatives = true above, predicted above
+        "FN": yt & ~yp,  # False Negatives = true below, predicted above
+    })
+    if groups is None:
+        tp, fp, tn, fn = cells.sum().values
+        return int(tp), int(fp), int(tn), int(fn)
+    if isinstance(groups, pd.Series):
+        groups = [groups]
+    keys = [np.asarray(g) for g in groups]
+    names = [getattr(g, "name", None) for g in groups]
+    counts = cells.groupby(keys, dropna=False).sum().astype(int)
+    counts.index.names = names
+    return counts
+
+def metrics_table(counts: pd.DataFrame, positive="Below") -> pd.DataFrame:
+    """Metrics of every row of a confusion count table (columns TP, FP, TN, FN)."""
+    values = metrics_from_counts(counts["TP"], counts["FP"], counts["TN"], counts["FN"])
+    out = counts.copy()
+    out.insert(0, "N", counts[["TP", "FP", "TN", "FN"]].sum(axis=1))
+    for name in METRICS:
+        out[_metric_label(name, positive)] = values[name]
+    return out
+
+# compute all the important performance metrices
+def compute_metrics(y_true, y_pred, positive="Below", groups=None):
+    """
+    Performance metrics of the device against the ground truth: a dict for all trials, or with groups a DataFrame
+    with one row per group.
+    """
+    if groups is not None:
+        return metrics_table(confusion_counts(y_true, y_pred, positive=positive, groups=groups), positive)
+    tp, fp, tn, fn = confusion_counts(y_true, y_pred, positive=positive)
+    values = metrics_from_counts(tp, fp, tn, fn)
+    metrics = {"N": tp + tn + fp + fn, "TP": tp, "FP": fp, "TN": tn, "FN": fn}
+    metrics.update({_metric_label(name, positive): float(values[name]) for name in METRICS})
+    return metrics
+
+def bootstrap_table(counts: pd.DataFrame, metrics=("Accuracy", "Sensitivity", "Cohens_Kappa"), n_boot=2000,
+                    alpha=0.05, seed=0, positive="Below") -> pd.DataFrame:
+    """
+    Percentile bootstrap CIs per row of a confusion count table (all groups resampled at once).
+    Columns <metric>_low and <metric>_high.
+    """
+    ci = bootstrap_ci(counts["TP"].values, counts["FP"].values, counts["TN"].values, counts["FN"].values,
+                      n_boot=n_boot, alpha=alpha, rng=seed)
+    out = pd.DataFrame(index=counts.index)
+    for name in metrics:
+        label = _metric_label(name, positive)
+        out[label + "_low"], out[label + "_high"] = ci[name]
+    return out
+
+def accuracy_by_group(df: pd.DataFrame, groups) -> pd.Series:
+    """Mean of the trusted Correct? column per group (rows without a valid entry are skipped)."""
+    valid = df["Correct_trusted"].notna()
+    return df.loc[valid].groupby(groups)["Correct_trusted"].mean().astype(float)
+
+def _metric_label(name, positive):
+    # sensitivity is reported together with the positive class, as in the original output
+    return "Sensitivity_(pos={})".format(positive) if name == "Sensitivity" else name
+
@@ -0,0 +1,148 @@
+'''Cached ingestion of validation spreadsheets: parsed and cleaned once, then loaded from a columnar .npz cache.'''
+
+# imports
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from grip_analysis import clean_trials
+
+# cache location, one .npz per spreadsheet content (+ a small index of file stats)
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "scn" / "validation"
+# bump when the cleaning or the encoding changes, old cache entries are then ignored
+CACHE_VERSION = 2
+
+def file_sha256(path) -> str:
+    """Content hash of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def source_key(path, cache_dir=DEFAULT_CACHE_DIR) -> str:
+    """
+    Cache key of a spreadsheet: its content hash, re-hashed only when size or modification time changed
+    (the stats of the last hash are kept in index.json).
+    """
+    path = Path(path).resolve()
+    st = path.stat()
+    index_path = Path(cache_dir) / "index.json"
+    try:
+        index = json.loads(index_path.read_text())
+    except (OSError, ValueError):
+        index = {}
+    entry = index.get(str(path))
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        return entry["sha256"]
+    sha = file_sha256(path)
+    index[str(path)] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha}
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(index, indent=1))
+        os.replace(tmp, index_path)
+    except OSError as e:
+        print(f"Could not update cache index {index_path}: {e}")
+    return sha
+
+####COLUMNAR ENCODING####
+# every column is stored as one typed array: NumPy dtypes (float/int/bool/datetime64/timedelta64) as is,
+# text as a fixed width unicode array, booleans with gaps (True/False/NaN) as int8 with -1 for missing values
+# and numbers in object columns as float64 with a mask of the ints; a mask marks missing text.
+# Columns that would not come back unchanged (mixed types, timezones, other extension dtypes) raise TypeError
+def _is_kind(values, kinds):
+    return bool(values.map(lambda v: isinstance(v, kinds)).all())
+
+def _encode_column(s: pd.Series):
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biufcmM":
+        return "num", {"values": s.to_numpy()}
+    if not (s.dtype == object or pd.api.types.is_string_dtype(s)):
+        raise TypeError(f"column {s.name!r}: dtype {s.dtype} is not cached")
+    missing = s.isna().to_numpy()
+    present = s[~missing]
+    is_bool = present.map(lambda v: isinstance(v, (bool, np.bool_)))
+    if len(present) and is_bool.all():
+        values = np.full(len(s), -1, dtype=np.int8)
+        values[~missing] = present.astype(bool).to_numpy()
+        return "bool_na", {"values": values}
+    if len(present) and s.dtype == object and not is_bool.any() \
+            and _is_kind(present, (int, float, np.integer, np.floating)):
+        return "num_obj", {"values": s.astype(float).to_numpy(),
+                           "is_int": s.map(lambda v: isinstance(v, (int, np.integer))).to_numpy(dtype=bool)}
+    if _is_kind(present, str):
+        return "text", {"values": s.astype("string").fillna("").to_numpy(dtype=str), "missing": missing,
+                        "dtype": np.array(str(s.dtype))}
+    types = sorted({type(v).__name__ for v in present})
+    raise TypeError(f"column {s.name!r}: mixed values ({', '.join(types)}) are not cached")
+
+def _decode_column(kind, arrays, index):
+    if kind == "num":
+        return pd.Series(arrays["values"], index=index)
+    if kind == "bool_na":
+        values = pd.Series(arrays["values"], index=index)
+        return values.map({1: True, 0: False, -1: np.nan}).astype(object).infer_objects()
+    if kind == "num_obj":
+        values = arrays["values"].astype(object)
+        is_int = arrays["is_int"]
+        values[is_int] = arrays["values"][is_int].astype(np.int64).tolist()
+        return pd.Series(values, index=index, dtype=object)
+    values = pd.Series(arrays["values"], index=index, dtype=object)
+    values[arrays["missing"]] = np.nan
+    dtype = str(arrays["dtype"])
+    return values if dtype == "object" else values.astype(dtype)
+
+def save_frame(df: pd.DataFrame, path):
+    """Write a DataFrame as a columnar .npz (atomic replace). Raises TypeError for columns that cannot round-trip."""
+    arrays = {"__index__": df.index.to_numpy()}
+    kinds = []
+    for i, col in enumerate(df.columns):
+        kind, parts = _encode_column(df[col])
+        kinds.append(kind)
+        for name, values in parts.items():
+            arrays[f"c{i}_{name}"] = values
+    arrays["__meta__"] = np.array(json.dumps({"columns": [str(c) for c in df.columns], "kinds": kinds}))
+    tmp = Path(str(path) + ".tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+def load_frame(path) -> pd.DataFrame:
+    """Read a DataFrame written by save_frame."""
+    with np.load(path, allow_pickle=False) as d:
+        meta = json.loads(str(d["__meta__"]))
+        index = pd.Index(d["__index__"])
+        columns = {}
+        for i, (col, kind) in enumerate(zip(meta["columns"], meta["kinds"])):
+            parts = {name[len(f"c{i}_"):]: d[name] for name in d.files if name.startswith(f"c{i}_")}
+            columns[col] = _decode_column(kind, parts, index)
+    return pd.DataFrame(columns, index=index)
+
+####INGESTION####
+def load_validation(path, cache_dir=DEFAULT_CACHE_DIR, sheet_name=0) -> pd.DataFrame:
+    """
+    Cleaned trials of a validation spreadsheet (see grip_analysis.clean_trials).
+    The first call parses the spreadsheet and writes the cache; later calls load the cache as long as the file
+    content is unchanged. cache_dir None disables the cache.
+    """
+    if cache_dir is None:
+        return clean_trials(pd.read_excel(path, sheet_name=sheet_name))
+    cache_dir = Path(cache_dir)
+    key = f"{source_key(path, cache_dir)[:32]}_{sheet_name}_v{CACHE_VERSION}"
+    cache_path = cache_dir / f"{key}.npz"
+    if cache_path.exists():
+        try:
+            return load_frame(cache_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring broken validation cache {cache_path}: {e}")
+
+    df = clean_trials(pd.read_excel(path, sheet_name=sheet_name))
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        save_frame(df, cache_path)
+    except (OSError, TypeError) as e:
+        print(f"Could not write validation cache {cache_path}: {e}")
+    return df
@@ -0,0 +1,151 @@
+'''Headless, parallel report pipeline: every figure is an independent job on the Agg backend, unchanged figures are skipped.'''
+
+# imports
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import figures
+
+# figure settings shared by all jobs
+DPI = 300
+MANIFEST = "manifest.json"
+
+class FigureJob:
+    """One output file: the builder (function name in figures.py), its keyword arguments and the file name."""
+    def __init__(self, builder, filename, **kwargs):
+        self.builder = builder
+        self.filename = filename
+        self.kwargs = kwargs
+
+    def content_hash(self) -> str:
+        """Hash of everything the figure depends on: the builder code, its inputs and the save settings."""
+        h = hashlib.sha256()
+        h.update(Path(figures.__file__).read_bytes())
+        h.update(json.dumps([self.builder, self.filename, DPI, _plain(self.kwargs)], sort_keys=True).encode())
+        return h.hexdigest()
+
+def _plain(value):
+    # JSON friendly copy of the builder inputs (arrays and numpy scalars to lists / Python numbers)
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _render(builder, kwargs, path):
+    # runs in a worker process
+    import matplotlib
+    matplotlib.use("Agg")
+    t0 = time.perf_counter()
+    fig = getattr(figures, builder)(**kwargs)
+    tmp = path.with_name(path.stem + ".tmp" + path.suffix)
+    fig.savefig(tmp, dpi=DPI, bbox_inches="tight")
+    os.replace(tmp, path)
+    return time.perf_counter() - t0
+
+def run_report(jobs, output_dir, workers=None, force=False) -> dict:
+    """
+    Renders the figures whose content hash changed since the last run (all with force) in a process pool,
+    one process per figure up to the number of CPUs, so a full rebuild takes about as long as the slowest figure.
+    The hashes of the written files are kept in output_dir/manifest.json.
+    Returns {filename: "skipped" | seconds | exception}.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        manifest = {}
+
+    results = {}
+    todo = []
+    for job in jobs:
+        digest = job.content_hash()
+        if not force and manifest.get(job.filename) == digest and (output_dir / job.filename).exists():
+            results[job.filename] = "skipped"
+        else:
+            todo.append((job, digest))
+
+    if todo:
+        workers = workers or min(len(todo), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(job, digest, pool.submit(_render, job.builder, job.kwargs, output_dir / job.filename))
+                       for job, digest in todo]
+            for job, digest, future in futures:
+                try:
+                    results[job.filename] = future.result()
+                    manifest[job.filename] = digest
+                except Exception as e:
+                    results[job.filename] = e
+                    manifest.pop(job.filename, None)
+
+        tmp = manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp, manifest_path)
+    return results
+
+def print_results(results):
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            print(f"{name:>45}: FAILED ({result})")
+        elif result == "skipped":
+            print(f"{name:>45}: unchanged")
+        else:
+            print(f"{name:>45}: {result:.2f} s")
+
+####JOBS OF THE VALIDATION DATA####
+def performance_jobs(df, metrics, col_pid, col_hand):
+    """The four performance figures from the cleaned trials (see grip_analysis.clean_trials) and their metrics."""
+    valid_correct = df["Correct_trusted"].notna()
+    jobs = [FigureJob("confusion_matrix_figure", "confusion_matrix.png",
+                      tp=metrics["TP"], fp=metrics["FP"], tn=metrics["TN"], fn=metrics["FN"])]
+
+    plot_df = df[np.isfinite(df["Dynamometer_kg"]) & valid_correct]
+    jobs.append(FigureJob("force_distribution_figure", "force_distribution_with_correctness.png",
+                          force_kg=plot_df["Dynamometer_kg"].to_numpy(dtype=float),
+                          correct=plot_df["Correct_trusted"].astype(bool).to_numpy()))
+
+    acc_by_pid = df.loc[valid_correct].groupby(col_pid)["Correct_trusted"].mean().astype(float).dropna()
+    jobs.append(FigureJob("accuracy_by_participant_figure", "accuracy_by_participant_boxplot.png",
+                          accuracies=acc_by_pid.to_numpy(), pids=acc_by_pid.index.astype(str).tolist()))
+
+    # rows=participant, cols=hand; participants missing a hand are dropped
+    wide = (df.loc[valid_correct].groupby([col_pid, col_hand])["Correct_trusted"].mean().astype(float)
+              .unstack(col_hand))
+    hand_order = [h for h in ["D", "ND"] if h in wide.columns]
+    wide = wide[hand_order].dropna().sort_index()
+    jobs.append(FigureJob("accuracy_by_hand_figure", "accuracy_by_hand_paired.png",
+                          accuracies=wide.to_numpy(), pids=wide.index.tolist(), hand_order=hand_order))
+    return jobs
+
+def sus_jobs(scores, filename="sus_boxplot.pdf"):
+    return [FigureJob("sus_boxplot_figure", filename, scores=list(scores))]
+
+####FULL REPORT####
+if __name__ == "__main__":
+    import argparse
+    from grip_analysis import COL_HAND, COL_PID, compute_metrics
+    from ingest import load_validation
+    from SUS_boxplot import SUS_SCORES
+
+    script_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Render all figures of the validation report")
+    parser.add_argument("--force", action="store_true", help="redraw all figures, also the unchanged ones")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: one per figure)")
+    args = parser.parse_args()
+
+    df = load_validation(script_dir / "data/Grip_Strength_TestData.xlsx")
+    metrics = compute_metrics(df["GT"], df["DEV"], positive="Below")
+    jobs = performance_jobs(df, metrics, COL_PID, COL_HAND) + sus_jobs(SUS_SCORES)
+    t0 = time.perf_counter()
+    print_results(run_report(jobs, script_dir / "figures", workers=args.workers, force=args.force))
+    print(f"{'total':>45}: {time.perf_counter() - t0:.2f} s")
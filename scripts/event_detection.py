@@ -1,18 +1,60 @@
 """
 FILE: event_detection.py
-PURPOSE: Simple classification for stroke rehab. Categorized raw force data intro three states based on predefined thresholds
+PURPOSE: Simple classification for stroke rehab. Categorized raw force data intro three states based on predefined thresholds.
+classify_frame() classifies every cell of a frame at once with per-cell/per-channel thresholds, hysteresis and
+a minimum dwell time, so the feedback does not flicker near a threshold
+LifEncoder/SpikingGripDetector: neuromorphic variant, spike trains of leaky integrate-and-fire neurons per cell
+and channel, grip quality from spike rates and coincidence of neighboring cells (live or offline)
 """
+import threading
+import time
+
+import numpy as np
+
+# feedback states
+IDLE, GOOD, WEAK = 0, 1, 2
+# rank of the states (GOOD beats WEAK beats IDLE) -> state
+_RANK_TO_STATE = np.array([IDLE, WEAK, GOOD])
+
 
 class GripLogic:
-    def __init__(self):
+    def __init__(self, hysteresis=0.02, min_dwell=0.03):
         """
         Initializes classification thresholds based on clinical research
-        Inputs: none
+        STRONG_GRIP/WEAK_GRIP may be scalars or one value per force channel
+        Inputs: hysteresis (force a value must fall below a threshold to leave its state), min_dwell (s a new
+        state must persist before it is reported)
         Outputs:none
         """
-        self.STRONG_GRIP = 0.34  # Good pressure -> Green - 9kg target force (clinical research)
+        # 0.34 corresponds to the 9kg target force (clinical research), the feedback uses 0.15
         self.STRONG_GRIP = 0.15  # Good pressure -> Green
         self.WEAK_GRIP = 0.05    # Light touch -> Red
+        self.HYSTERESIS = hysteresis
+        self.MIN_DWELL = min_dwell
+        self.__cell_thr = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the per-cell states of classify_frame
+        Inputs: none
+        Outputs: none
+        """
+        self.__ids = None
+        self.__thr = None
+        self.__thr_key = None
+        self.__rank = np.zeros(0, dtype=np.int64)
+        self.__cand = np.zeros(0, dtype=np.int64)     # candidate rank of the last frame
+        self.__t_pending = np.zeros(0)                  # since when the candidate differs from the state
+
+    def set_cell_thresholds(self, sc_id, strong, weak):
+        """
+        Patient/cell specific calibration, overrides STRONG_GRIP and WEAK_GRIP for one cell
+        Inputs: sc_id (int), strong, weak (scalar or one value per force channel)
+        Outputs: none
+        """
+        self.__cell_thr[int(sc_id)] = (strong, weak)
+        self.__thr = None
 
     def classify(self, force_val):
         """
@@ -21,14 +63,271 @@ class GripLogic:
         Outputs: int. State
         0: White (Idle), 1: Green (Good), 2: Red (Weak)
         """
-        if force_val > self.STRONG_GRIP:
-            # print("GOOD FORCE:", force_val) 
-            return 1
-        elif force_val > self.WEAK_GRIP:
-            # print("BAD FORCE:", force_val) 
-            return 2
-        if force_val > self.STRONG_GRIP:
-            return 1
-        elif force_val > self.WEAK_GRIP:
-            return 2
-        return 0
\ No newline at end of file
+        if force_val > np.min(self.STRONG_GRIP):
+            return GOOD
+        elif force_val > np.min(self.WEAK_GRIP):
+            return WEAK
+        return IDLE
+
+    def classify_frame(self, forces, sc_ids=None, t=None):
+        """
+        Categorizes all cells of a frame in one call. A cell takes the best state any of its channels reaches;
+        leaving a state needs the force to drop HYSTERESIS below its threshold and every change has to
+        persist MIN_DWELL seconds. The global state is the best (already debounced) cell state, so a change reaches
+        the feedback after one dwell time
+        Inputs: forces (n_cells x n_channels or n_cells), sc_ids (n_cells, needed for per-cell thresholds and
+        to keep the states when the cells change), t (time.monotonic() of the frame)
+        Outputs: cell_states (np.ndarray of 0/1/2), global state (int)
+        """
+        forces = np.asarray(forces, dtype=float)
+        if forces.ndim == 1:
+            forces = forces[:, None]
+        if sc_ids is None:
+            sc_ids = np.arange(len(forces))
+        t = time.monotonic() if t is None else t
+        self.__align(np.asarray(sc_ids), forces.shape[1])
+        strong, weak = self.__thr
+        rank = self.__rank
+
+        # thresholds depend on the current state (hysteresis band below the entry threshold)
+        strong_t = strong - self.HYSTERESIS * (rank == 2)[:, None]
+        weak_t = weak - self.HYSTERESIS * (rank >= 1)[:, None]
+        cand = np.where((forces > strong_t).any(axis=1), 2, np.where((forces > weak_t).any(axis=1), 1, 0))
+
+        # dwell: the same candidate has to differ from the state for MIN_DWELL, then the state takes it;
+        # the timer restarts whenever the candidate changes (e.g. weak -> good while still idle)
+        differ = cand != rank
+        self.__t_pending = np.where(differ & (cand != self.__cand), t, self.__t_pending)
+        switch = differ & (t - self.__t_pending >= self.MIN_DWELL)
+        self.__rank = np.where(switch, cand, rank)
+        self.__cand = cand
+
+        g_rank = int(self.__rank.max()) if len(self.__rank) else 0
+        return _RANK_TO_STATE[self.__rank], int(_RANK_TO_STATE[g_rank])
+
+    def __align(self, sc_ids, n_channels):
+        """
+        Keeps states and thresholds row-aligned with the cells of the frame
+        Inputs: sc_ids (np.ndarray), n_channels (int)
+        Outputs: none
+        """
+        if self.__ids is None or not (sc_ids is self.__ids or np.array_equal(sc_ids, self.__ids)):
+            old = {} if self.__ids is None else {int(i): k for k, i in enumerate(self.__ids)}
+            ind = np.array([old.get(int(i), -1) for i in sc_ids], dtype=np.int64)
+            keep = ind >= 0
+            ind = np.maximum(ind, 0)
+
+            def remap(arr):
+                return np.where(keep, arr[ind], 0).astype(arr.dtype) if len(arr) else np.zeros(len(sc_ids), arr.dtype)
+
+            self.__rank = remap(self.__rank)
+            self.__cand = remap(self.__cand)
+            self.__t_pending = remap(self.__t_pending)
+            self.__ids = sc_ids
+            self.__thr = None
+
+        key = (np.asarray(self.STRONG_GRIP, dtype=float).tobytes(), np.asarray(self.WEAK_GRIP, dtype=float).tobytes(), n_channels)
+        if self.__thr is not None and self.__thr_key == key:
+            return
+        strong = np.empty((len(sc_ids), n_channels))
+        weak = np.empty((len(sc_ids), n_channels))
+        strong[:] = self.STRONG_GRIP
+        weak[:] = self.WEAK_GRIP
+        for k, sc_id in enumerate(sc_ids.tolist()):
+            thr = self.__cell_thr.get(int(sc_id))
+            if thr is not None:
+                strong[k], weak[k] = thr
+        self.__thr = (strong, weak)
+        self.__thr_key = key
+
+
+class LifEncoder:
+    def __init__(self, tau=0.1, threshold=1.0, gain=200.0):
+        """
+        Streaming leaky integrate-and-fire encoder: every cell and force channel is one neuron
+        tau*dv/dt = -v + tau*gain*force, a spike is emitted (and threshold subtracted) whenever v reaches
+        threshold. Forces below threshold/(gain*tau) (0.05 with the defaults, the WEAK_GRIP level) never spike,
+        above it the spike rate grows with the force
+        Inputs: tau (membrane time constant, s), threshold, gain (1/s per unit force)
+        Outputs: none
+        """
+        self.tau = tau
+        self.threshold = threshold
+        self.gain = gain
+        self.v = np.zeros((0, 0))
+
+    def reset(self, n_cells=0, n_channels=0):
+        """
+        Clears the membrane potentials
+        Inputs: n_cells, n_channels
+        Outputs: none
+        """
+        self.v = np.zeros((n_cells, n_channels))
+
+    def step(self, forces, dt):
+        """
+        Advances all neurons by dt with the forces held constant (exact solution of the leak)
+        Inputs: forces (n_cells x n_channels), dt (s)
+        Outputs: spike counts (n_cells x n_channels, int)
+        """
+        if self.v.shape != forces.shape:
+            self.reset(*forces.shape)
+        decay = np.exp(-dt / self.tau)
+        drive = self.tau * self.gain * np.maximum(forces, 0.0)
+        self.v = drive + (self.v - drive) * decay
+        spikes = np.floor(self.v / self.threshold).astype(np.int64)
+        np.maximum(spikes, 0, out=spikes)
+        self.v -= spikes * self.threshold
+        return spikes
+
+
+class SpikingGripDetector:
+    def __init__(self, encoder=None, tau_rate=0.2, tau_coinc=0.05, good_rate=20.0, weak_rate=2.0, min_neighbors=1):
+        """
+        Grip quality from spike trains: a cell is GOOD when its spike rate reaches good_rate while at least
+        min_neighbors neighboring cells spike within ~tau_coinc (the grip engages several adjacent cells),
+        WEAK when it spikes at weak_rate or more, IDLE otherwise. The global state is the best cell state.
+        Without a topology (set_topology) every other spiking cell counts as neighbor
+        Inputs: encoder (LifEncoder), tau_rate/tau_coinc (s), good_rate/weak_rate (Hz), min_neighbors
+        Outputs: none
+        """
+        self.encoder = encoder or LifEncoder()
+        self.tau_rate = tau_rate
+        self.tau_coinc = tau_coinc
+        self.good_rate = good_rate
+        self.weak_rate = weak_rate
+        self.min_neighbors = min_neighbors
+        self.__kernels = None
+        self.__new_kernels = None      # (kernels,) handed over by set_topology, applied by the next step()
+        self.__mutex = threading.Lock()
+        self.__callbacks = []
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all neuron, rate and coincidence state
+        Inputs: none
+        Outputs: none
+        """
+        self.encoder.reset()
+        self.__ids = None
+        self.__tind = None
+        self.__rate = np.zeros(0)
+        self.__trace = np.zeros(0)
+        self.__t_last = None
+        self.latest = None
+
+    def set_topology(self, topology):
+        """
+        Neighborhood for the coincidence test, from the neighbor list (scn.ctrl.topology.Topology)
+        May be called from any thread: the kernels are built here and taken over at the start of the next step()
+        Inputs: topology (Topology or None)
+        Outputs: none
+        """
+        from scn.ctrl.spatial import SpatialKernels
+        kernels = None if topology is None else SpatialKernels(topology)
+        with self.__mutex:
+            self.__new_kernels = (kernels,)
+
+    def add_callback(self, cb):
+        """
+        Registers cb(result) called after every processed frame
+        Inputs: cb (callable)
+        Outputs: none
+        """
+        self.__callbacks.append(cb)
+
+    def step(self, sc_ids, forces, t):
+        """
+        Processes one frame for all cells at once
+        Inputs: sc_ids (n_cells), forces (n_cells x n_channels), t (s, monotonic)
+        Outputs: dict with spikes (n_cells x n_channels), rate (Hz per cell), neighbors (coincident neighbors
+        per cell), cell_states (0/1/2 per cell) and state (global)
+        """
+        sc_ids = np.asarray(sc_ids)
+        forces = np.asarray(forces, dtype=float)
+        if forces.ndim == 1:
+            forces = forces[:, None]
+        if self.__new_kernels is not None:
+            with self.__mutex:
+                (self.__kernels,), self.__new_kernels = self.__new_kernels, None
+            self.__tind = None
+        if self.__ids is None or not (sc_ids is self.__ids or np.array_equal(sc_ids, self.__ids)):
+            # cell layout changed: restart the neurons
+            self.encoder.reset(*forces.shape)
+            self.__rate = np.zeros(len(sc_ids))
+            self.__trace = np.zeros(len(sc_ids))
+            self.__ids = sc_ids
+            self.__tind = None
+        dt = 0.0 if self.__t_last is None else max(t - self.__t_last, 0.0)
+        self.__t_last = t
+
+        spikes = self.encoder.step(forces, dt)
+        n = spikes.sum(axis=1)
+        self.__rate = self.__rate * np.exp(-dt / self.tau_rate) + n / self.tau_rate
+        self.__trace = self.__trace * np.exp(-dt / self.tau_coinc) + n
+        active = (self.__trace > 0.5).astype(float)
+
+        if self.__kernels is None:
+            neighbors = active.sum() - active
+        else:
+            if self.__tind is None:
+                self.__tind = self.__kernels.topology().indices_of(sc_ids)
+            ok = self.__tind >= 0
+            vec = np.zeros(len(self.__kernels))
+            vec[self.__tind[ok]] = active[ok]
+            neighbors = np.where(ok, self.__kernels.matvec(vec)[np.maximum(self.__tind, 0)], 0.0)
+
+        rank = np.where((self.__rate >= self.good_rate) & (neighbors >= self.min_neighbors), 2,
+                        np.where(self.__rate >= self.weak_rate, 1, 0))
+        g_rank = int(rank.max()) if len(rank) else 0
+        result = {
+            "spikes": spikes,
+            "rate": self.__rate.copy(),
+            "neighbors": neighbors,
+            "cell_states": _RANK_TO_STATE[rank],
+            "state": int(_RANK_TO_STATE[g_rank]),
+        }
+        self.latest = result
+        for cb in self.__callbacks:
+            cb(result)
+        return result
+
+    def process_frame(self, frame):
+        """
+        Live input: FrameAssembler callback (frames.add_callback(detector.process_frame))
+        Inputs: frame (scn.sc.frame_assembler.Frame)
+        Outputs: step() result
+        """
+        from scn.sc.pkt.data import SENS_IND_FORCE1, SENS_IND_FORCE3
+        return self.step(frame["sc_ids"], frame["values"][:, SENS_IND_FORCE1:SENS_IND_FORCE3+1], frame["t"])
+
+    def run_offline(self, t, sc_ids, forces):
+        """
+        Offline input: replays a recorded session as fast as possible, same engine as live
+        Inputs: t (n_frames), sc_ids (n_cells), forces (n_frames x n_cells x n_channels)
+        Outputs: dict of stacked results: spikes (n_frames x n_cells x n_channels), rate, neighbors,
+        cell_states (n_frames x n_cells) and state (n_frames)
+        """
+        self.reset()
+        forces = np.asarray(forces, dtype=float)
+        if forces.ndim == 2:
+            forces = forces[:, :, None]
+        sc_ids = np.asarray(sc_ids)
+        n_frames, n_cells, n_channels = forces.shape
+        out = {
+            "spikes": np.zeros((n_frames, n_cells, n_channels), dtype=np.int64),
+            "rate": np.zeros((n_frames, n_cells)),
+            "neighbors": np.zeros((n_frames, n_cells)),
+            "cell_states": np.zeros((n_frames, n_cells), dtype=np.int64),
+            "state": np.zeros(n_frames, dtype=np.int64),
+        }
+        callbacks, self.__callbacks = self.__callbacks, []
+        try:
+            for k in range(n_frames):
+                res = self.step(sc_ids, forces[k], float(t[k]))
+                for key, arr in out.items():
+                    arr[k] = res[key]
+        finally:
+            self.__callbacks = callbacks
+        return out
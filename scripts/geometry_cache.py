@@ -0,0 +1,304 @@
+"""
+FILE: geometry_cache.py
+PURPOSE: Startup geometry for the 3D visualizer. Turns the STL into an indexed mesh (deduplicated vertices, smooth
+vertex normals) and builds the merged sensor node mesh, then caches all arrays as .npy files (memory-mapped on
+load) in a directory keyed by the STL content hash and the grid parameters. Later starts skip STL parsing
+and the node generation. For the pressure heatmap the handle surface is refined (edges split until they are short
+enough to carry a color gradient) and a sparse inverse-distance weight matrix from the cells to the refined
+vertexes is cached with it, so a frame is one sparse mat-vec. The weights are cached per sensor node, a new cell
+mapping (inferred layout) only relabels their columns
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "scn", "geometry")
+# bump when the cached arrays change, old cache directories are then ignored
+CACHE_VERSION = 2
+
+# sensor grid over the handle, see build_sensor_grid
+GRID_PARAMS = {
+    "rows": 14,
+    "cols": 16,
+    "length": 100,
+    "radius": 25.5,
+    "offset": (-45, 25, -25),
+    "total_angle": np.pi + 0.9,
+    "start_angle": -0.45,
+    "node_scale": (5.0, 5.0, 0.2),
+    "right_ids": (1, 16, 15, 14, 13),
+    "center_ids": (2, 4, 6, 8, 10, 12),
+    "left_ids": (3, 5, 7, 9, 11),
+    "stl_rotations": ((90, 0, 0, 1), (-90, 0, 1, 0)),   # GLMeshItem.rotate calls placing the STL on the grid
+    "heat_max_edge": 6.0,       # mm, longest edge of the refined surface
+    "heat_neighbors": 6,        # sensor nodes interpolated per vertex
+    "heat_power": 2.0,          # inverse distance weights 1/d^power
+    "heat_radius": 15.0,        # mm, weights fade out for vertexes farther than this from all nodes
+}
+
+_ARRAYS = ("stl_vertexes", "stl_faces", "stl_normals",
+           "node_vertexes", "node_faces", "node_cell", "node_uv", "faces_per_node",
+           "heat_vertexes", "heat_faces", "heat_normals", "heat_rows", "heat_nodes", "heat_weights")
+
+
+def geometry_key(file_stl, params=GRID_PARAMS):
+    """
+    Cache key from the STL content and the grid parameters
+    Inputs: file_stl (str), params (dict)
+    Outputs: str (hex digest)
+    """
+    h = hashlib.sha1()
+    with open(file_stl, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    h.update(json.dumps(params, sort_keys=True).encode())
+    h.update(str(CACHE_VERSION).encode())
+    return h.hexdigest()
+
+
+def load_stl_indexed(file_stl):
+    """
+    Parses the STL and merges identical vertices into an indexed mesh with area weighted vertex normals
+    Inputs: file_stl (str)
+    Outputs: vertexes (Nv x 3 float32), faces (Nf x 3 uint32), normals (Nv x 3 float32)
+    """
+    from stl import mesh
+    points = mesh.Mesh.from_file(file_stl).points.reshape(-1, 3).astype(np.float32)
+    vertexes, inverse = np.unique(points, axis=0, return_inverse=True)
+    faces = inverse.reshape(-1, 3).astype(np.uint32)
+
+    return vertexes, faces, vertex_normals(vertexes, faces)
+
+
+def vertex_normals(vertexes, faces):
+    """
+    Area weighted vertex normals of an indexed mesh
+    Inputs: vertexes (Nv x 3), faces (Nf x 3)
+    Outputs: normals (Nv x 3 float32)
+    """
+    v = vertexes[faces]
+    face_normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])   # length ~ 2x face area
+    normals = np.zeros((len(vertexes), 3))
+    for k in range(3):
+        normals[:, k] = np.bincount(faces.ravel(), weights=np.repeat(face_normals[:, k], 3), minlength=len(vertexes))
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals /= np.where(length > 0, length, 1)
+    return normals.astype(np.float32)
+
+
+def refine_mesh(vertexes, faces, max_edge, max_passes=12):
+    """
+    Splits every edge longer than max_edge at its midpoint until none is left. Each pass refines all faces at once
+    (1, 2 or 3 split edges -> 2, 3 or 4 faces); the split decision belongs to the edge, so neighboring faces stay
+    conforming (no T-junctions)
+    Inputs: vertexes (Nv x 3), faces (Nf x 3), max_edge (float), max_passes (int)
+    Outputs: vertexes (float32), faces (uint32)
+    """
+    vertexes = np.asarray(vertexes, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    for _ in range(max_passes):
+        pairs = np.stack((faces, np.roll(faces, -1, axis=1)), axis=2).reshape(-1, 2)   # edges ab, bc, ca
+        edges, edge_of = np.unique(np.sort(pairs, axis=1), axis=0, return_inverse=True)
+        edge_of = edge_of.reshape(-1, 3)
+        split = np.linalg.norm(vertexes[edges[:, 0]] - vertexes[edges[:, 1]], axis=1) > max_edge
+        if not split.any():
+            break
+        mid = np.full(len(edges), -1)
+        mid[split] = len(vertexes) + np.arange(split.sum())
+        vertexes = np.concatenate((vertexes, vertexes[edges[split]].mean(axis=1)))
+
+        marks = split[edge_of]
+        n_marks = marks.sum(axis=1)
+        # rotate every face so that its split edges come first (ab, then bc), the cyclic order is kept
+        shift = np.zeros(len(faces), dtype=np.int64)
+        one, two = n_marks == 1, n_marks == 2
+        shift[one] = np.argmax(marks[one], axis=1)
+        shift[two] = (np.argmin(marks[two], axis=1) + 1) % 3
+        order = (shift[:, None] + np.arange(3)) % 3
+        a, b, c = np.take_along_axis(faces, order, axis=1).T
+        m_ab, m_bc, m_ca = mid[np.take_along_axis(edge_of, order, axis=1)].T
+
+        parts = [faces[n_marks == 0]]
+        parts.append(np.stack((a, m_ab, c), axis=1)[one])
+        parts.append(np.stack((m_ab, b, c), axis=1)[one])
+        for tri in ((m_ab, b, m_bc), (a, m_ab, m_bc), (a, m_bc, c)):
+            parts.append(np.stack(tri, axis=1)[two])
+        three = n_marks == 3
+        for tri in ((a, m_ab, m_ca), (m_ab, b, m_bc), (m_ca, m_bc, c), (m_ab, m_bc, m_ca)):
+            parts.append(np.stack(tri, axis=1)[three])
+        faces = np.concatenate(parts)
+    return vertexes.astype(np.float32), faces.astype(np.uint32)
+
+
+def stl_to_world(vertexes, rotations):
+    """
+    Applies the GLMeshItem.rotate calls (each one multiplied on the left) to the STL vertexes
+    Inputs: vertexes (Nv x 3), rotations (sequence of (angle deg, x, y, z))
+    Outputs: vertexes (Nv x 3) in the coordinates of the sensor grid
+    """
+    out = np.asarray(vertexes, dtype=np.float64)
+    for angle, x, y, z in rotations:
+        axis = np.array((x, y, z), dtype=np.float64)
+        axis /= np.linalg.norm(axis)
+        kx = np.array(((0, -axis[2], axis[1]), (axis[2], 0, -axis[0]), (-axis[1], axis[0], 0)))
+        th = np.radians(angle)
+        rot = np.eye(3) + np.sin(th)*kx + (1 - np.cos(th))*(kx @ kx)   # Rodrigues
+        out = out @ rot.T
+    return out
+
+
+def surface_node_weights(vertexes, node_centers, params=GRID_PARAMS):
+    """
+    Sparse interpolation matrix (COO) from the sensor nodes to the surface vertexes: inverse distance weights of
+    the nearest nodes, faded out far from all nodes. Independent of the cell mapping
+    Inputs: vertexes (Nv x 3, grid coordinates), node_centers (n_nodes x 3), params (dict)
+    Outputs: rows (vertex index), nodes (node index), weights, see map_weights
+    """
+    k = min(params["heat_neighbors"], len(node_centers))
+    nearest = np.empty((len(vertexes), k), dtype=np.int64)
+    dist = np.empty((len(vertexes), k))
+    for i in range(0, len(vertexes), 4096):     # blocks keep the distance matrix small
+        d = np.linalg.norm(vertexes[i:i+4096, None, :] - node_centers[None, :, :], axis=2)
+        nearest[i:i+4096] = np.argpartition(d, k - 1, axis=1)[:, :k]
+        dist[i:i+4096] = np.take_along_axis(d, nearest[i:i+4096], axis=1)
+    w = 1.0/np.maximum(dist, 1e-3)**params["heat_power"]
+    w /= w.sum(axis=1, keepdims=True)
+    w *= np.exp(-(dist.min(axis=1, keepdims=True)/params["heat_radius"])**2)
+    valid = w > 1e-4
+    rows = np.broadcast_to(np.arange(len(vertexes))[:, None], nearest.shape)
+    return rows[valid].astype(np.int64), nearest[valid], w[valid].astype(np.float32)
+
+
+def map_weights(rows, nodes, weights, node_cell, n_cells=16):
+    """
+    Cell columns of the node weights for one cell mapping (O(nnz), no distance computation); weights of nodes without
+    a valid cell are dropped, surface_values sums the weights of the nodes of a cell
+    Inputs: rows, nodes, weights (surface_node_weights), node_cell (n_nodes cell IDs 1..n_cells), n_cells (int)
+    Outputs: rows (vertex index), cols (cell index 0..n_cells-1), weights, see surface_values
+    """
+    cols = np.asarray(node_cell)[nodes] - 1
+    valid = (cols >= 0) & (cols < n_cells)
+    return np.asarray(rows)[valid], cols[valid].astype(np.int64), np.asarray(weights)[valid]
+
+
+def surface_weights(vertexes, node_centers, node_cell, params=GRID_PARAMS, n_cells=16):
+    """
+    Sparse interpolation matrix (COO) from the cell intensities to the surface vertexes, see surface_node_weights
+    Inputs: vertexes (Nv x 3, grid coordinates), node_centers (n_nodes x 3), node_cell (n_nodes cell IDs 1..n_cells),
+    params (dict), n_cells (int)
+    Outputs: rows (vertex index), cols (cell index 0..n_cells-1), weights, see surface_values
+    """
+    return map_weights(*surface_node_weights(vertexes, node_centers, params), node_cell, n_cells)
+
+
+def surface_values(rows, cols, weights, cell_values, n_vertexes):
+    """
+    Per-vertex intensity, one sparse mat-vec
+    Inputs: rows, cols, weights (surface_weights), cell_values (n_cells), n_vertexes (int)
+    Outputs: np.ndarray (n_vertexes)
+    """
+    return np.bincount(rows, weights=weights*np.asarray(cell_values)[cols], minlength=n_vertexes)
+
+
+def node_centers(geo):
+    """
+    Centers of the sensor nodes
+    Inputs: geo (dict, load_geometry)
+    Outputs: np.ndarray (n_nodes x 3)
+    """
+    return np.asarray(geo["node_vertexes"]).reshape(len(geo["node_cell"]), -1, 3).mean(axis=1)
+
+
+def build_heatmap(geo, params=GRID_PARAMS):
+    """
+    Refined handle surface with its interpolation weights per sensor node (map_weights gives the cell weights)
+    Inputs: geo (dict with the STL and node arrays), params (dict)
+    Outputs: dict with heat_vertexes, heat_faces, heat_normals, heat_rows, heat_nodes, heat_weights
+    """
+    vertexes, faces = refine_mesh(geo["stl_vertexes"], geo["stl_faces"], params["heat_max_edge"])
+    rows, nodes, weights = surface_node_weights(stl_to_world(vertexes, params["stl_rotations"]), node_centers(geo),
+                                                params)
+    return {
+        "heat_vertexes": vertexes,
+        "heat_faces": faces,
+        "heat_normals": vertex_normals(vertexes, faces),
+        "heat_rows": rows,
+        "heat_nodes": nodes,
+        "heat_weights": weights,
+    }
+
+
+def build_sensor_grid(params=GRID_PARAMS):
+    """
+    Generates all hexagon nodes over the handle as one mesh (translate*rotate*scale per node) and maps every node
+    to its cell ID (right/center/left zones along the handle)
+    Inputs: params (dict)
+    Outputs: dict with node_vertexes, node_faces, node_cell, node_uv, faces_per_node
+    """
+    import pyqtgraph.opengl as gl
+    rows, cols = params["rows"], params["cols"]
+    hexagon_data = gl.MeshData.sphere(rows=2, cols=6)
+    base = hexagon_data.vertexes() * np.array(params["node_scale"])
+    base_faces = hexagon_data.faces()
+
+    i, j = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    i, j = i.ravel(), j.ravel()
+    angle = params["start_angle"] + params["total_angle"] * (j / (cols - 1))
+    offset = np.array(params["offset"])
+    center = np.stack(((i - rows / 2) * (params["length"] / rows) + offset[0],
+                       params["radius"] * np.cos(angle) + offset[1],
+                       params["radius"] * np.sin(angle) + offset[2]), axis=1)
+
+    # rotation about x by angle+90 deg, applied to all nodes at once
+    rot = angle + np.pi / 2
+    c, s = np.cos(rot)[:, None], np.sin(rot)[:, None]
+    bx, by, bz = base[None, :, 0], base[None, :, 1], base[None, :, 2]
+    vertexes = np.stack((np.broadcast_to(bx, (len(rot), len(base))), c * by - s * bz, s * by + c * bz), axis=2)
+    vertexes = (vertexes + center[:, None, :]).reshape(-1, 3)
+    faces = (base_faces[None, :, :] + (np.arange(len(rot)) * len(base))[:, None, None]).reshape(-1, 3)
+
+    right, center_ids, left = (np.array(params[k]) for k in ("right_ids", "center_ids", "left_ids"))
+    node_cell = np.where(i < 5, right[np.minimum(j // 4, 4)],
+                         np.where(i < 10, center_ids[np.minimum(j // 3, 5)], left[np.minimum(j // 4, 4)]))
+    return {
+        "node_vertexes": vertexes.astype(np.float32),
+        "node_faces": faces.astype(np.uint32),
+        "node_cell": node_cell.astype(np.int64),
+        "node_uv": np.stack((i / (rows - 1), j / (cols - 1)), axis=1),
+        "faces_per_node": np.array(len(base_faces)),
+    }
+
+
+def load_geometry(file_stl, params=GRID_PARAMS, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Cached geometry of the visualizer; cache_dir None disables the cache
+    Inputs: file_stl (str), params (dict), cache_dir (str or None)
+    Outputs: dict of arrays (read-only memory maps when loaded from the cache), see _ARRAYS
+    """
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, geometry_key(file_stl, params))
+        if os.path.isdir(path):
+            try:
+                return {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in _ARRAYS}
+            except (OSError, ValueError) as e:
+                print(f"Ignoring broken geometry cache {path}: {e}")
+
+    geo = dict(zip(("stl_vertexes", "stl_faces", "stl_normals"), load_stl_indexed(file_stl)))
+    geo.update(build_sensor_grid(params))
+    geo.update(build_heatmap(geo, params))
+
+    if path is not None:
+        tmp = path + ".tmp"
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp, name + ".npy"), geo[name])
+            os.replace(tmp, path)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print(f"Could not write geometry cache {path}: {e}")
+    return geo
@@ -5,30 +5,46 @@ Coordinates LED colors based on pressure levels and synchronizes data tranmissio
 """
 import threading
 import time
+import numpy as np
 from scn.ctrl.handler.led_control import COLOR_VAL_MAP
-from scn.sc.pkt.data import data_tuple_to_data1200
+from scn.sc.pkt.data import SENS_IND_FORCE1, SENS_IND_FORCE3
 from event_detection import GripLogic
-from ui_bridge import UIBridge
+
+LED_REFRESH_S = 1.0  # event-driven mode rewrites an unchanged color at most this often (lost UDP packets)
 
 class LedFeedbackRehab:
-    def __init__(self, hwi, data_pub, led_ctrl, visualizer=None):
+    def __init__(self, hwi, data_pub, led_ctrl, visualizer=None, frames=None, event_driven=False, min_led_interval=0.0,
+                 detector=None):
         """
         Initializes feedback controller with hardware interface, data publisher, LED controller and optional visualizer
-        Inputs: hwi, data_pub, led_ctrl, visualizer
+        With a FrameAssembler (frames) every update classifies one complete sampling cycle instead of
+        mixing cells from different cycles
+        event_driven: classify as soon as a frame (or sample) arrives instead of polling at 25 Hz; bursts are
+        coalesced, the LEDs are only written on a color change and at most every min_led_interval seconds
+        detector: optional SpikingGripDetector (event_detection) that replaces the threshold logic
+        Inputs: hwi, data_pub, led_ctrl, visualizer, frames, event_driven (bool), min_led_interval (float), detector
         Outputs:none
         """
         self.__hwi = hwi
         self.__data_pub = data_pub
+        self.__frames = frames
         self.__led_ctrl = led_ctrl
         self.logic = GripLogic()
+        self.detector = detector
+        self.cell_states = np.zeros(0, dtype=np.int64)  # per-cell feedback state of the last update
         self.bridge=None
         if visualizer:
+            from ui_bridge import UIBridge  # only needed with a GUI
             self.bridge=UIBridge(visualizer)
         self.__started = False
         self.__thread = None
         self.__stop_event = threading.Event()
+        self.__event_driven = event_driven
+        self.__min_led_interval = min_led_interval
+        self.__wake = threading.Event()
         self.__mutex = threading.Lock()
         self.__current_color = COLOR_VAL_MAP.get("white")
+        self.__cb_list = []   # called with the global state of every update (e.g. OnlineEvaluator)
 
     def start(self):
         #Starts the background feedback loop thread
@@ -36,7 +52,9 @@ class LedFeedbackRehab:
         #Outputs:none
         if not self.__started:
             self.__stop_event.clear()
-            self.__thread = threading.Thread(target=self.__run)
+            self.__wake.clear()
+            run = self.__run_events if self.__event_driven else self.__run
+            self.__thread = threading.Thread(target=run)
             self.__thread.start()
             self.__started = True
 
@@ -48,6 +66,7 @@ class LedFeedbackRehab:
         """
         if self.__started:
             self.__stop_event.set()
+            self.__wake.set()
             if self.__thread.is_alive():
                 self.__thread.join()
             self.__started = False
@@ -60,32 +79,38 @@ class LedFeedbackRehab:
     """
     def isStarted(self): return self.__started
 
+    def add_callback(self, cb):
+        #Registers cb(state) called after every classification (feedback thread); state: 0 idle, 1 good, 2 weak
+        #Inputs: cb (callable)
+        #Outputs: none
+        with self.__mutex:
+            self.__cb_list.append(cb)
+
+    def remove_callback(self, cb):
+        with self.__mutex:
+            if cb in self.__cb_list:
+                self.__cb_list.remove(cb)
+
     def __update(self):
         """
         Performs single update cycle, fetches the data, updates UI and sets LED state
         Inputs:none
         Outputs:none
         """
-        sc_data_list = self.__data_pub.sc_data()
-        if not sc_data_list: return
-
-        raw_data_dict = {}
-        max_f = 0.0
-        
-        for sc_data in sc_data_list:
-            cell_id = sc_data[0] 
-            d = data_tuple_to_data1200(sc_data)
-            f_val_cell = max(d.get("force", [0.0]))
-            if 1 <= cell_id <= 16:
-                raw_data_dict[cell_id] = {"force": f_val_cell}
-            
-            if f_val_cell > max_f: 
-                max_f = f_val_cell
+        if self.__frames is not None:
+            sc_ids, forces = self.__read_frame()
+        else:
+            sc_ids, forces = self.__read_cells()
+        if forces is None: return
 
         if self.bridge:
-            self.bridge.process_and_stream(raw_data_dict)
+            self.bridge.process_frame(sc_ids, forces.max(axis=1))
 
-        state = self.logic.classify(max_f)
+        if self.detector is not None:
+            result = self.detector.step(sc_ids, forces, time.monotonic())
+            self.cell_states, state = result["cell_states"], result["state"]
+        else:
+            self.cell_states, state = self.logic.classify_frame(forces, sc_ids)
         
         with self.__mutex:
             if state == 1: 
@@ -94,6 +119,34 @@ class LedFeedbackRehab:
                 self.__current_color = COLOR_VAL_MAP.get("red")
             else: 
                 self.__current_color = COLOR_VAL_MAP.get("white")
+            cb_list = list(self.__cb_list)
+
+        for cb in cb_list:
+            cb(state)
+
+    def __read_frame(self):
+        """
+        Takes the forces of the latest cycle-aligned frame
+        Inputs: none
+        Outputs: sc_ids (np.ndarray), forces (n_cells x 3); (None, None) without a frame
+        """
+        frame = self.__frames.latest()
+        if frame is None or len(frame["sc_ids"]) == 0: return None, None
+
+        return frame["sc_ids"], frame["values"][:, SENS_IND_FORCE1:SENS_IND_FORCE3+1]
+
+    def __read_cells(self):
+        """
+        Takes the latest sample of every cell from the data publisher
+        Inputs: none
+        Outputs: sc_ids (np.ndarray), forces (n_cells x 3); (None, None) without data
+        """
+        sc_data_list = list(self.__data_pub.sc_data())
+        if not sc_data_list: return None, None
+
+        sc_ids = np.array([sc_data[0] for sc_data in sc_data_list])
+        forces = np.array([sc_data[1][SENS_IND_FORCE1:SENS_IND_FORCE3+1] for sc_data in sc_data_list], dtype=float)
+        return sc_ids, forces
 
                 
     def __run(self):
@@ -107,4 +160,48 @@ class LedFeedbackRehab:
             with self.__mutex:
                 color = self.__current_color
             self.__led_ctrl.set_led_color_val(color)
-            time.sleep(0.04) # 25 Hz update rate
\ No newline at end of file
+            time.sleep(0.04) # 25 Hz update rate
+
+
+    def __on_data(self, _):
+        """
+        Frame / sample callback (publisher thread): only wakes the feedback thread, which coalesces bursts
+        Inputs: frame or sc_data (unused)
+        Outputs: none
+        """
+        self.__wake.set()
+
+    def __run_events(self):
+        """
+        Event-driven loop: sleeps until data arrives, classifies the newest data and writes the LEDs on change
+        Inputs: none
+        Outputs:none
+        """
+        source = self.__frames if self.__frames is not None else self.__data_pub
+        source.add_callback(self.__on_data)
+        last_color = None
+        t_last = 0.0
+        try:
+            while True:
+                self.__wake.wait()
+                if self.__stop_event.is_set(): break
+                self.__wake.clear()
+
+                self.__update()
+                with self.__mutex:
+                    color = self.__current_color
+                now = time.monotonic()
+                if color == last_color and now - t_last < LED_REFRESH_S: continue
+
+                t_wait = t_last + self.__min_led_interval - now
+                if t_wait > 0:
+                    # rate limited: re-classify the newest data once the interval passed
+                    if self.__stop_event.wait(t_wait): break
+                    self.__wake.set()
+                    continue
+
+                self.__led_ctrl.set_led_color_val(color)
+                last_color = color
+                t_last = time.monotonic()
+        finally:
+            source.remove_callback(self.__on_data)
@@ -3,7 +3,11 @@
 FILE: main_rehab.py
 PURPOSE: Main part. Initiliazes the hardware interface, the 3D visualiztation, rehabilitation logic, and manages
 user commands via a console-based loop
+Run modes: GUI (default), GUI in a separate process (--viz-process) or headless (--headless, feedback loop and
+console only). Qt, pyqtgraph and numpy-stl are only imported when a window is created. --record/--stream
+record or serve the frames, --commands/--duration script a session (e.g. soak tests)
 """
+import argparse
 import logging
 import sys
 import os
@@ -13,83 +17,267 @@ import time
 # path fix for SCN library
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from PyQt6.QtWidgets import QApplication
 from scn.hwi.hwi import HardwareInterface as Hwi
-from scn.ctrl.handler import LedControl, UdrControl, CfControl, IdControl, SensControl, EventsControl
+from scn.ctrl.handler import LedControl, UdrControl, UdrAuto, LedAnimator, CfControl, IdControl, SensControl, EventsControl, NeighListManager
+from scn.ctrl.layout import load_or_infer_layout
 from scn.sc.data_publisher import DataPublisher
+from scn.sc.frame_assembler import FrameAssembler
 from led_feedback import LedFeedbackRehab
-from visualizator_3d import Visualizator3D
+from event_detection import SpikingGripDetector
+from online_eval import OnlineEvaluator
 
-def console_loop(rehab_sys, hwi, data_pub, handlers):
+
+class RehabSession:
+    def __init__(self, hwi, data_pub, frames, rehab_sys, handlers, viz_proc=None, recorder=None, record_path=None,
+                 server=None):
+        """
+        Everything the console needs to run and to shut down a session
+        Inputs: hwi, data_pub, frames, rehab_sys, handlers, optional visualizer process, recorder (+ output path) and
+        stream server
+        Outputs: none
+        """
+        self.hwi = hwi
+        self.data_pub = data_pub
+        self.frames = frames
+        self.rehab_sys = rehab_sys
+        self.handlers = handlers
+        self.viz_proc = viz_proc
+        self.recorder = recorder
+        self.record_path = record_path
+        self.server = server
+        self.closed = threading.Event()     # set by shutdown()
+        self.__shutdown_mutex = threading.Lock()
+
+    def handle_command(self, cmd):
+        """
+        Executes one console command
+        Inputs: cmd (str)
+        Outputs: none
+        """
+        if cmd == "q":
+            print("Exiting...")
+            self.shutdown()
+        if cmd == "d":
+            self.rehab_sys.stop()
+            self.hwi.disconnect()
+            return
+        if cmd == "c":
+            self.data_pub.reset()
+            self.frames.reset()
+            self.hwi.connect()
+            return
+        if cmd == "start":
+            self.rehab_sys.start()
+            return
+        if cmd == "stop":
+            self.rehab_sys.stop()
+            return
+
+        #Command handler (handles 'store offsets', 'udr 63', etc.)
+        for h in self.handlers:
+            if h.handleCommand(cmd):
+                return
+        print(f"Unknown command: {cmd}")
+
+    def shutdown(self, exit_code=0):
+        """
+        Stops the feedback loop, saves the recording, closes hardware and helpers and exits the process
+        (console 'q', Ctrl+C, --duration or the closed main window; the cleanup runs once)
+        Inputs: exit_code (int)
+        Outputs: none
+        """
+        with self.__shutdown_mutex:
+            if not self.closed.is_set():
+                self.rehab_sys.stop()
+                if self.recorder is not None:
+                    self.recorder.stop()
+                    self.recorder.save(self.record_path)
+                if self.server is not None:
+                    self.server.stop()
+                self.hwi.close()
+                if self.viz_proc is not None:
+                    self.viz_proc.terminate()
+                    self.data_pub.disable_shm()
+                self.closed.set()
+        os._exit(exit_code)
+
+
+def console_loop(session, commands=None, duration=None):
     """
     Handles real-time user input from the terminal to control the system
-    Inputs: rehab_sys. hwi, data_pub and handlers
+    Scripted sessions first run the given commands; with a duration the session ends after it.
+    Without a console (stdin closed, e.g. started by a launcher or supervisor) the session keeps running until
+    'q', --duration, Ctrl+C or (GUI) the closed main window
+    Inputs: session (RehabSession), commands (list of str), duration (s)
     Outputs:none
     """
     print(">>> JACK THE GRIPPER: READY <<<")
     print("Sequence: c -> udr 63 -> store offsets -> start")
     print("To terminate the experiment, please enter: stop -> d -> q")
-    while True:
-        try:
-            cmd = input().strip()
+    if duration is not None:
+        timer = threading.Timer(duration, session.handle_command, args=("q",))
+        timer.daemon = True
+        timer.start()
+    try:
+        for cmd in commands or []:
+            print(f"> {cmd}")
+            session.handle_command(cmd)
+
+        while True:
+            try:
+                cmd = input().strip()
+            except EOFError:
+                print("Console input closed, the session keeps running.")
+                session.closed.wait()
+                return
             if not cmd: continue
-            if cmd == "q": 
-                print("Exiting...")
-                rehab_sys.stop()
-                hwi.close()     
-                os._exit(0)  
-            if cmd == "d":
-                rehab_sys.stop()
-                hwi.disconnect()
-                continue
-            if cmd == "c":
-                data_pub.reset()
-                hwi.connect()
-                continue
-            if cmd == "start":
-                rehab_sys.start()
-                continue
-            if cmd == "stop":
-                rehab_sys.stop()
-                continue
-
-            #Command handler (handles 'store offsets', 'udr 63', etc.)
-            handled = False
-            for h in handlers:
-                if h.handleCommand(cmd):
-                    handled = True
-                    break
-
-            if not handled:
-                print(f"Unknown command: {cmd}")
-        except KeyboardInterrupt:
-            rehab_sys.stop()
-            hwi.close()
-            os._exit(0)
+            session.handle_command(cmd)
+    except KeyboardInterrupt:
+        session.shutdown()
 
-if __name__ == '__main__':
-       
-    logging.basicConfig(level=logging.CRITICAL)
-
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    file_stl = os.path.join(base_dir, 'models', 'cylinder_5cm.STL')
-    
-    app = QApplication(sys.argv)
-    viz = Visualizator3D(file_stl)
-    viz.show()
 
+def start_hardware():
+    """
+    Opens the hardware interface and starts both readers
+    Inputs: none
+    Outputs: Hwi
+    """
     hwi = Hwi(Hwi.DefaultConfig())
     hwi.open()
     hwi.ctrl().reader().start()
     hwi.data().reader().start()
+    return hwi
+
+
+def create_window(file_stl):
+    """
+    Creates the Qt application and the 3D window (imports Qt only here)
+    Inputs: file_stl (str)
+    Outputs: app (QApplication), viz (Visualizator3D)
+    """
+    from PyQt6.QtWidgets import QApplication
+    from visualizator_3d import Visualizator3D
+    app = QApplication(sys.argv)
+    viz = Visualizator3D(file_stl)
+    viz.show()
+    return app, viz
 
+
+def build_session(hwi, args, viz=None):
+    """
+    Wires publishers, command handlers, feedback loop and the optional recorder / stream server
+    Inputs: hwi, args (parsed command line), viz (Visualizator3D or None)
+    Outputs: RehabSession
+    """
     data_pub = DataPublisher(hwi)
+    frames = FrameAssembler(data_pub)
     led_ctrl = LedControl(hwi)
-    handlers = [IdControl(hwi), SensControl(hwi), CfControl(hwi), 
-                UdrControl(hwi), led_ctrl, EventsControl(hwi)]
+    neigh_mgr = NeighListManager(hwi)
+    udr_ctrl = UdrControl(hwi)
+    udr_ctrl.add_callback(frames.set_rate)
+    # 'udr auto on [125]': pick the update rate from the decode load and the cells missing in the frames
+    udr_auto = UdrAuto(udr_ctrl)
+    udr_auto.watch_data_publisher(data_pub)
+    udr_auto.watch_frames(frames)
+    handlers = [IdControl(hwi), SensControl(hwi), CfControl(hwi),
+                udr_ctrl, udr_auto, led_ctrl, LedAnimator(led_ctrl), EventsControl(hwi), neigh_mgr]
+
+    rehab_sys = LedFeedbackRehab(hwi, data_pub, led_ctrl, visualizer=viz, frames=frames,
+                                 event_driven=not args.polling, min_led_interval=args.min_led_interval,
+                                 detector=SpikingGripDetector() if args.spiking else None)
+    # 'trial above|below' after each trial: running accuracy/kappa of the live decisions
+    evaluator = OnlineEvaluator()
+    evaluator.watch(rehab_sys)
+    handlers.append(evaluator)
+
+    layout_mutex = threading.Lock()
+
+    def apply_layout():
+        # infer (or load the cached) cell layout of the manager's topology and use it for the zones and the
+        # 3D mapping, the spiking detector takes the neighborhood for its coincidence test
+        with layout_mutex:
+            topology = neigh_mgr.topology()
+            layout = load_or_infer_layout(topology)
+            if rehab_sys.detector is not None:
+                rehab_sys.detector.set_topology(topology)
+            if rehab_sys.bridge:
+                rehab_sys.bridge.set_layout(layout)
+
+    def on_neighbors(sc_neighs):
+        # 'neighs get', ctrl reader thread with the manager mutex held: the layout work runs on its own thread
+        threading.Thread(target=apply_layout, name="layout", daemon=True).start()
+    neigh_mgr.add_callback(on_neighbors)
+
+    recorder = None
+    if args.record:
+        from scn.sc.recorder import Recorder
+        recorder = Recorder(frames)
+        recorder.start()
 
-    rehab_sys = LedFeedbackRehab(hwi, data_pub, led_ctrl, visualizer=viz)
+    server = None
+    if args.stream:
+        from scn.sc.stream_server import StreamServer
+        config = StreamServer.DefaultConfig()
+        config["address"] = args.stream
+        server = StreamServer(config, data_pub)
+        server.start()
+
+    return RehabSession(hwi, data_pub, frames, rehab_sys, handlers, recorder=recorder, record_path=args.record,
+                        server=server)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    parser = argparse.ArgumentParser(description="Jack the Gripper rehabilitation handle")
+    parser.add_argument("--headless", action="store_true",
+                        help="no GUI: feedback loop and console only")
+    parser.add_argument("--viz-process", action="store_true",
+                        help="run the 3D visualizer in a separate process fed through shared memory")
+    parser.add_argument("--polling", action="store_true",
+                        help="classify at a fixed 25 Hz instead of on every new frame")
+    parser.add_argument("--min-led-interval", type=float, default=0.0,
+                        help="minimum time in seconds between two LED writes (event-driven mode)")
+    parser.add_argument("--spiking", action="store_true",
+                        help="detect the grip quality with the spiking (LIF) detector instead of force thresholds")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record all frames and save them to FILE (.npz) on exit")
+    parser.add_argument("--stream", metavar="ADDRESS",
+                        help="serve the decoded data to local clients, e.g. tcp:127.0.0.1:17100 or unix:/tmp/scn.sock")
+    parser.add_argument("--commands", default="",
+                        help="console commands to run at startup, separated by ';' (e.g. \"c;udr 63;start\")")
+    parser.add_argument("--duration", type=float,
+                        help="quit after this many seconds (scripted sessions, soak tests)")
+    args = parser.parse_args()
+    commands = [c.strip() for c in args.commands.split(";") if c.strip()]
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    file_stl = os.path.join(base_dir, 'models', 'cylinder_5cm.STL')
 
-    threading.Thread(target=console_loop, args=(rehab_sys, hwi, data_pub, handlers), daemon=True).start()
+    if args.headless or args.viz_process:
+        session = build_session(start_hardware(), args)
+        if args.viz_process:
+            # GUI in its own process, this process only runs the readers, feedback loop and console
+            from viz_process import start_visualizer_process
+            session.viz_proc = start_visualizer_process(session.data_pub.enable_shm(), file_stl)
+        console_loop(session, commands, args.duration)
+    else:
+        # the hardware comes up while the window is created (Qt has to stay in the main thread)
+        hw = {}
 
-    sys.exit(app.exec())
+        def hw_start():
+            try:
+                hw["hwi"] = start_hardware()
+            except Exception as e:
+                hw["error"] = e
+        hw_thread = threading.Thread(target=hw_start)
+        hw_thread.start()
+        app, viz = create_window(file_stl)
+        hw_thread.join()
+        if "error" in hw:
+            raise hw["error"]
+        session = build_session(hw["hwi"], args, viz)
+        threading.Thread(target=console_loop, args=(session, commands, args.duration), daemon=True).start()
+        # closing the window ends the session like 'q' (recording saved, server and hardware closed)
+        session.shutdown(app.exec())
@@ -0,0 +1,165 @@
+"""
+FILE: online_eval.py
+Purpose: Streaming evaluation of the grip classification during a session
+The device decision of a trial is the best feedback state reached since the trial started (GOOD -> Above,
+otherwise Below); the therapist enters the ground truth on the console after each trial. Every trial only
+increments one cell of the confusion matrix, the metrics are computed from the four counts with the same
+formulas as the offline validation (scn.confusion_metrics.metrics_from_counts)
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scn.confusion_metrics import METRICS, metrics_from_counts
+from scn.icommand_handler import ICommandHandler, descr_entry
+from event_detection import GOOD
+
+# console labels of the ground truth ('max' counts as above, as in the validation sheets)
+LABELS = {"above": "Above", "below": "Below", "max": "Above"}
+
+class OnlineEvaluator(ICommandHandler):
+
+    @property
+    def logger(self):
+        return logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+    def __init__(self, positive="Below"):
+        """
+        Initializes an empty confusion matrix
+        Inputs: positive (clinically critical class, as in grip_analysis.compute_metrics)
+        """
+        self.positive = positive
+        self.__mutex = threading.Lock()
+        self.__trial_state = 0   # best feedback state since the trial started
+        self.__trial_t0 = time.monotonic()
+        self.__clear()
+
+    def __clear(self):
+        self.__counts = {"TP": 0, "FP": 0, "TN": 0, "FN": 0}
+        self.__trials = []   # (t, ground truth, device output), for undo
+
+    def watch(self, rehab_sys):
+        #Takes the live decisions of a LedFeedbackRehab
+        rehab_sys.add_callback(self.on_state)
+
+    def unwatch(self, rehab_sys):
+        rehab_sys.remove_callback(self.on_state)
+
+    def on_state(self, state):
+        #Feedback thread: remembers whether GOOD was reached in the current trial (under the mutex, so a state
+        #arriving while a trial is closed counts either for the closed or for the next trial, never for both/none)
+        if state == GOOD:
+            with self.__mutex:
+                self.__trial_state = GOOD
+
+    def start_trial(self):
+        with self.__mutex:
+            self.__trial_state = 0
+            self.__trial_t0 = time.monotonic()
+
+    def device_output(self):
+        #Device decision of the running trial
+        with self.__mutex:
+            return self.__decision()
+
+    def __decision(self):
+        # mutex held
+        return "Above" if self.__trial_state == GOOD else "Below"
+
+    def __cell(self, gt, pred):
+        if gt == self.positive:
+            return "TP" if pred == self.positive else "FN"
+        return "FP" if pred == self.positive else "TN"
+
+    def add_trial(self, gt, pred=None):
+        """
+        Closes the running trial: one increment of the confusion matrix, then the next trial starts
+        Inputs: gt ('Above'/'Below'), pred (device output, default: decision of the running trial)
+        Outputs: the device output used
+        """
+        with self.__mutex:
+            if pred is None:
+                pred = self.__decision()
+            self.__counts[self.__cell(gt, pred)] += 1
+            self.__trials.append((time.monotonic() - self.__trial_t0, gt, pred))
+            self.__trial_state = 0
+            self.__trial_t0 = time.monotonic()
+        return pred
+
+    def undo(self):
+        #Removes the last trial, returns False if there is none
+        with self.__mutex:
+            if not self.__trials:
+                return False
+            _, gt, pred = self.__trials.pop()
+            self.__counts[self.__cell(gt, pred)] -= 1
+            return True
+
+    def reset(self):
+        with self.__mutex:
+            self.__clear()
+            self.__trial_state = 0
+            self.__trial_t0 = time.monotonic()
+
+    def metrics(self):
+        """
+        Running metrics in the format of grip_analysis.compute_metrics (N, TP, FP, TN, FN and the metrics)
+        """
+        with self.__mutex:
+            tp, fp, tn, fn = (self.__counts[k] for k in ("TP", "FP", "TN", "FN"))
+        values = metrics_from_counts(tp, fp, tn, fn)
+        metrics = {"N": tp + tn + fp + fn, "TP": tp, "FP": fp, "TN": tn, "FN": fn}
+        for name in METRICS:
+            label = "Sensitivity_(pos={})".format(self.positive) if name == "Sensitivity" else name
+            metrics[label] = float(values[name])
+        return metrics
+
+    def summary(self):
+        m = self.metrics()
+        lines = ["N={N}  TP={TP}  FP={FP}  TN={TN}  FN={FN}".format(**m)]
+        lines += [f"{k:<24}{v:.3f}" for k, v in m.items() if isinstance(v, float)]
+        return "\n".join(lines)
+
+    def handleCommand(self, cmd : str) -> bool:
+        cmd_parts = cmd.split()
+        cmd_len = len(cmd_parts)
+
+        if cmd_len == 2 and cmd_parts[0] == "trial":
+            arg = cmd_parts[1].lower()
+            if arg == "start":
+                self.start_trial()
+                return True
+            if arg == "undo":
+                if not self.undo():
+                    print("no trial to undo")
+                return True
+            if arg in LABELS:
+                gt = LABELS[arg]
+                pred = self.add_trial(gt)
+                m = self.metrics()
+                print(f"trial {m['N']}: truth {gt}, device {pred} -> accuracy {m['Accuracy']:.3f}, "
+                      f"kappa {m['Cohens_Kappa']:.3f}")
+                return True
+            return False
+
+        if cmd == "eval show":
+            print(self.summary())
+            return True
+
+        if cmd == "eval reset":
+            self.reset()
+            return True
+
+        return False
+
+    def commandDescription(self, col_width : int = 30) -> str:
+        descr = str() \
+            + descr_entry("trial start",                  "Start a trial (forget the decisions so far).", col_width) \
+            + descr_entry("trial <above | below | max>",  "Ground truth of the trial, scores the device decision.", col_width) \
+            + descr_entry("trial undo",                   "Remove the last scored trial.", col_width) \
+            + descr_entry("eval <show | reset>",          "Print/Reset the running accuracy and kappa.", col_width)
+        return descr
@@ -0,0 +1,262 @@
+"""
+FILE: plot_engine.py
+PURPOSE: Performance chart backend for long histories (a whole session). Samples of all channels (16 cells, zones,
+average) go into a preallocated NumPy ring buffer together with min/max summaries of fixed blocks of samples.
+Only the visible time range is drawn, decimated to min/max pairs per pixel column (raw samples for close views,
+block summaries for wide ones), so the cost of a redraw depends on the widget width, not on the session length
+"""
+import time
+
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore
+
+BLOCK = 64   # samples per min/max summary block
+
+
+def minmax_decimate(t, y, n_bins):
+    """
+    Reduces the samples to one min and one max per bin (peaks stay visible)
+    Inputs: t (n), y (n x channels), n_bins (int)
+    Outputs: x (2*n_bins), y (2*n_bins x channels), or the input if it is already small enough
+    """
+    n = len(t)
+    if n <= 2*n_bins:
+        return t, y
+    edges = np.linspace(0, n, n_bins+1).astype(np.int64)[:-1]
+    y_min = np.minimum.reduceat(y, edges, axis=0)
+    y_max = np.maximum.reduceat(y, edges, axis=0)
+    x = np.empty(2*n_bins)
+    x[0::2] = t[edges]
+    x[1::2] = t[np.append(edges[1:], n)-1]
+    out = np.empty((2*n_bins, y.shape[1]), dtype=y.dtype)
+    out[0::2] = y_min
+    out[1::2] = y_max
+    return x, out
+
+
+class HistoryBuffer:
+    def __init__(self, n_channels, capacity):
+        """
+        Ring buffer of (t, values) rows; every row is written twice (at i and i+capacity), so the newest
+        'capacity' rows are always one contiguous view without copying. Completed blocks of BLOCK rows keep
+        their min/max in a second ring of the same kind
+        Inputs: n_channels (int), capacity (rows, rounded up to a multiple of BLOCK)
+        Outputs: none
+        """
+        capacity = -(-capacity//BLOCK)*BLOCK
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self.__t = np.zeros(2*capacity)
+        self.__v = np.zeros((2*capacity, n_channels), dtype=np.float32)
+        n_blocks = capacity//BLOCK
+        self.__n_blocks = n_blocks
+        self.__bt = np.zeros(2*n_blocks)          # time of the first sample of the block
+        self.__bt_end = np.zeros(2*n_blocks)      # time of the last sample of the block
+        self.__bmin = np.zeros((2*n_blocks, n_channels), dtype=np.float32)
+        self.__bmax = np.zeros((2*n_blocks, n_channels), dtype=np.float32)
+        self.__count = 0
+
+    def __len__(self):
+        return min(self.__count, self.capacity)
+
+    def clear(self):
+        self.__count = 0
+
+    def append(self, t, values):
+        """
+        Inputs: t (float), values (n_channels)
+        Outputs: None
+        """
+        i = self.__count % self.capacity
+        self.__t[i] = self.__t[i+self.capacity] = t
+        self.__v[i] = self.__v[i+self.capacity] = values
+        self.__count += 1
+        if self.__count % BLOCK == 0:
+            # block complete: summarize it (BLOCK rows, contiguous since capacity is a multiple of BLOCK)
+            b = (self.__count//BLOCK-1) % self.__n_blocks
+            rows = slice(i+1-BLOCK, i+1)
+            for k in (b, b+self.__n_blocks):
+                self.__bt[k] = self.__t[rows.start]
+                self.__bt_end[k] = t
+                self.__bmin[k] = self.__v[rows].min(axis=0)
+                self.__bmax[k] = self.__v[rows].max(axis=0)
+
+    def last_t(self):
+        if self.__count == 0:
+            return None
+        return self.__t[(self.__count-1) % self.capacity]
+
+    def first_t(self):
+        if self.__count == 0:
+            return None
+        return self.__t[max(0, self.__count-self.capacity) % self.capacity]
+
+    def samples(self):
+        """
+        The stored rows, oldest first (views into the buffer)
+        Inputs: none
+        Outputs: t (n), values (n x channels)
+        """
+        n = len(self)
+        start = (self.__count-n) % self.capacity
+        return self.__t[start:start+n], self.__v[start:start+n]
+
+    def blocks(self):
+        """
+        Min/max summaries of the complete blocks still in the buffer, oldest first (views)
+        Inputs: none
+        Outputs: t_first (n), t_last (n), minimum (n x channels), maximum (n x channels)
+        """
+        done = self.__count//BLOCK
+        n = min(done, self.__n_blocks)
+        start = (done-n) % self.__n_blocks
+        sl = slice(start, start+n)
+        return self.__bt[sl], self.__bt_end[sl], self.__bmin[sl], self.__bmax[sl]
+
+    def window(self, t0, t1, n_px):
+        """
+        Decimated rows between t0 and t1 for a plot n_px pixels wide
+        Inputs: t0, t1 (float), n_px (int)
+        Outputs: x (m), y (m x channels)
+        """
+        t, v = self.samples()
+        i0, i1 = np.searchsorted(t, (t0, t1))
+        i0, i1 = max(i0-1, 0), min(i1+1, len(t))
+        n_px = max(int(n_px), 1)
+        if i1-i0 < BLOCK*n_px:
+            return minmax_decimate(t[i0:i1], v[i0:i1], n_px)
+
+        # wide view: decimate the block summaries instead of the raw samples
+        bt, bt_end, bmin, bmax = self.blocks()
+        j0, j1 = np.searchsorted(bt, (t0, t1))
+        j0, j1 = max(j0-1, 0), min(j1+1, len(bt))
+        x = np.empty(2*(j1-j0))
+        x[0::2] = bt[j0:j1]
+        x[1::2] = bt_end[j0:j1]
+        y = np.empty((2*(j1-j0), self.n_channels), dtype=np.float32)
+        y[0::2] = bmin[j0:j1]
+        y[1::2] = bmax[j0:j1]
+        # the samples after the last complete block
+        tail = t[:i1] if j1 == 0 else t[:i1][t[:i1] > bt_end[j1-1]]
+        if len(tail):
+            x = np.concatenate((x, tail))
+            y = np.concatenate((y, v[i1-len(tail):i1]))
+        bins = n_px
+        if len(x) <= 2*bins:
+            return x, y
+        # pairs stay pairs: reduce min and max separately
+        edges = np.linspace(0, len(x)//2, bins+1).astype(np.int64)[:-1]*2
+        out_x = np.empty(2*bins)
+        out_x[0::2] = x[edges]
+        out_x[1::2] = x[np.append(edges[1:], len(x))-1]
+        out_y = np.empty((2*bins, self.n_channels), dtype=np.float32)
+        out_y[0::2] = np.minimum.reduceat(y, edges, axis=0)
+        out_y[1::2] = np.maximum.reduceat(y, edges, axis=0)
+        return out_x, out_y
+
+
+class PerformancePlot:
+    #Draws the history of the average, the zones and (optionally) every cell into a pyqtgraph PlotWidget.
+    #The chart follows the newest samples ('window_s' seconds) until the user pans or zooms; panning back to the
+    #newest sample follows again. Redraws at most max_hz times per second and only the visible range
+    #INPUTS: plot_widget (pg.PlotWidget), zones (dict name -> list of cell indexes 0..15), window_s, capacity_s, rate_hz
+    #OUTPUTS: None
+    ZONE_PENS = {"left": (255, 140, 0), "center": (0, 200, 255), "right": (200, 0, 255)}
+
+    def __init__(self, plot_widget, zones, window_s=10.0, capacity_s=2400.0, rate_hz=60, max_hz=20):
+        self.plot_widget = plot_widget
+        self.view = plot_widget.getViewBox()
+        self.window_s = window_s
+        self.min_interval = 1.0/max_hz
+        self.n_cells = 16
+        self.set_zones(zones)
+        # channels: average, left, center, right, cell 1..16
+        self.buffer = HistoryBuffer(4+self.n_cells, int(capacity_s*rate_hz))
+        self.t_start = None
+        self.follow = True
+        self.dirty = False
+        self.last_draw = 0.0
+        self.scheduled = False
+        self.cells_visible = False
+
+        self.curves = [plot_widget.plot(pen=pg.mkPen('w', width=2))]
+        for name in ("left", "center", "right"):
+            self.curves.append(plot_widget.plot(pen=pg.mkPen(self.ZONE_PENS[name], width=1)))
+        for _ in range(self.n_cells):
+            curve = plot_widget.plot(pen=pg.mkPen((120, 120, 120), width=1))
+            curve.setVisible(False)
+            self.curves.append(curve)
+        self.view.sigRangeChangedManually.connect(self.on_manual_range)
+        self.view.sigXRangeChanged.connect(lambda *_: self.request_draw())
+
+    def set_zones(self, zones):
+        #INPUTS: zones (dict name -> list of cell indexes)
+        #OUTPUTS: None
+        self.weights = np.zeros((3, self.n_cells), dtype=np.float32)
+        for k, name in enumerate(("left", "center", "right")):
+            inds = list(zones.get(name, []))
+            if inds:
+                self.weights[k, inds] = 1.0/len(inds)
+
+    def show_cells(self, visible):
+        #INPUTS: visible (bool)
+        #OUTPUTS: None
+        self.cells_visible = visible
+        for curve in self.curves[4:]:
+            curve.setVisible(visible)
+        self.request_draw(force=True)
+
+    def append(self, data_vector, t=None):
+        #Stores one 16-cell intensity vector (average and zone means are derived here)
+        #INPUTS: data_vector (16), t (time.monotonic() by default)
+        #OUTPUTS: None
+        t = time.monotonic() if t is None else t
+        if self.t_start is None:
+            self.t_start = t
+        v = np.asarray(data_vector, dtype=np.float32)
+        row = np.empty(4+self.n_cells, dtype=np.float32)
+        row[0] = v.mean()
+        row[1:4] = self.weights @ v
+        row[4:] = v
+        self.buffer.append(t-self.t_start, row)
+        self.request_draw()
+
+    def on_manual_range(self, *args):
+        #user pans/zooms: stop following unless the view still reaches the newest sample
+        last = self.buffer.last_t()
+        x1 = self.view.viewRange()[0][1]
+        self.follow = last is None or x1 >= last
+        self.request_draw(force=True)
+
+    def request_draw(self, force=False):
+        #draws now or, if the last draw is too recent, once at the end of the interval
+        self.dirty = True
+        wait = self.last_draw+self.min_interval-time.monotonic()
+        if force or wait <= 0:
+            self.draw()
+        elif not self.scheduled:
+            self.scheduled = True
+            QtCore.QTimer.singleShot(int(wait*1000)+1, self.draw)
+
+    def draw(self):
+        #Redraws the visible range, decimated to the widget width
+        #INPUTS: None
+        #OUTPUTS: None
+        self.scheduled = False
+        if not self.dirty or len(self.buffer) == 0:
+            return
+        self.dirty = False
+        self.last_draw = time.monotonic()
+        last = self.buffer.last_t()
+        if self.follow:
+            t0 = max(self.buffer.first_t(), last-self.window_s)
+            self.view.blockSignals(True)
+            self.view.setXRange(t0, max(last, t0+self.window_s), padding=0)
+            self.view.blockSignals(False)
+        t0, t1 = self.view.viewRange()[0]
+        n_px = self.view.width() or 800
+        x, y = self.buffer.window(t0, t1, n_px)
+        n_curves = len(self.curves) if self.cells_visible else 4
+        for k in range(n_curves):
+            self.curves[k].setData(x, y[:, k])
@@ -1,11 +1,18 @@
-""" 
+"""
 FILE:ui_bridge.py
 Purpose: Acts as a bridge between the data acquisition and the 3D visualization interfac
 Maps raw sensor data ino clinical zones and streams intensity vector for real-time tracking
+The intensity vector is a preallocated array updated in place; the GUI is only notified when it does not
+already have a notification pending and pulls the latest vector itself (at most once per display refresh),
+so stale frames never queue up in the Qt event loop
 """
+import threading
 
 import numpy as np
 
+N_CELLS = 16
+
+
 class UIBridge:
     def __init__(self,visualizer_window):
         """
@@ -14,8 +21,24 @@ class UIBridge:
         Outputs: none
         """
         self.gui=visualizer_window
-        self.zones={"left":range(0,5),"center":range(5,11),"right":range(11,16)}
         self.THRESHOLD_GREEN=0.34
+        self.zones={"left":range(0,5),"center":range(5,11),"right":range(11,16)}
+        self.__intensity = np.zeros(N_CELLS)
+        self.__mutex = threading.Lock()
+        self.__dirty = False
+        self.__pending = False
+        if hasattr(self.gui, "set_frame_source"):
+            self.gui.set_frame_source(self.take_latest)
+
+    @property
+    def zones(self):
+        return self.__zones
+
+    @zones.setter
+    def zones(self, zones):
+        # index arrays for the vectorized zone aggregates
+        self.__zones = zones
+        self.__zone_inds = {name: np.asarray(list(inds), dtype=np.int64) for name, inds in zones.items()}
 
     def process_and_stream(self, raw_scn_data):
         """
@@ -23,23 +46,68 @@ class UIBridge:
         Inputs: raw_scn_data(dict)
         Outputs: None
         """
-        intensity_vector=[0.0]*16
-        #Iterating through cell IDs 1-16
-        for cell_id,data in raw_scn_data.items():
-            raw_val=data.get('force',0)
-            normalized=np.clip(raw_val/self.THRESHOLD_GREEN,0,1)
-            if 1<=cell_id <=16:
-                intensity_vector[cell_id-1]=normalized
-        self.gui.comm.data_signal.emit(intensity_vector)
-    
-    def get_zone_averages(self,intensity_vector):
+        sc_ids = np.fromiter(raw_scn_data.keys(), dtype=np.int64, count=len(raw_scn_data))
+        forces = np.fromiter((data.get('force', 0) for data in raw_scn_data.values()), dtype=float, count=len(raw_scn_data))
+        self.process_frame(sc_ids, forces)
+
+    def process_frame(self, sc_ids, forces):
+        """
+        Vectorized variant of process_and_stream: normalizes the forces of all cells at once
+        Inputs: sc_ids (array of cell IDs), forces (array, one value per cell)
+        Outputs: None
+        """
+        sc_ids = np.asarray(sc_ids)
+        valid = (sc_ids >= 1) & (sc_ids <= N_CELLS)
+        with self.__mutex:
+            self.__intensity[:] = 0.0
+            self.__intensity[sc_ids[valid]-1] = np.asarray(forces)[valid]
+            self.__intensity /= self.THRESHOLD_GREEN
+            np.clip(self.__intensity, 0, 1, out=self.__intensity)
+            self.__dirty = True
+            if self.__pending:
+                return
+            self.__pending = True
+        self.gui.comm.frame_signal.emit()
+
+    def take_latest(self):
+        """
+        Called by the GUI after a notification: the latest intensity vector, None if nothing changed
+        Inputs: none
+        Outputs: np.ndarray (16) or None
+        """
+        with self.__mutex:
+            self.__pending = False
+            if not self.__dirty:
+                return None
+            self.__dirty = False
+            return self.__intensity.copy()
+
+    def set_layout(self, layout):
+        """
+        Replaces the fixed zone index ranges by zones derived from the inferred cell layout
+        (left/center/right thirds along the handle) and forwards the layout to the visualizer
+        Inputs: layout (scn.ctrl.layout.Layout)
+        Outputs: None
+        """
+        names = ("left", "center", "right")
+        self.zones = {name: [int(i)-1 for i in ids if 1 <= i <= N_CELLS]
+                      for name, ids in zip(names, layout.zones(len(names)))}
+        if hasattr(self.gui, "comm"):
+            self.gui.comm.layout_signal.emit(layout)
+
+    def get_zone_averages(self,intensity_vector=None):
         """
         Calculates average pressure for each clinical zone from the intensity vector
-        Iputus: intensity vector (list)
+        Iputus: intensity vector (list or array, default: the latest one)
         Output: dict containaing mean values of each zone (Left,right, center)
         """
+        if intensity_vector is None:
+            with self.__mutex:
+                intensity_vector = self.__intensity.copy()
+        v = np.asarray(intensity_vector, dtype=float)
+        means = {name: float(v[inds].mean()) if len(inds) else 0.0 for name, inds in self.__zone_inds.items()}
         return{
-            "Left_Side":np.mean([intensity_vector[i] for i in self.zones["left"]]),
-            "Center":np.mean([intensity_vector[i] for i in self.zones["center"]]),
-            "Right_side":np.mean([intensity_vector[i] for i in self.zones["right"]])
+            "Left_Side":means["left"],
+            "Center":means["center"],
+            "Right_side":means["right"]
         }
@@ -10,18 +10,98 @@ from PyQt6.QtCore import QTimer, pyqtSignal, QObject, Qt
 import pyqtgraph.opengl as gl
 import pyqtgraph as pg
 from PyQt6.QtGui import QVector3D
-from stl import mesh
 import numpy as np
 import time
+from geometry_cache import load_geometry, GRID_PARAMS, map_weights, surface_values
+from plot_engine import PerformancePlot
+try:
+    from pyqtgraph.opengl.items.GLMeshItem import DirtyFlag
+except ImportError:
+    DirtyFlag=None
 class DataComm(QObject):
     #Facilitates thread-safe communication of sensor data
     data_signal=pyqtSignal(list)
+    layout_signal=pyqtSignal(object)
+    frame_signal=pyqtSignal()   #new frame available, pulled through the frame source
+
+class SensorMesh(gl.GLMeshItem):
+    #Mesh of all sensor nodes; set_node_colors only re-uploads the color buffer (pyqtgraph >= 0.14),
+    #older pyqtgraph versions fall back to a full mesh update
+
+    def __init__(self,**kwds):
+        super().__init__(**kwds)
+        self.face_colors=None     #n_nodes x (faces_per_node*3) x 4, kept between updates
+        self.colors_dirty=False
+
+    def set_node_colors(self,node_colors,faces_per_node,nodes=None):
+        #Writes the colors of the given nodes (all by default) into the vertex color buffer
+        #INPUTS: node_colors (n_nodes x 4 RGBA), faces_per_node (int), nodes (array of node indexes or None)
+        #OUTPUTS: None
+        if self.face_colors is None or nodes is None:
+            self.face_colors=np.repeat(np.asarray(node_colors,dtype=np.float32)[:,None,:],faces_per_node*3,axis=1)
+        else:
+            self.face_colors[nodes]=np.asarray(node_colors,dtype=np.float32)[nodes][:,None,:]
+        if DirtyFlag is None:
+            self.opts['meshdata'].setFaceColors(self.face_colors[:,::3,:].reshape(-1,4))
+            self.meshDataChanged()
+            return
+        self.colors_dirty=True
+        self.update()
+
+    def parseMeshData(self):
+        dirty_bits=super().parseMeshData()
+        if self.colors_dirty:
+            self.colors=self.face_colors.reshape(-1,3,4)
+            self.colors_dirty=False
+            dirty_bits|=DirtyFlag.COLOR
+        return dirty_bits
+
+class HeatmapMesh(gl.GLMeshItem):
+    #Handle surface colored per vertex; set_vertex_colors only re-uploads the color buffer (pyqtgraph >= 0.14)
+
+    def __init__(self,**kwds):
+        super().__init__(**kwds)
+        self.vertex_colors=None
+
+    def set_vertex_colors(self,colors):
+        #INPUTS: colors (n_vertexes x 4 RGBA float32)
+        #OUTPUTS: None
+        if DirtyFlag is None:
+            self.opts['meshdata'].setVertexColors(colors)
+            self.meshDataChanged()
+            return
+        self.vertex_colors=colors
+        self.update()
+
+    def parseMeshData(self):
+        dirty_bits=super().parseMeshData()
+        if self.vertex_colors is not None:
+            self.colors=self.vertex_colors
+            self.vertex_colors=None
+            dirty_bits|=DirtyFlag.COLOR
+        return dirty_bits
 
 class Visualizator3D(QMainWindow):
     #Initialize the GUI window, 3D engine, set up camera, load the handle model and performance chart
-    #INPUTS: file_stl (str)
+    #Rendering: incoming vectors only mark the view dirty, a QTimer renders at most refresh_hz times per second
+    #and stops while nothing new arrives. Only the nodes whose cell color changed and the label on a state change
+    #are touched
+    #heatmap: the handle surface shows a continuous pressure map interpolated from the cells (one sparse mat-vec
+    #per rendered frame, weights precomputed in geometry_cache), otherwise it is shaded by its normals
+    #INPUTS: file_stl (str), refresh_hz (int), heatmap (bool)
     #OUTPUTS: None 
-    def __init__(self, file_stl):
+    SURFACE_COLOR=np.array([0.85,0.85,0.85,1.0],dtype=np.float32)
+    PRESSURE_COLOR=np.array([0.0,0.0,0.8,1.0],dtype=np.float32)
+    THRESHOLD=0.33
+    WEAK_THRESHOLD=0.05
+    COLOR_LEVELS=255     #node colors are quantized, changes below one level are not redrawn
+    #feedback label: text and prebuilt stylesheet per state (stylesheets are only parsed on a state change)
+    LABEL_STYLES={
+        "idle":("PLEASE GRIP","font-size: 30px; font-weight: bold; color: #FFFFFF; background-color: black; padding: 10px; border: none;"),
+        "good":("GOOD JOB!","font-size: 32px; font-weight: bold; color: #00FF00; background-color: black; padding: 10px; border: none;"),
+        "weak":("Grip stronger","font-size: 30px; font-weight: bold; color: #FF4444; background-color: black; padding: 10px; border: none;"),
+    }
+    def __init__(self, file_stl, refresh_hz=60, heatmap=True):
         super().__init__()
         self.setWindowTitle("3D HOMUNCULUS")
         self.resize(1024,768)
@@ -51,10 +131,19 @@ class Visualizator3D(QMainWindow):
         self.target_line = pg.InfiniteLine(pos=0.34, angle=0, pen=pg.mkPen('y', width=2, style=Qt.PenStyle.DashLine))
         self.plot_widget.addItem(self.target_line)
 
-        self.data_history=[]
-        self.curve=self.plot_widget.plot(pen=pg.mkPen('w', width=2))
+        #whole-session history (average, zones, cells), drawn decimated to the widget width
+        self.performance=PerformancePlot(self.plot_widget,{"left":range(0,5),"center":range(5,11),"right":range(11,16)})
 
-        self.sensor_nodes=[]
+        self.node_cell=np.zeros(0,dtype=np.int64)
+        self.node_uv=np.zeros((0,2))
+        self.frame_source=None
+        self.heat=None                #sparse interpolation cells -> surface vertexes (rows, cols, weights)
+        self.target=None              #vector received through data_signal, not yet rendered
+        self.label_state=None         #last rendered label state
+        self.rendered_cells=None      #last rendered cell colors (16 x 4), None forces a full recolor
+        self.render_timer=QTimer(self)
+        self.render_timer.setInterval(max(1,int(1000/refresh_hz)))
+        self.render_timer.timeout.connect(self.render)
         """
         #axes representation
         axes=gl.GLAxisItem()
@@ -71,17 +160,30 @@ class Visualizator3D(QMainWindow):
         #Load Geometry 
         try:
 
-            my_mesh=mesh.Mesh.from_file(file_stl)
-            points=my_mesh.points.reshape(-1,3)
-            faces=np.arange(len(points)).reshape(-1,3)
-            self.mesh_item=gl.GLMeshItem(vertexes=points, faces=faces, smooth=True,color=(0.85,0.85,0.85,1.0),shader='normalColor')
-            self.mesh_item.rotate(90,0,0,1)
-            self.mesh_item.rotate(-90,0,1,0)
+            #indexed mesh, normals and node geometry come from the cache after the first start
+            geo=load_geometry(file_stl)
+            if heatmap:
+                #refined surface, fine enough to carry the color gradient
+                md=gl.MeshData(vertexes=geo["heat_vertexes"],faces=geo["heat_faces"])
+                md._vertexNormals=geo["heat_normals"]  #precomputed, MeshData would loop over every vertex in Python
+                self.heat_nodes=(geo["heat_rows"],geo["heat_nodes"],geo["heat_weights"])
+                self.heat=map_weights(*self.heat_nodes,geo["node_cell"])
+                self.heat_colors=np.tile(self.SURFACE_COLOR,(len(geo["heat_vertexes"]),1))
+                md.setVertexColors(self.heat_colors)
+                self.mesh_item=HeatmapMesh(meshdata=md, smooth=True,shader='shaded')
+            else:
+                md=gl.MeshData(vertexes=geo["stl_vertexes"],faces=geo["stl_faces"])
+                md._vertexNormals=geo["stl_normals"]
+                self.mesh_item=gl.GLMeshItem(meshdata=md, smooth=True,color=(0.85,0.85,0.85,1.0),shader='normalColor')
+            for rotation in GRID_PARAMS["stl_rotations"]:
+                self.mesh_item.rotate(*rotation)
             self.viewer.addItem(self.mesh_item)
 
             self.comm = DataComm()
             self.comm.data_signal.connect(self.update_with_real_data)
-            self.create_sensor_grid()
+            self.comm.layout_signal.connect(self.set_layout)
+            self.comm.frame_signal.connect(self.pull_frame)
+            self.create_sensor_grid(geo)
             self.timer=QTimer()
             #self.timer.timeout.connect(self.run_dummy_stimulation)
             #self.timer.start(100)
@@ -89,98 +191,126 @@ class Visualizator3D(QMainWindow):
             print(f"Error loading STL: {e}")
     
    
-    def create_sensor_grid(self):
-         #Generates hexagones and maps them to 16 physical regions
-        #INPUTS:None
+    def create_sensor_grid(self,geo):
+         #Adds the hexagon nodes (16 physical regions) as one merged mesh from the cached geometry (one draw call);
+         #node_cell maps every hexagon to its cell ID
+        #INPUTS:geo (dict, geometry_cache.load_geometry)
         #OUTPUTS:None
-        left_ids=[3,5,7,9,11]
-        right_ids=[1,16,15,14,13]
-        center_ids=[2,4,6,8,10,12]
-        #Generate "sensors" over semicircle
-        rows=14
-        cols=16
-        length=100
-        radius=25.5
-        #Move mesh to be aling with STL design
-        offset_y=25
-        offset_x=-45
-        offset_z=-25
-        #Coverage angle
-        total_angle=np.pi+0.9
-        start_angle=-0.45
-        #Node generation loop
-        for i in range(rows):
-            for j in range(cols):
-
-                if i < 5: 
-                    ids_zona = right_ids
-                    sensor_id = ids_zona[min(j // 4, 4)] 
-                elif i < 10: 
-                    ids_zona = center_ids
-                    sensor_id = ids_zona[min(j // 3, 5)]
-                else:
-                    ids_zona = left_ids
-                    sensor_id = ids_zona[min(j // 4, 4)]
-
-                angle=start_angle+total_angle*(j/(cols-1))
-                x=(i-rows/2)*(length/rows)+offset_x
-                y=radius*np.cos(angle)+offset_y
-                z=radius*np.sin(angle)+offset_z
-                #Geometry e-skin
-                hexagon_data  =gl.MeshData.sphere(rows=2,cols=6)
-                node=gl.GLMeshItem(meshdata=hexagon_data, smooth=False, color=(0.6,0.6,0.6,1),shader='shaded')
-                node.scale(5.0,5.0,0.2)
-                angle_deg=np.degrees(angle)
-                node.rotate(angle_deg+90,1,0,0)
-
-                node.translate(x,y,z)
-                node.opts['sensor_id']=sensor_id
-                self.viewer.addItem(node)
-                self.sensor_nodes.append(node)
+        self.node_cell=np.array(geo["node_cell"])
+        self.node_uv=np.array(geo["node_uv"])
+        self.faces_per_node=int(geo["faces_per_node"])
+        self.sensor_mesh=SensorMesh(vertexes=geo["node_vertexes"],faces=geo["node_faces"],
+                                    smooth=False,shader='shaded')
+        self.sensor_colors=np.empty((len(self.node_cell),4),dtype=np.float32)
+        self.sensor_colors[:]=(0.6,0.6,0.6,1)
+        self.sensor_mesh.set_node_colors(self.sensor_colors,self.faces_per_node)
+        self.viewer.addItem(self.sensor_mesh)
     
+    def set_layout(self,layout):
+        #Re-maps the hexagons to cell IDs from the layout inferred from the neighbor list:
+        #every hexagon takes the cell whose normalized position is closest (x along the handle, y around it)
+        #INPUTS: layout (scn.ctrl.layout.Layout)
+        #OUTPUTS: None
+        ids=np.array([i for i in layout.ids() if 1<=i<=16])
+        if len(ids)==0 or len(self.node_cell)==0:
+            return
+        xy=layout.xy_of(ids)
+        span=np.ptp(xy,axis=0)
+        cell_uv=(xy-xy.min(axis=0))/np.where(span>0,span,1)
+        d=((self.node_uv[:,None,:]-cell_uv[None,:,:])**2).sum(axis=2)
+        self.node_cell=ids[d.argmin(axis=1)]
+        self.rendered_cells=None
+        if self.heat is not None:
+            #the cached weights are per node, the new mapping only relabels their columns (a few ms)
+            self.heat=map_weights(*self.heat_nodes,self.node_cell)
+        self.performance.set_zones({name:[int(i)-1 for i in zone if 1<=i<=16]
+                                    for name,zone in zip(("left","center","right"),layout.zones(3))})
+
+    def set_frame_source(self,source):
+        #Registers the function that returns the latest intensity vector (or None), see UIBridge.take_latest
+        #INPUTS: source (callable)
+        #OUTPUTS: None
+        self.frame_source=source
+
+    def pull_frame(self):
+        #Slot of frame_signal: renders right away when idle, otherwise the running render timer picks the frame up.
+        #While waiting the notification stays pending, so the bridge sends no further signals
+        #INPUTS: None
+        #OUTPUTS: None
+        if not self.render_timer.isActive():
+            self.render()
+            self.render_timer.start()
+
     def update_with_real_data(self,data_vector):
-        #Updates the color of all visual nodes based on a 16-sensor input vector, feedback label and performance chart
-        #INPUTS: data_vector (list)
-        #OUTPUTS: Nonee
+        #Stores a 16-sensor input vector in the performance history right away (every sample, the chart throttles
+        #only its drawing) and schedules it for rendering (node colors, feedback label); a newer vector
+        #replaces one not rendered yet
+        #INPUTS: data_vector (list or np.ndarray)
+        #OUTPUTS: None
         if len(data_vector) !=16:
             return
-        
-        threshold=0.33
-        weak_threshold=0.05
-        avg_intensity = sum(data_vector) / 16
-        
+        self.target=np.asarray(data_vector,dtype=np.float32)
+        self.performance.append(self.target)
+        self.pull_frame()
+
+    def render(self):
+        #Render timer tick: draws the newest vector, stops the timer when there is nothing new
+        #INPUTS: None
+        #OUTPUTS: None
+        data_vector=self.frame_source() if self.frame_source is not None else None
+        if data_vector is not None:
+            self.performance.append(data_vector)
+        else:
+            data_vector,self.target=self.target,None
+        if data_vector is None:
+            self.render_timer.stop()
+            return
+        self.render_vector(data_vector)
+
+    def render_vector(self,data_vector):
+        #Diffs the vector against the rendered state and updates only what changed (the performance chart
+        #already has the vector, see update_with_real_data/render)
+        #INPUTS: data_vector (16)
+        #OUTPUTS: None
+        v=np.asarray(data_vector,dtype=np.float32)
+        avg_intensity=float(v.mean())
+
         # Classification logic - the WAITING message is overwritten as soon as data arrives
-        if avg_intensity < weak_threshold:
-            self.feedback_label.setText("PLEASE GRIP")
-            self.feedback_label.setStyleSheet("font-size: 30px; font-weight: bold; color: #FFFFFF; background-color: black; padding: 10px; border: none;")
-        elif avg_intensity >= threshold:
-            self.feedback_label.setText("GOOD JOB!")
-            self.feedback_label.setStyleSheet("font-size: 32px; font-weight: bold; color: #00FF00; background-color: black; padding: 10px; border: none;")
+        if avg_intensity < self.WEAK_THRESHOLD:
+            state="idle"
+        elif avg_intensity >= self.THRESHOLD:
+            state="good"
         else:
-            self.feedback_label.setText("Grip stronger")
-            self.feedback_label.setStyleSheet("font-size: 30px; font-weight: bold; color: #FF4444; background-color: black; padding: 10px; border: none;")
-        
-        #Update each node based on its assigned physical ID
-        for node in self.sensor_nodes:
+            state="weak"
+        if state!=self.label_state:
+            text,style=self.LABEL_STYLES[state]
+            self.feedback_label.setText(text)
+            self.feedback_label.setStyleSheet(style)
+            self.label_state=state
 
-            physical_id=node.opts['sensor_id']
-            intensity=data_vector[physical_id-1]
-            if intensity >= threshold:
-                node.setColor((0.0, 0.0, 0.8, 1)) # Dark Blue for goal reached
+        if len(self.node_cell):
+            #increase progressively from light grey to blue, dark blue for goal reached
+            intensity=(np.round(np.clip(v,0,1)*self.COLOR_LEVELS)/self.COLOR_LEVELS)[:,None]
+            gradient=np.array([0.6,0.6,0.6,1],dtype=np.float32)+intensity*np.array([-0.6,-0.6,0.4,0],dtype=np.float32)
+            cells=np.where(intensity>=self.THRESHOLD,np.array([0.0,0.0,0.8,1],dtype=np.float32),gradient)
+            if self.rendered_cells is None:
+                self.sensor_colors[:]=cells[self.node_cell-1]
+                self.sensor_mesh.set_node_colors(self.sensor_colors,self.faces_per_node)
+                changed=np.ones(len(cells),dtype=bool)
             else:
-                #increase progressively from light grey to blue
-                red = 0.6 * (1 - intensity)
-                green = 0.6 * (1 - intensity)
-                blue = 0.6 + (0.4 * intensity)
-                node.setColor((red, green, blue, 1))
-        
-        #Update graph
-        try:
-            self.data_history.append(sum(data_vector)/16)
-            if len(self.data_history) > 100: self.data_history.pop(0)
-            self.curve.setData(self.data_history)
-        except:
-            pass
+                changed=np.any(cells!=self.rendered_cells,axis=1)
+                if changed.any():
+                    nodes=np.flatnonzero(changed[self.node_cell-1])
+                    self.sensor_colors[nodes]=cells[self.node_cell[nodes]-1]
+                    self.sensor_mesh.set_node_colors(self.sensor_colors,self.faces_per_node,nodes)
+            self.rendered_cells=cells
+
+            if self.heat is not None and changed.any():
+                rows,cols,weights=self.heat
+                level=surface_values(rows,cols,weights,intensity[:,0],len(self.heat_colors))[:,None]
+                np.multiply(level,self.PRESSURE_COLOR-self.SURFACE_COLOR,out=self.heat_colors)
+                self.heat_colors+=self.SURFACE_COLOR
+                self.mesh_item.set_vertex_colors(self.heat_colors)
 
     """def run_dummy_stimulation(self):
         #Genrate fake 16-sensor variable to test heatmap
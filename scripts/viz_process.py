@@ -0,0 +1,67 @@
+"""
+FILE: viz_process.py
+PURPOSE: Runs the 3D visualizer in its own process. Reads the cell state from the shared memory block
+published by the DataPublisher, so rendering never competes with the socket readers for the GIL
+"""
+import multiprocessing
+import os
+import sys
+
+# path fix for SCN library
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scn.sc.shm import ShmReader
+from scn.sc.pkt.data import SENS_IND_FORCE1, SENS_IND_FORCE3
+
+FORCE_INDS = slice(SENS_IND_FORCE1, SENS_IND_FORCE3 + 1)  # force1..force3 in the Data1200 value layout
+
+
+def run_visualizer(shm_name, file_stl, refresh_hz=30):
+    """
+    Process entry: creates the Qt application and polls the shared cell state at the display rate
+    Inputs: shm_name (str), file_stl (str), refresh_hz (int)
+    Outputs: none
+    """
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+    from visualizator_3d import Visualizator3D
+    from ui_bridge import UIBridge
+
+    app = QApplication(sys.argv)
+    viz = Visualizator3D(file_stl)
+    viz.show()
+
+    bridge = UIBridge(viz)
+    reader = ShmReader(shm_name)
+    last_seq = [-1]
+
+    def poll():
+        seq = reader.seq()
+        if seq == last_seq[0]:
+            return
+        snap = reader.read()
+        if snap is None:
+            return
+        last_seq[0] = snap[0]
+        ids, forces = snap[1], snap[3][:, FORCE_INDS].max(axis=1)
+        bridge.process_frame(ids, forces)
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(int(1000 / refresh_hz))
+
+    ret = app.exec()
+    reader.close()
+    sys.exit(ret)
+
+
+def start_visualizer_process(shm_name, file_stl, refresh_hz=30):
+    """
+    Launches the visualizer in a separate process (spawned, the parent already runs socket threads)
+    Inputs: shm_name (str), file_stl (str), refresh_hz (int)
+    Outputs: multiprocessing.Process
+    """
+    ctx = multiprocessing.get_context("spawn")
+    proc = ctx.Process(target=run_visualizer, args=(shm_name, file_stl, refresh_hz), daemon=True)
+    proc.start()
+    return proc
@@ -0,0 +1,5 @@
+# the scn package is used from the repository root, as in scripts/
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
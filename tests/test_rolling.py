@@ -0,0 +1,79 @@
+"""
+Brute-force checks of the streaming operators in scn.sc.rolling against
+the statistics recomputed from the full sample history.
+"""
+import numpy as np
+import pytest
+
+from scn.sc.rolling import (DerivedChannels, Ema, PeakHold, RateOfChange, RollingMax, RollingMeanVar,
+                            RollingMin)
+
+N_CELLS = 5
+N_VALS = 3
+
+
+def random_stream(n, seed=0):
+    # (cell row, sample, time stamp) with cells in random order
+    rng = np.random.default_rng(seed)
+    inds = rng.integers(0, N_CELLS, n)
+    x = rng.normal(size=(n, N_VALS))
+    t = np.cumsum(rng.uniform(0.001, 0.01, n))
+    return inds, x, t
+
+
+def history(inds, x, upto):
+    return [x[:upto + 1][inds[:upto + 1] == c] for c in range(N_CELLS)]
+
+
+@pytest.mark.parametrize("window", [1, 2, 5, 16])
+def test_window_ops_match_naive(window):
+    inds, x, t = random_stream(300)
+    mv, mx, mn = RollingMeanVar(window, N_VALS), RollingMax(window, N_VALS), RollingMin(window, N_VALS)
+    for k in range(len(inds)):
+        for op in (mv, mx, mn):
+            op.update(int(inds[k]), x[k], t[k])
+        c = inds[k]
+        w = history(inds, x, k)[c][-window:]
+        np.testing.assert_allclose(mv.mean()[c], w.mean(axis=0), atol=1e-9)
+        np.testing.assert_allclose(mv.var()[c], w.var(axis=0), atol=1e-9)
+        np.testing.assert_array_equal(mx.value()[c], w.max(axis=0))
+        np.testing.assert_array_equal(mn.value()[c], w.min(axis=0))
+
+
+def test_ema_peak_hold_rate_of_change():
+    inds, x, t = random_stream(200, seed=1)
+    alpha, decay = 0.3, 0.9
+    ema, peak, roc = Ema(alpha, N_VALS), PeakHold(decay, N_VALS), RateOfChange(N_VALS)
+    for k in range(len(inds)):
+        for op in (ema, peak, roc):
+            op.update(int(inds[k]), x[k], t[k])
+    for c in range(N_CELLS):
+        xc, tc = x[inds == c], t[inds == c]
+        s, h = xc[0].copy(), xc[0].copy()
+        for v in xc[1:]:
+            s += alpha*(v - s)
+            h = np.maximum(v, decay*h)
+        np.testing.assert_allclose(ema.value()[c], s)
+        np.testing.assert_allclose(peak.value()[c], h)
+        np.testing.assert_allclose(roc.value()[c], (xc[-1] - xc[-2])/(tc[-1] - tc[-2]))
+
+
+def test_vectorized_update_matches_single_rows():
+    inds, x, t = random_stream(100, seed=2)
+    single, batched = RollingMax(4, N_VALS), RollingMax(4, N_VALS)
+    for k in range(len(inds)):
+        single.update(int(inds[k]), x[k], t[k])
+    # rounds of unique rows, as DerivedChannels.flush() feeds them
+    ch = DerivedChannels(N_VALS, max_pending=1000)
+    ch.add("max", batched)
+    for k in range(len(inds)):
+        ch.push(int(inds[k]), x[k].tolist(), float(t[k]))
+    np.testing.assert_array_equal(ch.value("max"), single.value())
+
+
+def test_rows_grow_on_demand():
+    op = RollingMeanVar(3, N_VALS)
+    op.update(0, np.ones(N_VALS))
+    op.update(40, 2*np.ones(N_VALS))
+    assert op.n_cells() == 41
+    np.testing.assert_array_equal(op.mean()[[0, 40]], [[1]*N_VALS, [2]*N_VALS])
@@ -0,0 +1,69 @@
+"""
+Brute-force checks of scn.ctrl.spatial against the dense adjacency matrix
+and breadth first search over the active cells.
+"""
+import numpy as np
+import pytest
+
+from scn.ctrl.spatial import SpatialKernels
+from scn.ctrl.topology import Topology
+
+from test_topology import adjacency, components, random_neighs
+
+
+def dense(topo):
+    n = len(topo)
+    a = np.zeros((n, n))
+    a[topo.rows(), topo.indices()] = 1
+    return a
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matvec_and_smooth_match_dense(seed):
+    topo = Topology(random_neighs(70, seed=seed))
+    k = SpatialKernels(topo, self_weight=2.0)
+    a = dense(topo)
+    x = np.random.default_rng(seed).random((len(topo), 3))
+    np.testing.assert_allclose(k.matvec(x[:, 0]), a @ x[:, 0])
+    np.testing.assert_allclose(k.matvec(x), a @ x)
+    ref = x[:, 0]
+    for _ in range(3):
+        ref = (2.0*ref + a @ ref)/(2.0 + a.sum(axis=1))
+    np.testing.assert_allclose(k.smooth(x[:, 0], iterations=3), ref)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_blobs_match_bfs(seed):
+    neighs = random_neighs(100, p_connect=0.4, seed=seed)
+    topo = Topology(neighs)
+    k = SpatialKernels(topo)
+    x = np.random.default_rng(seed).random(len(topo))
+    threshold = 0.4
+    b = k.blobs(x, threshold)
+
+    ids = topo.ids().tolist()
+    active = {i for i, v in zip(ids, x) if v > threshold}
+    adj = {i: nb & active for i, nb in adjacency(neighs).items() if i in active}
+    ref = components(adj)
+
+    labels = b["labels"]
+    got = {}
+    for i, l in zip(ids, labels.tolist()):
+        if l >= 0:
+            got.setdefault(l, set()).add(i)
+    assert set(map(frozenset, got.values())) == ref
+    assert (labels < 0).sum() == len(ids) - len(active)
+    # labels ordered by the lowest index
+    lows = [ids.index(min(got[l])) for l in range(len(got))]
+    assert lows == sorted(lows)
+    for l, cells in got.items():
+        vals = {i: x[ids.index(i)] for i in cells}
+        assert b["area"][l] == len(cells)
+        assert b["peak"][l] == max(vals.values())
+        assert vals[int(b["peak_id"][l])] == b["peak"][l]
+
+
+def test_no_active_cells():
+    topo = Topology(random_neighs(10))
+    b = SpatialKernels(topo).blobs(np.zeros(len(topo)), 0.5)
+    assert (b["labels"] == -1).all() and len(b["area"]) == 0
@@ -0,0 +1,118 @@
+"""
+Checks of scn.sc.stream against a plain list model of the bounded queue.
+"""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from scn.sc.stream import OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, Stream, StreamSource
+
+
+class Publisher(StreamSource):
+    # add_callback/remove_callback/dispatch under the callback mutex, as the scn publishers
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.callbacks = []
+
+    def add_callback(self, cb):
+        with self.mutex:
+            self.callbacks.append(cb)
+
+    def remove_callback(self, cb):
+        with self.mutex:
+            self.callbacks.remove(cb)
+
+    def publish(self, item):
+        with self.mutex:
+            for cb in self.callbacks:
+                cb(item)
+
+
+def drain(s):
+    items = []
+    while True:
+        try:
+            items.append(s.get(timeout=0))
+        except TimeoutError:
+            return items
+
+
+@pytest.mark.parametrize("overflow", [OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST])
+def test_overflow_matches_list_model(overflow):
+    rng = np.random.default_rng(0)
+    maxsize = 4
+    s = Stream(maxsize, overflow)
+    model, dropped, got, n = [], 0, [], 0
+    for _ in range(200):
+        if rng.random() < 0.6:
+            s.push(n)
+            if len(model) < maxsize:
+                model.append(n)
+            else:
+                dropped += 1
+                if overflow == OVERFLOW_DROP_OLDEST:
+                    model = model[1:] + [n]
+            n += 1
+        elif model:
+            got.append(s.get(timeout=0))
+            assert got[-1] == model.pop(0)
+    assert drain(s) == model
+    assert s.dropped() == dropped
+
+
+def test_batches_are_full_or_timed_out():
+    s = Stream(64, batch=4, batch_timeout=0.05)
+    for i in range(10):
+        s.push(i)
+    assert s.get(timeout=0) == [0, 1, 2, 3]
+    assert s.get(timeout=0) == [4, 5, 6, 7]
+    with pytest.raises(TimeoutError):
+        s.get(timeout=0)
+    t0 = time.monotonic()
+    assert s.get(timeout=1.0) == [8, 9]
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_close_drains_then_ends_iteration():
+    s = Stream(8, batch=3)
+    for i in range(4):
+        s.push(i)
+    s.close()
+    s.push(99)
+    assert list(s) == [[0, 1, 2], [3]]
+
+
+def test_async_iteration():
+    s = Stream(8)
+
+    async def consume():
+        return [item async for item in s]
+
+    def produce():
+        for i in range(5):
+            s.push(i)
+            time.sleep(0.005)
+        s.close()
+
+    threading.Thread(target=produce).start()
+    assert asyncio.run(consume()) == list(range(5))
+
+
+def test_close_inside_callback_unsubscribes():
+    pub = Publisher()
+    s = pub.stream(maxsize=8)
+
+    def close_on_2(item):
+        if item == 2:
+            s.close()
+    pub.add_callback(close_on_2)
+    for i in range(5):
+        pub.publish(i)
+    assert list(s) == [0, 1, 2]
+    deadline = time.monotonic() + 1.0
+    while s in pub.callbacks and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert s not in pub.callbacks
@@ -0,0 +1,119 @@
+"""
+Brute-force checks of scn.ctrl.topology against set based adjacency and
+breadth first search over the neighbor list.
+"""
+import collections
+
+import numpy as np
+import pytest
+
+from scn.ctrl.topology import N_PORTS, Topology
+from scn.sc.pkt.tools import SC_ID_ALL
+
+
+def random_neighs(n, p_connect=0.3, seed=0):
+    # random cell IDs, ports point at random cells, 0 (unknown ID) if unconnected
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(np.arange(1, 4*n), n, replace=False)
+    return [(int(i), tuple(int(rng.choice(ids)) if rng.random() < p_connect else 0 for _ in range(N_PORTS)))
+            for i in ids]
+
+
+def adjacency(neighs):
+    ids = {i for i, _ in neighs}
+    adj = {i: set() for i in ids}
+    for i, nv in neighs:
+        for j in nv:
+            if j in ids and j != i:
+                adj[i].add(j)
+                adj[j].add(i)
+    return adj
+
+
+def bfs(adj, src):
+    dist = {src: 0}
+    q = collections.deque([src])
+    while q:
+        i = q.popleft()
+        for j in adj[i]:
+            if j not in dist:
+                dist[j] = dist[i] + 1
+                q.append(j)
+    return dist
+
+
+def components(adj):
+    return {frozenset(bfs(adj, i)) for i in adj}
+
+
+def labeled_sets(topo, labels):
+    sets = collections.defaultdict(set)
+    for i, l in zip(topo.ids().tolist(), labels.tolist()):
+        sets[l].add(i)
+    return sets
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_csr_matches_adjacency(seed):
+    neighs = random_neighs(60, seed=seed)
+    topo = Topology(neighs)
+    adj = adjacency(neighs)
+    assert topo.ids().tolist() == sorted(adj)
+    for i in adj:
+        assert topo.neighbors(i) == sorted(adj[i])
+    assert topo.degree().sum() == sum(len(v) for v in adj.values())
+    for i, nv in neighs:
+        for port, j in enumerate(nv):
+            assert topo.neighbor(i, port) == (j if j in adj and j != i else None)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_components_and_hops_match_bfs(seed):
+    neighs = random_neighs(80, p_connect=0.2, seed=seed)
+    topo = Topology(neighs)
+    adj = adjacency(neighs)
+    labels = topo.components()
+    sets = labeled_sets(topo, labels)
+    assert set(map(frozenset, sets.values())) == components(adj)
+    assert topo.n_components() == len(sets)
+    # labels in order of the first cell
+    first = [int(np.flatnonzero(labels == l)[0]) for l in range(topo.n_components())]
+    assert first == sorted(first)
+    for src in list(adj)[:10]:
+        dist = bfs(adj, src)
+        assert topo.hops(src).tolist() == [dist.get(i, -1) for i in topo.ids().tolist()]
+
+
+def test_update_matches_rebuild():
+    rng = np.random.default_rng(1)
+    neighs = random_neighs(50, p_connect=0.15, seed=1)
+    ids = [i for i, _ in neighs]
+    topo = Topology(neighs)
+    for _ in range(100):
+        topo.components()
+        topo.hops(ids[0])
+        k = int(rng.integers(len(neighs)))
+        nv = list(neighs[k][1])
+        nv[int(rng.integers(N_PORTS))] = int(rng.choice(ids)) if rng.random() < 0.5 else 0
+        neighs[k] = (neighs[k][0], tuple(nv))
+
+        updated = topo.update(neighs)
+        ref = Topology(neighs)
+        assert updated == ref
+        np.testing.assert_array_equal(updated.components(), ref.components())
+        np.testing.assert_array_equal(updated.hops(ids[0]), ref.hops(ids[0]))
+        topo = updated
+
+
+def test_update_unchanged_returns_self():
+    neighs = random_neighs(20)
+    topo = Topology(neighs)
+    assert topo.update(list(neighs)) is topo
+
+
+@pytest.mark.parametrize("bad", [[(1, (0, 0, 0, 0)), (1, (0, 0, 0, 0))],
+                                 [(SC_ID_ALL + 1, (0, 0, 0, 0))],
+                                 [(-1, (0, 0, 0, 0))]])
+def test_invalid_ids_raise(bad):
+    with pytest.raises(ValueError):
+        Topology(bad)